@@ -0,0 +1,642 @@
+##############################################################################
+# Algorithm     :   This program measures the time and memory taken by each
+#                   stage of this project on synthetic data, so that changes
+#                   can be judged and hardware can be sized without the real
+#                   corpus or Standford parser.
+#
+#                   Steps followed in this program are:
+#
+#                   1) For each size, given as the number of <P> tags, a
+#                      synthetic corpus is written in the <DOC>/<TEXT>/<P>
+#                      format of the corpus files. Words are drawn from a
+#                      vocabulary with Zipf's law frequencies, as in real
+#                      text, so the number of distinct words and features
+#                      grows with the corpus like it does for real data.
+#
+#                   2) Following stages are run and timed on it:
+#
+#                      extract     - extractSentences function of
+#                                    parse_corpus_sentences.py
+#                      count_words - countWords function of ingest.py
+#                      ingest      - countRelationsParallel function of
+#                                    ingest.py on the parse files
+#                      association - buildModelFromCounts function of
+#                                    word_sim.py, i.e. building the CV and
+#                                    computing probabilities and t-test
+#                                    association measures (or the measure
+#                                    given by --association)
+#                      query       - mostSimilar function of similarity.py
+#                                    for a sample of target words, with
+#                                    Jaccard's measure (or the measure
+#                                    given by --similarity)
+#                      batch_query - batchMostSimilar function of
+#                                    similarity.py for the same targets
+#
+#                      With --approximate, also:
+#
+#                      lsh_index         - MinHashIndex.build of
+#                                          lsh_index.py
+#                      approximate_query - mostSimilar method of the
+#                                          index for the same targets,
+#                                          with its recall of the exact
+#                                          similar words
+#
+#                      Parse files are written in the
+#                      rel(word_1-i, word_2-j) format of Standford parser
+#                      for the extracted sentences, with a random tree of
+#                      relations for each sentence, before ingest stage.
+#
+#                   3) Each size is run in its own process, so that the peak
+#                      memory (max RSS) after each stage belongs to that size
+#                      only.
+#
+#                   4) Throughput and peak memory of every stage, for all
+#                      sizes, are written in JSON format. "curves" key has
+#                      them as lists in the order of sizes, for plotting
+#                      scaling curves.
+#
+#                   Usage           : python benchmark.py [--sizes 2000,8000]
+#                                     [--workers N] [--output FILE]
+#                                     Run python benchmark.py --help for all
+#                                     options.
+##############################################################################
+
+#!/usr/bin/python
+
+'''
+import statements to include Python's in-built module functionalities in the
+program
+'''
+# sys module is used to access command line argument, exit function etc.
+import sys
+
+# os module is used to access file manipulation features
+import os
+
+# argparse module is used to read the command line arguments
+import argparse
+
+# json module is used to write the results
+import json
+
+# time module for time related functionality
+import time
+
+# random module draws the synthetic words, sentences and relations
+import random
+
+# bisect module draws words from the cumulative Zipf's law weights
+import bisect
+
+# resource module gives the peak memory of the process
+import resource
+
+# multiprocessing module runs each size in its own process
+import multiprocessing
+
+# Queue module tells when no result arrived in time
+import Queue
+
+# shutil and tempfile modules hold the synthetic data of a run
+import shutil
+import tempfile
+
+# modules of this project which are benchmarked
+from parse_corpus_sentences import corpusFilePaths, extractSentences
+from ingest import countWords, countRelationsParallel
+from word_sim import buildModelFromCounts
+from similarity import mostSimilar, batchMostSimilar
+from lsh_index import MinHashIndex, recallAt, DEFAULT_NUM_BANDS, \
+                      DEFAULT_BAND_SIZE
+from measures import ASSOCIATION_MEASURES, SIMILARITY_MEASURES, \
+                     DEFAULT_ASSOCIATION, DEFAULT_SIMILARITY
+
+# metrics module gives the peak memory and counts of the stages
+import metrics
+from metrics import peakMemory
+
+'''
+Default sizes, in <P> tags, of the synthetic corpora
+'''
+DEFAULT_SIZES = (2000, 8000, 32000)
+
+'''
+Default number of distinct words of the synthetic corpus, and exponent of
+Zipf's law for their frequencies
+'''
+VOCABULARY_SIZE = 50000
+ZIPF_EXPONENT = 1.0
+
+'''
+Shape of the synthetic corpus: <P> tags per <DOC>, <DOC>s per corpus file,
+sentences per <P> tag, words per sentence and sentences per parse file
+'''
+PARAGRAPHS_PER_DOC = 10
+DOCS_PER_FILE = 500
+SENTENCES_PER_PARAGRAPH = (1, 3)
+WORDS_PER_SENTENCE = (6, 25)
+SENTENCES_PER_PARSE_FILE = 2000
+
+'''
+Seconds to wait for the result of a size before checking that its process
+is still running
+'''
+RESULT_POLL_SECONDS = 1.0
+
+'''
+Grammatical relations of the synthetic parse files, as written by
+Standford parser
+'''
+RELATIONS = ("nsubj", "dobj", "amod", "det", "nn", "prep_of", "prep_in", \
+             "advmod", "aux", "poss", "conj_and", "iobj", "xcomp", "num")
+
+'''
+Default number of target words queried, and of similar words for each
+'''
+NUM_OF_QUERIES = 50
+NUM_OF_SIM_WORDS = 20
+
+###############################################################################
+# Class         : ZipfWords
+# Description   : Draws words of a vocabulary of size words w0, w1, ... with
+#                 the frequency of the word of rank r proportional to
+#                 1 / r ** exponent.
+###############################################################################
+class ZipfWords(object):
+
+    def __init__(self, size, exponent, rng):
+        self.rng = rng
+        self.cumulative = []
+        total = 0.0
+        for rank in xrange(1, size + 1):
+            total += 1.0 / rank ** exponent
+            self.cumulative.append(total)
+
+    def draw(self, count):
+        total = self.cumulative[-1]
+        return ["w" + str(bisect.bisect(self.cumulative, \
+                                         self.rng.random() * total)) \
+                for i in xrange(count)]
+
+###############################################################################
+# End of ZipfWords class
+###############################################################################
+
+###############################################################################
+# Function      : generateCorpus(corpus_directory, num_paragraphs, words,
+#                                rng)
+# Description   : Writes a synthetic corpus in the format of the corpus
+#                 files, with num_paragraphs <P> tags in all. Each <DOC> has
+#                 a headline and some <P> tags of sentences. Character
+#                 entities are put in the text, as in the real corpus, so
+#                 that their handling is part of the extraction time.
+# Arguments     : corpus_directory - directory to write corpus files into
+#                 num_paragraphs   - number of <P> tags
+#                 words            - ZipfWords object drawing the words
+#                 rng              - random.Random object
+# Returns       : None
+###############################################################################
+def generateCorpus(corpus_directory, num_paragraphs, words, rng):
+
+    paragraphs_per_file = PARAGRAPHS_PER_DOC * DOCS_PER_FILE
+    paragraph_id = 0
+    doc_id = 0
+
+    while paragraph_id < num_paragraphs:
+        corpus_file = open(os.path.join(corpus_directory, \
+                                        "synthetic_%04d.xml" % \
+                                        (paragraph_id // \
+                                         paragraphs_per_file)), 'w')
+        file_end = min(num_paragraphs, paragraph_id + paragraphs_per_file)
+
+        while paragraph_id < file_end:
+            corpus_file.write('<DOC id="SYN_%08d" type="story" >\n' \
+                              '<HEADLINE>\n%s &AMP; %s\n</HEADLINE>\n' \
+                              '<TEXT>\n' % ((doc_id,) + tuple(words.draw(2))))
+            doc_end = min(file_end, paragraph_id + PARAGRAPHS_PER_DOC)
+
+            while paragraph_id < doc_end:
+                sentences = []
+                for i in xrange(rng.randint(*SENTENCES_PER_PARAGRAPH)):
+                    sentence = words.draw(rng.randint(*WORDS_PER_SENTENCE))
+                    if rng.random() < 0.1:
+                        sentence.insert(rng.randint(1, len(sentence)), \
+                                        "&amp;")
+                    sentences.append(" ".join(sentence) + " .")
+                corpus_file.write("<P>\n" + "\n".join(sentences) + \
+                                  "\n</P>\n")
+                paragraph_id += 1
+
+            corpus_file.write("</TEXT>\n</DOC>\n")
+            doc_id += 1
+
+        corpus_file.close()
+
+###############################################################################
+# Function      : generateParseFiles(op_file_path, parse_directory, rng)
+# Description   : Writes synthetic parse files for the sentences of the
+#                 sentence file. Each word of a sentence but one gets a
+#                 relation to an earlier word, chosen at random, which gives
+#                 a tree of relations like the parser does. The first word
+#                 is the root. Sentences of a parse file are separated by an
+#                 empty line, e.g.
+#
+#                     root(ROOT-0, w12-1)
+#                     nsubj(w12-1, w3-2)
+#                     dobj(w3-2, w45-3)
+# Arguments     : op_file_path    - path of the sentence file
+#                 parse_directory - directory to write parse files into
+#                 rng             - random.Random object
+# Returns       : tuple (list of paths of parse files, number of relations)
+###############################################################################
+def generateParseFiles(op_file_path, parse_directory, rng):
+
+    parse_file_paths = []
+    parse_file = None
+    num_of_sentences = 0
+    num_of_relations = 0
+
+    op_file = open(op_file_path, 'r')
+    try:
+        for line in op_file:
+            sentence = [word for word in line.lower().split() \
+                        if word.isalnum()]
+            if not sentence:
+                continue
+
+            if num_of_sentences % SENTENCES_PER_PARSE_FILE == 0:
+                if parse_file is not None:
+                    parse_file.close()
+                parse_file_paths.append(os.path.join(parse_directory, \
+                                        "shard-%05d.parse" % \
+                                        len(parse_file_paths)))
+                parse_file = open(parse_file_paths[-1], 'w')
+
+            parse_file.write("root(ROOT-0, %s-1)\n" % sentence[0])
+            for index in xrange(1, len(sentence)):
+                head = rng.randint(0, index - 1)
+                parse_file.write("%s(%s-%d, %s-%d)\n" % \
+                                 (rng.choice(RELATIONS), \
+                                  sentence[head], head + 1, \
+                                  sentence[index], index + 1))
+            parse_file.write("\n")
+
+            num_of_sentences += 1
+            num_of_relations += len(sentence) - 1
+    finally:
+        op_file.close()
+        if parse_file is not None:
+            parse_file.close()
+
+    return parse_file_paths, num_of_relations
+
+###############################################################################
+# Function      : benchmarkSize(num_paragraphs, options)
+# Description   : Generates the synthetic data of one size in a temporary
+#                 directory and runs the stages on it (see step 2 of the
+#                 program description).
+# Arguments     : num_paragraphs - number of <P> tags of the corpus
+#                 options        - dict of options of the benchmark:
+#                                  vocabulary_size, zipf_exponent, workers,
+#                                  queries, num_of_sim_words, seed, work_dir
+# Returns       : dict with the sizes of the data and the results of each
+#                 stage
+###############################################################################
+def benchmarkSize(num_paragraphs, options):
+
+    rng = random.Random(options["seed"])
+    words = ZipfWords(options["vocabulary_size"], options["zipf_exponent"], \
+                      rng)
+    workers = options["workers"]
+
+    run_directory = tempfile.mkdtemp(prefix="word_sim_bench_", \
+                                     dir=options["work_dir"])
+    corpus_directory = os.path.join(run_directory, "corpus")
+    parse_directory = os.path.join(run_directory, "parse")
+    op_file_path = os.path.join(run_directory, "op_file")
+    os.mkdir(corpus_directory)
+    os.mkdir(parse_directory)
+
+    result = {"paragraphs": num_paragraphs, "stages": {}}
+    stages = result["stages"]
+
+    try:
+        start_time = time.time()
+        generateCorpus(corpus_directory, num_paragraphs, words, rng)
+        result["generate_seconds"] = round(time.time() - start_time, 6)
+        result["corpus_bytes"] = sum(os.path.getsize(path) for path in \
+                                     corpusFilePaths(corpus_directory))
+
+        timer = StageTimer()
+        extractSentences(corpusFilePaths(corpus_directory), op_file_path, \
+                         workers, num_paragraphs)
+        stages["extract"] = timer.stop(num_paragraphs, "paragraphs")
+
+        timer = StageTimer()
+        word_frq_dict = countWords(op_file_path, workers)
+        result["tokens"] = sum(word_frq_dict.itervalues())
+        stages["count_words"] = timer.stop(result["tokens"], "tokens")
+
+        parse_file_paths, result["relations"] = \
+            generateParseFiles(op_file_path, parse_directory, rng)
+
+        timer = StageTimer()
+        rel_counts = countRelationsParallel(parse_file_paths, workers)
+        stages["ingest"] = timer.stop(result["relations"], "relations")
+
+        timer = StageTimer()
+        cv_matrix = buildModelFromCounts(word_frq_dict, rel_counts, None, \
+                                         options["association"])
+        result["words"] = cv_matrix.numRows()
+        result["features"] = cv_matrix.numFeatures()
+        result["cells"] = cv_matrix.numCells()
+        stages["association"] = timer.stop(result["cells"], "cells")
+        del rel_counts, word_frq_dict
+
+        '''
+        Targets are drawn from the words of the CV, the way they are drawn
+        from the corpus, so frequent words with long rows are queried more
+        often.
+        '''
+        target_rows = []
+        while len(target_rows) < min(options["queries"], \
+                                     cv_matrix.numRows()):
+            row_id = cv_matrix.rowOf(words.draw(1)[0])
+            if row_id is not None:
+                target_rows.append(row_id)
+
+        timer = StageTimer()
+        latencies = []
+        for target_row in target_rows:
+            query_start = time.time()
+            mostSimilar(cv_matrix, target_row, options["num_of_sim_words"], \
+                        options["similarity"])
+            latencies.append(time.time() - query_start)
+        stages["query"] = timer.stop(len(target_rows), "queries")
+        stages["query"].update(latencyPercentiles(latencies))
+
+        timer = StageTimer()
+        for block_results in batchMostSimilar(cv_matrix, target_rows, \
+                                              options["num_of_sim_words"], \
+                                              measure=options["similarity"]):
+            pass
+        stages["batch_query"] = timer.stop(len(target_rows), "queries")
+
+        if options["approximate"]:
+            timer = StageTimer()
+            lsh_index = MinHashIndex.build(cv_matrix, options["lsh_bands"], \
+                                           options["lsh_band_size"])
+            stages["lsh_index"] = timer.stop(result["words"], "words")
+
+            timer = StageTimer()
+            latencies = []
+            for target_row in target_rows:
+                query_start = time.time()
+                lsh_index.mostSimilar(cv_matrix, target_row, \
+                                      options["num_of_sim_words"], None, \
+                                      options["similarity"])
+                latencies.append(time.time() - query_start)
+            stages["approximate_query"] = timer.stop(len(target_rows), \
+                                                     "queries")
+            stages["approximate_query"].update(latencyPercentiles(latencies))
+            stages["approximate_query"]["recall"] = \
+                recallAt(cv_matrix, lsh_index, target_rows, \
+                         options["num_of_sim_words"], None, \
+                         options["similarity"])
+
+        result["counters"] = metrics.snapshot()["counters"]
+    finally:
+        shutil.rmtree(run_directory)
+
+    return result
+
+###############################################################################
+# End of benchmarkSize function
+###############################################################################
+
+###############################################################################
+# Class         : StageTimer
+# Description   : Measures the time of a stage from its creation until stop
+#                 is called, and the peak memory of the process and of its
+#                 finished worker processes at that point.
+###############################################################################
+class StageTimer(object):
+
+    def __init__(self):
+        self.start_time = time.time()
+
+    ###########################################################################
+    # Method        : stop(items, unit)
+    # Description   : Returns the results of the stage as a dict, with its
+    #                 throughput as items of unit per second.
+    ###########################################################################
+    def stop(self, items, unit):
+        seconds = time.time() - self.start_time
+        return {"seconds": round(seconds, 6), \
+                "items": items, \
+                "unit": unit, \
+                "per_second": round(items / seconds, 3) if seconds else None, \
+                "peak_rss_kb": peakMemory(resource.RUSAGE_SELF), \
+                "children_peak_rss_kb": peakMemory(resource.RUSAGE_CHILDREN)}
+
+###############################################################################
+# End of StageTimer class
+###############################################################################
+
+###############################################################################
+# Function      : latencyPercentiles(latencies)
+# Description   : Mean, 50th and 95th percentile of query times in ms
+###############################################################################
+def latencyPercentiles(latencies):
+    if not latencies:
+        return {}
+    latencies = sorted(latencies)
+    return {"mean_ms": round(sum(latencies) * 1000 / len(latencies), 3), \
+            "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3), \
+            "p95_ms": round(latencies[min(len(latencies) - 1, \
+                                          len(latencies) * 95 // 100)] * \
+                            1000, 3)}
+
+###############################################################################
+# Function      : runInProcess(num_paragraphs, options)
+# Description   : Runs benchmarkSize in a new process, so that its peak
+#                 memory is not mixed with the one of an earlier size. If
+#                 the process dies without a result, e.g. killed by the
+#                 OOM killer, RuntimeError is raised with its exit code
+#                 instead of waiting forever.
+# Returns       : result of benchmarkSize
+###############################################################################
+def runInProcess(num_paragraphs, options):
+
+    result_queue = multiprocessing.Queue()
+
+    def target():
+        try:
+            result_queue.put(("ok", benchmarkSize(num_paragraphs, options)))
+        except Exception, error:
+            result_queue.put(("error", repr(error)))
+
+    process = multiprocessing.Process(target=target)
+    process.start()
+
+    while True:
+        try:
+            status, result = result_queue.get(timeout=RESULT_POLL_SECONDS)
+            break
+        except Queue.Empty:
+            if process.is_alive():
+                continue
+
+        '''
+        The process may have put its result just before it exited, so
+        look once more before giving up.
+        '''
+        try:
+            status, result = result_queue.get(timeout=RESULT_POLL_SECONDS)
+            break
+        except Queue.Empty:
+            process.join()
+            raise RuntimeError("benchmark of size " + \
+                               str(num_paragraphs) + " failed: process " \
+                               "exited without a result, exit code " + \
+                               str(process.exitcode))
+
+    process.join()
+
+    if status != "ok":
+        raise RuntimeError("benchmark of size " + str(num_paragraphs) + \
+                           " failed: " + result)
+    return result
+
+###############################################################################
+# Function      : scalingCurves(runs)
+# Description   : Collects the results of every stage over all sizes as
+#                 lists in the order of sizes.
+# Arguments     : runs - list of results of benchmarkSize, sorted by size
+# Returns       : dict mapping stage name to dict of lists
+###############################################################################
+def scalingCurves(runs):
+
+    curves = {}
+    for run in runs:
+        for stage_name, stage in run["stages"].iteritems():
+            curve = curves.setdefault(stage_name, {"paragraphs": [], \
+                                                   "seconds": [], \
+                                                   "per_second": [], \
+                                                   "peak_rss_kb": []})
+            curve["paragraphs"].append(run["paragraphs"])
+            for key in ("seconds", "per_second", "peak_rss_kb"):
+                curve[key].append(stage[key])
+    return curves
+
+###############################################################################
+# Function      : main()
+# Description   : Entry point for the program.
+# Arguments     : None. Command Line Arguments in Python are retrieved from
+#                 sys.argv variable of sys module.
+# Returns       : None.
+###############################################################################
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark the stages of " \
+                                     "this project on synthetic corpora.")
+    parser.add_argument("--sizes", \
+                        default=",".join(str(size) for size in \
+                                         DEFAULT_SIZES), \
+                        help="comma separated sizes of the corpora, in " \
+                             "<P> tags")
+    parser.add_argument("--vocabulary-size", type=int, \
+                        default=VOCABULARY_SIZE, \
+                        help="number of distinct words")
+    parser.add_argument("--zipf-exponent", type=float, \
+                        default=ZIPF_EXPONENT, \
+                        help="exponent of Zipf's law of word frequencies")
+    parser.add_argument("--workers", type=int, default=1, \
+                        help="number of worker processes of the stages")
+    parser.add_argument("--queries", type=int, default=NUM_OF_QUERIES, \
+                        help="number of target words queried")
+    parser.add_argument("--num-of-sim-words", type=int, \
+                        default=NUM_OF_SIM_WORDS, \
+                        help="number of similar words of each query")
+    parser.add_argument("--seed", type=int, default=1, \
+                        help="seed of the random generator")
+    parser.add_argument("--association", \
+                        choices=sorted(ASSOCIATION_MEASURES), \
+                        default=DEFAULT_ASSOCIATION, \
+                        help="association measure of the association stage")
+    parser.add_argument("--similarity", \
+                        choices=sorted(SIMILARITY_MEASURES), \
+                        default=DEFAULT_SIMILARITY, \
+                        help="similarity measure of the query stages")
+    parser.add_argument("--approximate", action="store_true", \
+                        help="also benchmark the LSH index of lsh_index.py " \
+                             "and its recall")
+    parser.add_argument("--lsh-bands", type=int, default=DEFAULT_NUM_BANDS, \
+                        help="number of LSH bands with --approximate")
+    parser.add_argument("--lsh-band-size", type=int, \
+                        default=DEFAULT_BAND_SIZE, \
+                        help="number of MinHash values in each band with " \
+                             "--approximate")
+    parser.add_argument("--work-dir", \
+                        help="directory for the synthetic data, by default " \
+                             "the temporary directory")
+    parser.add_argument("--output", \
+                        help="file to write the results into, instead of " \
+                             "standard output")
+    args = parser.parse_args()
+
+    if args.work_dir is not None and not os.path.isdir(args.work_dir):
+        os.makedirs(args.work_dir)
+
+    options = {"vocabulary_size": args.vocabulary_size, \
+               "zipf_exponent": args.zipf_exponent, \
+               "workers": args.workers, \
+               "queries": args.queries, \
+               "num_of_sim_words": args.num_of_sim_words, \
+               "seed": args.seed, \
+               "association": args.association, \
+               "similarity": args.similarity, \
+               "approximate": args.approximate, \
+               "lsh_bands": args.lsh_bands, \
+               "lsh_band_size": args.lsh_band_size, \
+               "work_dir": args.work_dir}
+
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+
+    runs = []
+    for num_paragraphs in sizes:
+        sys.stderr.write("Benchmarking %d paragraphs ...\n" % num_paragraphs)
+        runs.append(runInProcess(num_paragraphs, options))
+
+    report = {"python": sys.version.split()[0], \
+              "platform": sys.platform, \
+              "cpu_count": multiprocessing.cpu_count(), \
+              "options": options, \
+              "runs": runs, \
+              "curves": scalingCurves(runs)}
+
+    if args.output:
+        output_handle = open(args.output, 'w')
+    else:
+        output_handle = sys.stdout
+    json.dump(report, output_handle, indent=1, sort_keys=True)
+    output_handle.write("\n")
+    if args.output:
+        output_handle.close()
+
+###############################################################################
+# End of main function
+###############################################################################
+
+'''
+Boilerplate syntax to specify that main() method is the entry point for
+this program.
+'''
+
+if __name__ == '__main__':
+
+    main()
+
+##############################################################################
+# End of benchmark.py program
+#############################################################################
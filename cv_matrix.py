@@ -0,0 +1,596 @@
+##############################################################################
+# Algorithm     :   This module stores the co-occurrence vectors (CV) of all
+#                   words as a sparse matrix instead of a dict of lists of
+#                   single-entry dicts.
+#
+#                   Steps followed in this module are:
+#
+#                   1) Each word of the CV gets a row id and each relational
+#                      feature (relation, word) gets a column id. The mapping
+#                      of words and features to ids is kept in two tables.
+#
+#                   2) The co-occurrence freq of the non-zero cells are kept
+#                      in compressed sparse row (CSR) layout: for row i the
+#                      column ids are indices[indptr[i]:indptr[i+1]] and the
+#                      freq of those cells are at the same positions of freq.
+#                      Column ids are sorted inside each row.
+#
+#                   3) P(f,w) and association values (t-test by default,
+#                      see measures.py module) are kept in float arrays
+#                      parallel to freq, so no per-cell Python objects are
+#                      created.
+#
+#                   The arrays are built with Python's array module, which
+#                   stores plain C ints and doubles.
+##############################################################################
+
+#!/usr/bin/python
+
+'''
+import statements to include Python's in-built module functionalities in the
+program
+'''
+# array module is used for compact arrays of C ints and doubles
+import array
+
+# math module for logarithmic functionalities
+import math
+
+# measures module has the association measures
+from measures import associationKernel, DEFAULT_ASSOCIATION
+
+'''
+Association value of a word, whose probability is not available in p_w,
+is calculated with this log space probability. This is same as the value
+used by word_sim.py before the CV was moved to this module.
+'''
+UNKNOWN_WORD_LOG_PROB = float(-7)
+
+###############################################################################
+# Class         : CoOccurrenceMatrix
+# Description   : Sparse matrix holding the CV of all words. Rows are words
+#                 and columns are interned (relation, word) features.
+#
+#                 Attributes:
+#                 words         - list mapping row id to word
+#                 word_ids      - dict mapping word to row id
+#                 features      - list mapping column id to (relation, word)
+#                 feature_ids   - dict mapping (relation, word) to column id
+#                 indptr        - row pointers into indices/freq arrays
+#                 indices       - column ids of non-zero cells
+#                 freq          - co-occurrence freq of non-zero cells
+#                 feature_freq  - freq of each feature i.e. column sums
+#                 joint_prob    - P(f,w) of non-zero cells in log space
+#                 feature_prob  - P(f) of each feature in log space
+#                 association   - name of the association measure of
+#                                 assoc (see measures.py module)
+#                 assoc         - association of non-zero cells
+#                 assoc_sum     - sum of assoc values of each row
+#                 assoc_neg_sum - sum of negative assoc values of each row
+#                 assoc_norm    - Euclidean norm of assoc values of each
+#                                 row, computed when needed (see rowNorms)
+#                 word_freq     - corpus freq of the word of each row
+#                 word_vocab_ids
+#                               - id of the word of each row in the
+#                                 vocabulary of the relation counts it was
+#                                 built from (see fromRelationCounts)
+#                 feature_indptr, feature_rows, feature_cells
+#                               - inverted index from each feature to the
+#                                 words carrying it (see buildFeatureIndex)
+###############################################################################
+class CoOccurrenceMatrix(object):
+
+    ###########################################################################
+    # Method        : __init__(words, features, indptr, indices, freq)
+    # Description   : Creates the matrix from already built CSR arrays.
+    #                 Use fromRelationCounts to build it from relation freq.
+    ###########################################################################
+    def __init__(self, words, features, indptr, indices, freq):
+        self.words = words
+        self.word_ids = dict((word, i) for i, word in enumerate(words))
+        self.features = features
+        self.feature_ids = dict((feature, i) for i, feature in \
+                                enumerate(features))
+        self.indptr = indptr
+        self.indices = indices
+        self.freq = freq
+
+        '''
+        Freq of each feature is the sum of its column. This is same as the
+        feature_freq_dict built earlier in word_sim.py
+        '''
+        self.feature_freq = array.array('d', [0.0]) * len(features)
+        for position in xrange(len(indices)):
+            self.feature_freq[indices[position]] += freq[position]
+
+        self.joint_prob = None
+        self.feature_prob = None
+        self.association = None
+        self.assoc = None
+        self.assoc_sum = None
+        self.assoc_neg_sum = None
+        self.assoc_norm = None
+
+        self.word_freq = None
+        self.word_vocab_ids = None
+
+        self.feature_indptr = None
+        self.feature_rows = None
+        self.feature_cells = None
+
+    ###########################################################################
+    # Method        : fromRelationCounts(rel_counts)
+    # Description   : Builds the matrix out of relation freq. Each relation
+    #                 (rel, word_1, word_2) with freq n adds n to the cell
+    #                 (word_1, (rel, word_2)) and to the cell
+    #                 (word_2, (rel, word_1)). If rel has an inverse relation
+    #                 in rel_counts (e.g. "L1" for window relation "R1"), the
+    #                 second cell is (word_2, (inverse rel, word_1)).
+    #
+    #                 Relations are read as ids of rel_counts. Only words
+    #                 having a relation get a row, so the id of a word in
+    #                 the vocabulary is mapped to its row id through a dense
+    #                 array, and each feature (rel, word) is keyed by a
+    #                 single int made of the two ids. Strings of the words
+    #                 and features are looked up only once, for the tables.
+    # Arguments     : rel_counts - RelationCounts object of ingest.py module
+    # Returns       : CoOccurrenceMatrix object
+    ###########################################################################
+    @classmethod
+    def fromRelationCounts(cls, rel_counts):
+
+        num_words = len(rel_counts.words)
+        inverse_of = rel_counts.inverseOf
+
+        row_of_word = array.array('i', [-1]) * num_words
+        word_vocab_ids = array.array('i')
+        feature_keys = []
+        feature_ids = {}
+
+        '''
+        First collect the cells in coordinate (COO) form i.e. three
+        parallel arrays of row ids, column ids and freq.
+        '''
+        coo_rows = array.array('i')
+        coo_cols = array.array('i')
+        coo_freq = array.array('d')
+
+        for (relation_id, word_1_id, word_2_id), freq in \
+                rel_counts.freq.iteritems():
+
+            row_1 = row_of_word[word_1_id]
+            if row_1 < 0:
+                row_1 = row_of_word[word_1_id] = len(word_vocab_ids)
+                word_vocab_ids.append(word_1_id)
+
+            row_2 = row_of_word[word_2_id]
+            if row_2 < 0:
+                row_2 = row_of_word[word_2_id] = len(word_vocab_ids)
+                word_vocab_ids.append(word_2_id)
+
+            col_1 = _intern(relation_id * num_words + word_2_id, \
+                            feature_keys, feature_ids)
+            col_2 = _intern(inverse_of(relation_id) * num_words + \
+                            word_1_id, feature_keys, feature_ids)
+
+            coo_rows.append(row_1)
+            coo_cols.append(col_1)
+            coo_freq.append(freq)
+
+            coo_rows.append(row_2)
+            coo_cols.append(col_2)
+            coo_freq.append(freq)
+
+        indptr, indices, cell_freq = _cooToCsr(len(word_vocab_ids), \
+                                               coo_rows, coo_cols, coo_freq)
+
+        # look up the strings of words and features for the tables
+        word_strings = rel_counts.words.strings
+        relation_strings = rel_counts.relations.strings
+
+        words = [word_strings[word_id] for word_id in word_vocab_ids]
+        features = []
+        for feature_key in feature_keys:
+            relation_id, word_id = divmod(feature_key, num_words)
+            features.append((relation_strings[relation_id], \
+                             word_strings[word_id]))
+
+        cv_matrix = cls(words, features, indptr, indices, cell_freq)
+        cv_matrix.word_vocab_ids = word_vocab_ids
+        cv_matrix.buildFeatureIndex()
+
+        return cv_matrix
+
+    ###########################################################################
+    # Method        : rowOf(word)
+    # Description   : Returns row id of the word or None if word has no CV
+    ###########################################################################
+    def rowOf(self, word):
+        return self.word_ids.get(word)
+
+    ###########################################################################
+    # Method        : row(row_id, values)
+    # Description   : Returns the column ids and values of non-zero cells of
+    #                 a row. values is one of the arrays freq, joint_prob or
+    #                 assoc (assoc is used when it is not given).
+    ###########################################################################
+    def row(self, row_id, values=None):
+        if values is None:
+            values = self.assoc
+        start = self.indptr[row_id]
+        end = self.indptr[row_id + 1]
+        return self.indices[start:end], values[start:end]
+
+    ###########################################################################
+    # Method        : setWordFrequencies(word_freq)
+    # Description   : Keeps the corpus freq of the word of each row.
+    #                 word_freq is indexed by vocabulary id of words (see
+    #                 internWordCounts of ingest.py module). Words beyond
+    #                 its end get freq 0.
+    ###########################################################################
+    def setWordFrequencies(self, word_freq):
+        self.word_freq = array.array('l', [_valueOf(word_freq, word_id, 0) \
+                                           for word_id in \
+                                           self.word_vocab_ids])
+
+    ###########################################################################
+    # Method        : buildFeatureIndex()
+    # Description   : Builds the inverted index from each feature to the words
+    #                 carrying it. It is the matrix in compressed sparse column
+    #                 layout: for column j, feature_rows[feature_indptr[j]:
+    #                 feature_indptr[j+1]] are the row ids of the words having
+    #                 feature j (in increasing order) and feature_cells at the
+    #                 same positions are the positions of those cells in the
+    #                 freq, joint_prob and assoc arrays.
+    # Returns       : None
+    ###########################################################################
+    def buildFeatureIndex(self):
+
+        indptr = self.indptr
+        indices = self.indices
+
+        # count the words of each feature and convert into column offsets
+        feature_indptr = array.array('l', [0]) * (len(self.features) + 1)
+        for col in indices:
+            feature_indptr[col + 1] += 1
+        for col in xrange(len(self.features)):
+            feature_indptr[col + 1] += feature_indptr[col]
+
+        feature_rows = array.array('i', [0]) * len(indices)
+        feature_cells = array.array('l', [0]) * len(indices)
+        next_slot = array.array('l', feature_indptr)
+
+        for row_id in xrange(len(self.words)):
+            for position in xrange(indptr[row_id], indptr[row_id + 1]):
+                col = indices[position]
+                slot = next_slot[col]
+                feature_rows[slot] = row_id
+                feature_cells[slot] = position
+                next_slot[col] = slot + 1
+
+        self.feature_indptr = feature_indptr
+        self.feature_rows = feature_rows
+        self.feature_cells = feature_cells
+
+    ###########################################################################
+    # Method        : wordsWithFeature(col)
+    # Description   : Returns row ids of the words carrying a feature and the
+    #                 positions of their cells
+    ###########################################################################
+    def wordsWithFeature(self, col):
+        start = self.feature_indptr[col]
+        end = self.feature_indptr[col + 1]
+        return self.feature_rows[start:end], self.feature_cells[start:end]
+
+    ###########################################################################
+    # Method        : numRows(), numFeatures(), numCells()
+    # Description   : Shape and number of non-zero cells of the matrix
+    ###########################################################################
+    def numRows(self):
+        return len(self.words)
+
+    def numFeatures(self):
+        return len(self.features)
+
+    def numCells(self):
+        return len(self.indices)
+
+    ###########################################################################
+    # Method        : computeJointProbabilities()
+    # Description   : Calculates the MLE of P(f,w) (section 20.7.2 of JM text)
+    #                 for each non-zero cell and P(f) for each feature. Both
+    #                 are stored in log space. P(f,w) is freq of the cell
+    #                 divided by the sum of freq of its row.
+    # Returns       : None
+    ###########################################################################
+    def computeJointProbabilities(self):
+
+        log10 = math.log10
+        freq = self.freq
+        indptr = self.indptr
+
+        self.joint_prob = array.array('d', [0.0]) * len(freq)
+
+        for row_id in xrange(len(self.words)):
+            start = indptr[row_id]
+            end = indptr[row_id + 1]
+
+            log_w_prime_sum = log10(sum(freq[start:end]))
+
+            for position in xrange(start, end):
+                self.joint_prob[position] = log10(freq[position]) - \
+                                            log_w_prime_sum
+
+        total_features = sum(self.feature_freq)
+        log_total_features = log10(total_features)
+
+        self.feature_prob = array.array('d', [log10(feature_freq) - \
+                                              log_total_features \
+                                              for feature_freq in \
+                                              self.feature_freq])
+
+    ###########################################################################
+    # Method        : computeAssociation(p_w, measure)
+    # Description   : Calculates the association measure for each non-zero
+    #                 cell, t-test by default:
+    #
+    #                 assoc(w,f) = (P(f,w) - P(w)P(f)) / sqrt(P(w)P(f))
+    #
+    #                 P(f,w) and P(w)P(f) of all cells are first put into two
+    #                 flat arrays of plain probabilities, with one division
+    #                 or multiplication per cell, and the kernel of the
+    #                 measure (see measures.py module) turns them into the
+    #                 association values at once.
+    #
+    #                 Sum of all and of negative assoc values of each row
+    #                 are kept too, as they are needed by the similarity
+    #                 measures in similarity.py module.
+    #
+    # Arguments     : p_w     - P(w) of words in log space, indexed by their
+    #                           vocabulary id. Words beyond its end, or with
+    #                           None as P(w), get UNKNOWN_WORD_LOG_PROB.
+    #                 measure - name of the association measure
+    # Returns       : None
+    ###########################################################################
+    def computeAssociation(self, p_w, measure=DEFAULT_ASSOCIATION):
+
+        kernel = associationKernel(measure)
+
+        if self.feature_prob is None:
+            self.computeJointProbabilities()
+
+        indptr = self.indptr
+        indices = self.indices
+        freq = self.freq
+
+        # P(f) of each feature as a plain probability
+        feature_prob = [pow(10, log_prob) for log_prob in self.feature_prob]
+
+        joint = array.array('d')
+        expected = array.array('d')
+
+        for row_id, word_id in enumerate(self.word_vocab_ids):
+
+            word_prob = pow(10, _valueOf(p_w, word_id, \
+                                         UNKNOWN_WORD_LOG_PROB))
+
+            start = indptr[row_id]
+            end = indptr[row_id + 1]
+            row_freq = freq[start:end]
+            row_sum = sum(row_freq)
+
+            joint.extend([cell_freq / row_sum for cell_freq in row_freq])
+            expected.extend([word_prob * feature_prob[col] for col in \
+                             indices[start:end]])
+
+        self.association = measure
+        self.assoc = kernel(joint, expected)
+        self._computeRowSums()
+
+    ###########################################################################
+    # Method        : _computeRowSums()
+    # Description   : Calculates the sum and the sum of negative values of
+    #                 assoc of each row
+    ###########################################################################
+    def _computeRowSums(self):
+
+        indptr = self.indptr
+        assoc = self.assoc
+
+        self.assoc_sum = array.array('d', [0.0]) * len(self.words)
+        self.assoc_neg_sum = array.array('d', [0.0]) * len(self.words)
+        self.assoc_norm = None
+
+        for row_id in xrange(len(self.words)):
+            row_values = assoc[indptr[row_id]:indptr[row_id + 1]]
+            self.assoc_sum[row_id] = sum(row_values)
+            self.assoc_neg_sum[row_id] = sum([value for value in row_values \
+                                              if value < 0])
+
+    ###########################################################################
+    # Method        : rowNorms()
+    # Description   : Returns the Euclidean norm of assoc values of each row,
+    #                 calculating it on first use
+    ###########################################################################
+    def rowNorms(self):
+
+        if self.assoc_norm is None:
+            indptr = self.indptr
+            assoc = self.assoc
+            assoc_norm = array.array('d', [0.0]) * len(self.words)
+            for row_id in xrange(len(self.words)):
+                row_values = assoc[indptr[row_id]:indptr[row_id + 1]]
+                assoc_norm[row_id] = math.sqrt(sum([value * value for value \
+                                                    in row_values]))
+            self.assoc_norm = assoc_norm
+        return self.assoc_norm
+
+    ###########################################################################
+    # Method        : subMatrix(keep_cells)
+    # Description   : Returns a new matrix with only the cells whose position
+    #                 is marked in keep_cells. Rows and columns left without
+    #                 any cell are dropped and the rest get new ids in the
+    #                 same order. P(f,w), P(f), association values and word
+    #                 freq computed earlier are kept for the remaining cells,
+    #                 rows and columns, and the row sums of association
+    #                 values are computed again.
+    # Arguments     : keep_cells - sequence of 0/1 flags, one per cell
+    # Returns       : CoOccurrenceMatrix object
+    ###########################################################################
+    def subMatrix(self, keep_cells):
+
+        indptr = self.indptr
+        indices = self.indices
+
+        # new id of each kept column, -1 for a dropped column
+        used_cols = bytearray(len(self.features))
+        for position in xrange(len(indices)):
+            if keep_cells[position]:
+                used_cols[indices[position]] = 1
+
+        new_col = array.array('i', [-1]) * len(self.features)
+        features = []
+        for col in xrange(len(self.features)):
+            if used_cols[col]:
+                new_col[col] = len(features)
+                features.append(self.features[col])
+
+        kept_rows = array.array('i')
+        kept_cells = array.array('l')
+        sub_indptr = array.array('l', [0])
+        sub_indices = array.array('i')
+
+        for row_id in xrange(len(self.words)):
+            for position in xrange(indptr[row_id], indptr[row_id + 1]):
+                if keep_cells[position]:
+                    kept_cells.append(position)
+                    sub_indices.append(new_col[indices[position]])
+            if len(sub_indices) > sub_indptr[-1]:
+                kept_rows.append(row_id)
+                sub_indptr.append(len(sub_indices))
+
+        sub_matrix = CoOccurrenceMatrix([self.words[row_id] for row_id in \
+                                         kept_rows], features, sub_indptr, \
+                                        sub_indices, \
+                                        _take(self.freq, kept_cells))
+
+        if self.word_vocab_ids is not None:
+            sub_matrix.word_vocab_ids = _take(self.word_vocab_ids, kept_rows)
+        if self.word_freq is not None:
+            sub_matrix.word_freq = _take(self.word_freq, kept_rows)
+        if self.joint_prob is not None:
+            sub_matrix.joint_prob = _take(self.joint_prob, kept_cells)
+        if self.feature_prob is not None:
+            sub_matrix.feature_prob = array.array('d', \
+                                                  [self.feature_prob[col] \
+                                                   for col in \
+                                                   xrange(len(new_col)) \
+                                                   if new_col[col] >= 0])
+
+        if self.assoc is not None:
+            sub_matrix.association = self.association
+            sub_matrix.assoc = _take(self.assoc, kept_cells)
+            sub_matrix._computeRowSums()
+
+        sub_matrix.buildFeatureIndex()
+
+        return sub_matrix
+
+###############################################################################
+# End of CoOccurrenceMatrix class
+###############################################################################
+
+###############################################################################
+# Function      : _intern(key, table, ids)
+# Description   : Returns the id of key, adding key to the id table if it was
+#                 not seen before.
+# Arguments     : key   - key of a feature
+#                 table - list mapping id to key
+#                 ids   - dict mapping key to id
+# Returns       : id of the key
+###############################################################################
+def _intern(key, table, ids):
+    key_id = ids.get(key)
+    if key_id is None:
+        key_id = len(table)
+        ids[key] = key_id
+        table.append(key)
+    return key_id
+
+###############################################################################
+# Function      : _valueOf(values, index, default)
+# Description   : Returns values[index], or default if index is beyond the
+#                 end of values or the value is None.
+###############################################################################
+def _valueOf(values, index, default):
+    if index >= len(values) or values[index] is None:
+        return default
+    return values[index]
+
+###############################################################################
+# Function      : _take(values, positions)
+# Description   : Returns an array of the same type as values with the values
+#                 at the given positions, in their order.
+###############################################################################
+def _take(values, positions):
+    return array.array(values.typecode, [values[position] for position in \
+                                         positions])
+
+###############################################################################
+# Function      : _cooToCsr(num_rows, coo_rows, coo_cols, coo_freq)
+# Description   : Converts cells in COO form into CSR form. Rows are grouped
+#                 by a counting sort, columns are sorted inside each row and
+#                 cells repeated for the same (row, column) are summed up.
+#                 Repeated cells come from relations like (rel, a, b) and
+#                 (rel, b, a) which give the same feature to word a.
+# Arguments     : num_rows - number of rows
+#                 coo_rows, coo_cols, coo_freq - arrays of the COO cells
+# Returns       : tuple (indptr, indices, freq) of CSR arrays
+###############################################################################
+def _cooToCsr(num_rows, coo_rows, coo_cols, coo_freq):
+
+    # count cells of each row and convert counts into row offsets
+    offsets = array.array('l', [0]) * (num_rows + 1)
+    for row_id in coo_rows:
+        offsets[row_id + 1] += 1
+    for row_id in xrange(num_rows):
+        offsets[row_id + 1] += offsets[row_id]
+
+    # place each cell at the next free slot of its row
+    grouped_cols = array.array('i', [0]) * len(coo_cols)
+    grouped_freq = array.array('d', [0.0]) * len(coo_freq)
+    next_slot = array.array('l', offsets)
+
+    for position in xrange(len(coo_rows)):
+        row_id = coo_rows[position]
+        slot = next_slot[row_id]
+        grouped_cols[slot] = coo_cols[position]
+        grouped_freq[slot] = coo_freq[position]
+        next_slot[row_id] = slot + 1
+
+    # sort columns inside each row and merge the repeated ones
+    indptr = array.array('l', [0])
+    indices = array.array('i')
+    freq = array.array('d')
+
+    for row_id in xrange(num_rows):
+        start = offsets[row_id]
+        end = offsets[row_id + 1]
+
+        previous_col = -1
+        for col, value in sorted(zip(grouped_cols[start:end], \
+                                     grouped_freq[start:end])):
+            if col == previous_col:
+                freq[-1] += value
+            else:
+                indices.append(col)
+                freq.append(value)
+                previous_col = col
+
+        indptr.append(len(indices))
+
+    return indptr, indices, freq
+
+##############################################################################
+# End of cv_matrix.py module
+#############################################################################
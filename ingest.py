@@ -0,0 +1,913 @@
+##############################################################################
+# Algorithm     :   This module reads the grammatical relations from the
+#                   parse files created by Standford parser (see
+#                   parse_corpus_sentences.py) and the words of the sentence
+#                   file, and counts them.
+#
+#                   A typical grammatical relation in any parse file looks
+#                   like this:
+#
+#                   <grammatical_relation>(<word_1_in_relation> -
+#                                          <index_of_word_1_in_sentence>,
+#                                          <word_2_in relation> -
+#                                          <index_of_word_2_in_sentence>)
+#
+#                   E.g. if the original sentence in the corpus file is :
+#
+#                   "The Bush family did its best to shield the service and
+#                   reception from public view."
+#
+#                   Then the parse file showing grammatical relation will
+#                   have following contents:
+#
+#                   det(family-3, The-1)
+#                   nn(family-3, Bush-2)
+#                   nsubj(did-4, family-3)
+#                   root(ROOT-0, did-4)
+#                   poss(best-6, its-5)
+#                   dobj(did-4, best-6)
+#                   aux(shield-8, to-7)
+#                   xcomp(did-4, shield-8)
+#                   det(service-10, the-9)
+#                   dobj(shield-8, service-10)
+#                   dobj(shield-8, reception-12)
+#                   conj_and(service-10, reception-12)
+#                   amod(view-15, public-14)
+#                   prep_from(shield-8, view-15)
+#
+#                   Each relation is turned into a tuple (relation, word_1,
+#                   word_2) with both words in lower case, e.g.
+#                   ('det', 'family', 'the'). Root relations, which show the
+#                   relation of root to head word in the parse tree of a
+#                   sentence, are not of any interest and are skipped.
+#
+#                   Steps followed in this module are:
+#
+#                   1) Lines of each parse file are read lazily, one at a
+#                      time, by a generator yielding relation tuples.
+#
+#                   2) Freq of each distinct relation tuple is updated in
+#                      a RelationCounts object as soon as the tuple is read.
+#                      Words and relation names are interned into integer
+#                      ids (see vocabulary.py module), so each distinct word
+#                      is stored once and the counts are keyed by tuples of
+#                      ids. No list of all relation occurrences is built, so
+#                      memory used is bounded by the number of distinct
+#                      tuples.
+#
+#                   3) Optionally, parse files are spread over a pool of
+#                      worker processes. Each worker gives back the partial
+#                      counts of a file, with its own ids, which are mapped
+#                      to the ids of the global counts while adding them.
+#
+#                   4) Optionally, counts are kept on disk between builds
+#                      with a manifest of the parse files counted, so that
+#                      only new or changed parse files are read next time.
+#
+#                   Words of the sentence file (see parse_corpus_sentences.py)
+#                   are counted in the same streaming way: the file is read
+#                   in chunks, optionally split into byte ranges counted by
+#                   separate processes.
+#
+#                   As a faster alternative to parsing, window features can
+#                   be counted straight from the sentence file in the same
+#                   way: each pair of words at most a few words apart is
+#                   counted as a relation, e.g. ('R2', 'bush', 'did') for
+#                   "Bush family did", giving the features R2:did to "bush"
+#                   and L2:bush to "did".
+##############################################################################
+
+#!/usr/bin/python
+
+'''
+import statements to include Python's in-built module functionalities in the
+program
+'''
+# os module is used to access file manipulation features
+import os
+
+# multiprocessing module is used to count parse files in parallel
+import multiprocessing
+
+# cPickle module is used to save relation counts between builds
+import cPickle
+
+# hashlib module is used to name the saved counts of each parse file
+import hashlib
+
+# re module is used to access regular expression related facilities
+import re
+
+# string module gives the sets of letters and digits
+import string
+
+# array module is used for compact arrays of word freq
+import array
+
+# collections module gives the deque of previous words of a window
+import collections
+
+# vocabulary module interns words and relation names into integer ids
+from vocabulary import Vocabulary
+
+# metrics module records time and counts of reading the corpus
+import metrics
+
+'''
+Name of the file keeping relation counts and manifest of parse files in
+the counts directory of updateRelationCounts
+'''
+COUNTS_STATE_FILE = "relation_counts.pickle"
+
+'''
+Version of the layout of counts saved in the counts directory. Counts saved
+with another version are thrown away and the parse files are counted again.
+'''
+COUNTS_STATE_VERSION = 3
+
+'''
+Words of the sentence file are runs of these characters, same as \w of
+regular expressions. Sentence file is read DEFAULT_CHUNK_SIZE bytes at a
+time.
+'''
+WORD_CHARS = string.ascii_letters + string.digits + "_"
+WORD_PATTERN = re.compile(r'\w+')
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+'''
+Default number of words on each side of a word taken as its context by
+countWindowFeatures
+'''
+DEFAULT_WINDOW = 2
+
+###############################################################################
+# Class         : RelationCounts
+# Description   : Freq of grammatical relation tuples with the words and
+#                 relation names interned into dense integer ids (see
+#                 vocabulary.py module).
+#
+#                 Attributes:
+#                 words     - Vocabulary of words of the relations
+#                 relations - Vocabulary of relation names
+#                 freq      - dict with (relation_id, word_1_id, word_2_id)
+#                             tuples as keys and their freq as values
+#                 inverses  - dict mapping id of a relation to the id of
+#                             its inverse relation. A relation which is not
+#                             in it is its own inverse. (see setInverse)
+###############################################################################
+class RelationCounts(object):
+
+    def __init__(self, words=None, relations=None):
+        self.words = words if words is not None else Vocabulary()
+        self.relations = relations if relations is not None else Vocabulary()
+        self.freq = {}
+        self.inverses = {}
+
+    ###########################################################################
+    # Method        : setInverse(relation, inverse_relation)
+    # Description   : Sets the name of the relation seen from word_2. By
+    #                 default word_2 gets the feature (relation, word_1),
+    #                 like word_1 gets (relation, word_2). With an inverse
+    #                 relation, word_2 gets (inverse_relation, word_1)
+    #                 instead. Returns the id of relation.
+    ###########################################################################
+    def setInverse(self, relation, inverse_relation):
+        relation_id = self.relations.idOf(relation)
+        self.inverses[relation_id] = self.relations.idOf(inverse_relation)
+        return relation_id
+
+    ###########################################################################
+    # Method        : inverseOf(relation_id)
+    # Description   : Returns the id of the inverse relation of a relation
+    ###########################################################################
+    def inverseOf(self, relation_id):
+        return self.inverses.get(relation_id, relation_id)
+
+    ###########################################################################
+    # Method        : add(relation, word_1, word_2, count)
+    # Description   : Adds count to the freq of relation tuple given in
+    #                 strings.
+    ###########################################################################
+    def add(self, relation, word_1, word_2, count=1):
+        key = (self.relations.idOf(relation), self.words.idOf(word_1), \
+               self.words.idOf(word_2))
+        self.freq[key] = self.freq.get(key, 0) + count
+
+    ###########################################################################
+    # Method        : merge(other), subtract(other)
+    # Description   : Add the counts of other into these counts, or take them
+    #                 out. Ids of other are mapped to the ids of these counts
+    #                 through the strings they stand for, since counts made
+    #                 by different worker processes have their own ids.
+    #                 Relation tuples whose count drops to 0 are removed.
+    ###########################################################################
+    def merge(self, other):
+        mergeCounts(self.freq, self._remapped(other))
+        return self
+
+    def subtract(self, other):
+        subtractCounts(self.freq, self._remapped(other))
+        return self
+
+    def _remapped(self, other):
+        if other.words is self.words and other.relations is self.relations:
+            return other.freq
+
+        word_map = self.words.remap(other.words)
+        relation_map = self.relations.remap(other.relations)
+
+        for relation_id, inverse_id in other.inverses.iteritems():
+            self.inverses[relation_map[relation_id]] = relation_map[inverse_id]
+
+        return dict(((relation_map[relation_id], word_map[word_1_id], \
+                      word_map[word_2_id]), freq) for \
+                    (relation_id, word_1_id, word_2_id), freq in \
+                    other.freq.iteritems())
+
+    ###########################################################################
+    # Method        : iterStrings()
+    # Description   : Generator of ((relation, word_1, word_2), freq) with
+    #                 the ids turned back into strings.
+    ###########################################################################
+    def iterStrings(self):
+        words = self.words.strings
+        relations = self.relations.strings
+        for (relation_id, word_1_id, word_2_id), freq in \
+                self.freq.iteritems():
+            yield (relations[relation_id], words[word_1_id], \
+                   words[word_2_id]), freq
+
+    def __len__(self):
+        return len(self.freq)
+
+###############################################################################
+# End of RelationCounts class
+###############################################################################
+
+###############################################################################
+# Function      : parseFilePaths(parse_directory)
+# Description   : Returns the paths of all parse files present in the parse
+#                 directory. Other types of files can be there in the parse
+#                 directory, so only the files having ".parse" in their name
+#                 are taken. Parse files still being written by the parser
+#                 have ".partial" in their name and are left out.
+# Arguments     : parse_directory - path of directory of parse files
+# Returns       : sorted list of paths of parse files
+###############################################################################
+def parseFilePaths(parse_directory):
+    return sorted(os.path.join(parse_directory, parse_file_name) for \
+                  parse_file_name in os.listdir(parse_directory) \
+                  if ".parse" in parse_file_name and \
+                     ".partial" not in parse_file_name)
+
+###############################################################################
+# Function      : parseRelation(parse_file_line)
+# Description   : Splits a line of parse file into grammatical relation,
+#                 word_1 and word_2.
+# Arguments     : parse_file_line - line of a parse file
+# Returns       : tuple (relation, word_1, word_2) with words in lower case,
+#                 or None if line has no relation of interest
+###############################################################################
+def parseRelation(parse_file_line):
+
+    if "(" not in parse_file_line:
+        return None
+
+    grammar_relation, words_list = parse_file_line.split('(', 1)
+
+    if grammar_relation == "root":
+        return None
+
+    words_list = words_list.split(',')
+    if len(words_list) < 2:
+        # incomplete line, e.g. at the end of a truncated parse file
+        return None
+
+    word_1 = words_list[0].split('-')[0]
+    word_2 = words_list[1].split('-')[0].strip()
+
+    return (grammar_relation, word_1.lower(), word_2.lower())
+
+###############################################################################
+# Function      : iterRelations(parse_file_path)
+# Description   : Generator reading a parse file line by line and yielding
+#                 its grammatical relations.
+# Arguments     : parse_file_path - path of a parse file
+# Returns       : generator of (relation, word_1, word_2) tuples
+###############################################################################
+def iterRelations(parse_file_path):
+
+    parse_file_handle = open(parse_file_path, 'r')
+    try:
+        for parse_file_line in parse_file_handle:
+            relation_tuple = parseRelation(parse_file_line)
+            if relation_tuple is not None:
+                yield relation_tuple
+    finally:
+        parse_file_handle.close()
+
+###############################################################################
+# Function      : countRelations(parse_file_paths, rel_counts)
+# Description   : Counts the grammatical relations of parse files.
+# Arguments     : parse_file_paths - list of paths of parse files
+#                 rel_counts       - RelationCounts to add the counts into. A
+#                                    new one is created when it is not given.
+# Returns       : RelationCounts object
+###############################################################################
+def countRelations(parse_file_paths, rel_counts=None):
+
+    if rel_counts is None:
+        rel_counts = RelationCounts()
+
+    num_of_relations = 0
+    for parse_file_path in parse_file_paths:
+        for relation, word_1, word_2 in iterRelations(parse_file_path):
+            rel_counts.add(relation, word_1, word_2)
+            num_of_relations += 1
+
+    metrics.count("ingest.parse_files", len(parse_file_paths))
+    metrics.count("ingest.relations", num_of_relations)
+
+    return rel_counts
+
+###############################################################################
+# Function      : countRelationsParallel(parse_file_paths, num_workers,
+#                                        rel_counts)
+# Description   : Counts the grammatical relations of parse files using a
+#                 pool of worker processes. Each worker counts one parse file
+#                 at a time into its own partial RelationCounts and the
+#                 partial counts are merged into the global counts as they
+#                 arrive. Since merging is just adding counts, the result
+#                 does not depend on the order in which files finish.
+# Arguments     : parse_file_paths - list of paths of parse files
+#                 num_workers      - number of worker processes. With 1
+#                                    worker the files are counted in this
+#                                    process by countRelations.
+#                 rel_counts       - RelationCounts to add the counts into. A
+#                                    new one is created when it is not given.
+# Returns       : RelationCounts object
+###############################################################################
+@metrics.timed("count_relations")
+def countRelationsParallel(parse_file_paths, num_workers, rel_counts=None):
+
+    if rel_counts is None:
+        rel_counts = RelationCounts()
+
+    if num_workers <= 1 or len(parse_file_paths) <= 1:
+        return countRelations(parse_file_paths, rel_counts)
+
+    for parse_file_path, partial_rel_counts in \
+            iterFileCounts(parse_file_paths, num_workers):
+        rel_counts.merge(partial_rel_counts)
+
+    return rel_counts
+
+###############################################################################
+# Function      : iterFileCounts(parse_file_paths, num_workers)
+# Description   : Generator counting the grammatical relations of each parse
+#                 file separately, in a pool of num_workers processes when
+#                 more than one worker is asked for. Files are given out in
+#                 the order in which they finish.
+# Arguments     : parse_file_paths - list of paths of parse files
+#                 num_workers      - number of worker processes
+# Returns       : generator of (parse_file_path, partial RelationCounts)
+#                 tuples
+###############################################################################
+def iterFileCounts(parse_file_paths, num_workers):
+
+    if num_workers <= 1 or len(parse_file_paths) <= 1:
+        for parse_file_path in parse_file_paths:
+            yield _countParseFile(parse_file_path)
+        return
+
+    pool = multiprocessing.Pool(min(num_workers, len(parse_file_paths)))
+    try:
+        for file_counts in pool.imap_unordered(_countParseFile, \
+                                               parse_file_paths):
+            _countIngested(file_counts[1])
+            yield file_counts
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+###############################################################################
+# Function      : updateRelationCounts(parse_file_paths, counts_directory,
+#                                      num_workers)
+# Description   : Incremental version of countRelationsParallel. Relation
+#                 counts are kept in counts_directory together with a
+#                 manifest of the parse files already counted into them. The
+#                 manifest has the size and modification time of each file.
+#
+#                 On each call only the parse files which are new or whose
+#                 size or modification time changed are read. Counts of the
+#                 changed files, and of the files which are no longer given,
+#                 are taken out using the counts of each file, which are
+#                 also kept in counts_directory.
+#
+#                 Counts and manifest are saved together in one file, which
+#                 is written with a temporary name and then renamed. So if
+#                 the update is stopped halfway, the next call starts again
+#                 from the last complete state.
+# Arguments     : parse_file_paths - list of paths of parse files
+#                 counts_directory - directory keeping the counts
+#                 num_workers      - number of worker processes
+# Returns       : RelationCounts object
+###############################################################################
+@metrics.timed("count_relations")
+def updateRelationCounts(parse_file_paths, counts_directory, num_workers=1):
+
+    if not os.path.exists(counts_directory):
+        os.makedirs(counts_directory)
+
+    state = _loadCountsState(counts_directory)
+    manifest = state["manifest"]
+    rel_counts = state["rel_counts"]
+
+    current_files = {}
+    for parse_file_path in parse_file_paths:
+        parse_file_path = os.path.abspath(parse_file_path)
+        current_files[parse_file_path] = _fileSignature(parse_file_path)
+
+    stale_files = [parse_file_path for parse_file_path, entry in \
+                   manifest.iteritems() if \
+                   current_files.get(parse_file_path) != entry["signature"]]
+    fresh_files = [parse_file_path for parse_file_path, signature in \
+                   sorted(current_files.iteritems()) if \
+                   parse_file_path not in manifest or \
+                   manifest[parse_file_path]["signature"] != signature]
+
+    # take out the counts of changed and removed files
+    new_manifest = dict(manifest)
+    for parse_file_path in stale_files:
+        entry = new_manifest.pop(parse_file_path)
+        rel_counts.subtract(_loadPickle(os.path.join(counts_directory, \
+                                                     entry["counts"])))
+
+    # count new and changed files
+    for parse_file_path, partial_rel_counts in \
+            iterFileCounts(fresh_files, num_workers):
+        signature = current_files[parse_file_path]
+        counts_name = _fileCountsName(parse_file_path, signature)
+
+        _savePickle(partial_rel_counts, os.path.join(counts_directory, \
+                                                     counts_name))
+        rel_counts.merge(partial_rel_counts)
+        new_manifest[parse_file_path] = {"signature": signature, \
+                                         "counts": counts_name}
+
+    metrics.count("ingest.stale_parse_files", len(stale_files))
+    metrics.count("ingest.unchanged_parse_files", \
+                  len(current_files) - len(fresh_files))
+
+    if stale_files or fresh_files or not state["saved"]:
+        _savePickle({"version": COUNTS_STATE_VERSION, \
+                     "manifest": new_manifest, \
+                     "rel_counts": rel_counts}, \
+                    os.path.join(counts_directory, COUNTS_STATE_FILE))
+
+    # counts of changed and removed files are not needed any more
+    for parse_file_path in stale_files:
+        os.remove(os.path.join(counts_directory, \
+                               manifest[parse_file_path]["counts"]))
+
+    return rel_counts
+
+###############################################################################
+# End of updateRelationCounts function
+###############################################################################
+
+###############################################################################
+# Function      : countWords(sent_file, num_workers, chunk_size)
+# Description   : Counts the words of the sentence file. A word is a run of
+#                 \w characters (letters, digits and underscore) and is
+#                 counted in lower case, the same as
+#                 re.findall('\w+', text.lower()) would find it.
+#
+#                 File is read in chunks of chunk_size bytes. A word running
+#                 over the end of a chunk is carried over to the next chunk,
+#                 so only a chunk and a word are in memory at a time.
+#
+#                 With more than one worker, the file is split into byte
+#                 ranges counted by a pool of processes. A word belongs to
+#                 the range in which it starts, so no word is lost or
+#                 counted twice at the borders of ranges.
+# Arguments     : sent_file   - path of the sentence file
+#                 num_workers - number of worker processes
+#                 chunk_size  - number of bytes read at a time
+# Returns       : dict with words as keys and their freq as values
+###############################################################################
+@metrics.timed("count_words")
+def countWords(sent_file, num_workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+
+    metrics.count("ingest.sentence_bytes", os.path.getsize(sent_file))
+
+    word_frq_dict = {}
+
+    for partial_word_frq_dict in _iterRangeCounts(_countWordRange, \
+                                                  sent_file, (), \
+                                                  num_workers, chunk_size):
+        mergeCounts(word_frq_dict, partial_word_frq_dict)
+
+    return word_frq_dict
+
+###############################################################################
+# Function      : countWindowFeatures(sent_file, window, num_workers,
+#                                     chunk_size)
+# Description   : Counts window features of the words of the sentence file,
+#                 as a faster alternative to the grammatical relations of
+#                 parse files.
+#
+#                 Words are read the same way as by countWords. Each pair
+#                 of words at most window words apart is counted as the
+#                 relation tuple ("R<d>", word_1, word_2), where word_2 is
+#                 d words to the right of word_1. Its inverse relation is
+#                 "L<d>". So word_1 gets the feature ("R<d>", word_2) and
+#                 word_2 gets the feature ("L<d>", word_1), e.g. for
+#                 "the bush family" with window 2, "bush" has the features
+#                 L1:the and R1:family.
+#
+#                 Windows run over the ends of lines, since a sentence of
+#                 the sentence file can be spread over many lines.
+#
+#                 With more than one worker, the file is split into byte
+#                 ranges counted by a pool of processes. A pair belongs to
+#                 the range in which its first word starts, and a worker
+#                 reads up to window words after the end of its range, so
+#                 the counts are the same for any number of workers.
+# Arguments     : sent_file   - path of the sentence file
+#                 window      - number of words on each side of a word
+#                               taken as its context
+#                 num_workers - number of worker processes
+#                 chunk_size  - number of bytes read at a time
+# Returns       : RelationCounts object
+###############################################################################
+@metrics.timed("count_window_features")
+def countWindowFeatures(sent_file, window=DEFAULT_WINDOW, num_workers=1, \
+                        chunk_size=DEFAULT_CHUNK_SIZE):
+
+    rel_counts = RelationCounts()
+    _addWindowRelations(rel_counts, window)
+
+    for partial_rel_counts in _iterRangeCounts(_countWindowRange, \
+                                               sent_file, (window,), \
+                                               num_workers, chunk_size):
+        rel_counts.merge(partial_rel_counts)
+        metrics.count("ingest.relations", \
+                      sum(partial_rel_counts.freq.itervalues()))
+
+    return rel_counts
+
+###############################################################################
+# Function      : _iterRangeCounts(count_function, sent_file, extra_args,
+#                                  num_workers, chunk_size)
+# Description   : Generator splitting the sentence file into byte ranges and
+#                 giving back count_function(range_args) of each range, in
+#                 a pool of processes when more than one worker is asked
+#                 for. range_args is the tuple (sent_file, start, end,
+#                 chunk_size) followed by extra_args.
+###############################################################################
+def _iterRangeCounts(count_function, sent_file, extra_args, num_workers, \
+                     chunk_size):
+
+    file_size = os.path.getsize(sent_file)
+
+    if num_workers <= 1 or file_size <= chunk_size:
+        yield count_function((sent_file, 0, file_size, chunk_size) + \
+                             extra_args)
+        return
+
+    '''
+    Use a few ranges per worker, so that a slow range does not keep the
+    other workers waiting.
+    '''
+    num_ranges = min(num_workers * 4, max(1, file_size // chunk_size))
+    byte_ranges = [(sent_file, file_size * i // num_ranges, \
+                    file_size * (i + 1) // num_ranges, chunk_size) + \
+                   extra_args for i in xrange(num_ranges)]
+
+    pool = multiprocessing.Pool(min(num_workers, num_ranges))
+    try:
+        for partial_counts in pool.imap_unordered(count_function, \
+                                                  byte_ranges):
+            yield partial_counts
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+###############################################################################
+# Function      : _countWordRange(range_args)
+# Description   : Counts the words starting in a byte range of the sentence
+#                 file. Work done by a worker process of countWords.
+# Arguments     : range_args - tuple (sent_file, start, end, chunk_size)
+# Returns       : dict with words as keys and their freq as values
+###############################################################################
+def _countWordRange(range_args):
+
+    word_frq_dict = {}
+
+    for words in _iterWordBatches(*range_args):
+        for word in words:
+            word_frq_dict[word] = word_frq_dict.get(word, 0) + 1
+
+    return word_frq_dict
+
+###############################################################################
+# Function      : _countWindowRange(range_args)
+# Description   : Counts the window features of the words starting in a byte
+#                 range of the sentence file. Work done by a worker process
+#                 of countWindowFeatures.
+# Arguments     : range_args - tuple (sent_file, start, end, chunk_size,
+#                                window)
+# Returns       : RelationCounts object
+###############################################################################
+def _countWindowRange(range_args):
+
+    sent_file, start, end, chunk_size, window = range_args
+
+    rel_counts = RelationCounts()
+    right_ids = _addWindowRelations(rel_counts, window)
+
+    word_ids = rel_counts.words.ids
+    intern = rel_counts.words.idOf
+    freq = rel_counts.freq
+
+    '''
+    previous holds the ids of the last window words of the range, the
+    nearest one first.
+    '''
+    previous = collections.deque(maxlen=window)
+
+    for words in _iterWordBatches(sent_file, start, end, chunk_size):
+        for word in words:
+            word_id = word_ids.get(word)
+            if word_id is None:
+                word_id = intern(word)
+
+            for distance, previous_id in enumerate(previous):
+                key = (right_ids[distance], previous_id, word_id)
+                freq[key] = freq.get(key, 0) + 1
+
+            previous.appendleft(word_id)
+
+    '''
+    Pair the last words of the range with up to window words after the
+    end of the range. Those words are counted by the next range, so they
+    are not added to previous.
+    '''
+    following = []
+    for words in _iterWordBatches(sent_file, end, None, chunk_size):
+        following.extend(words[:window - len(following)])
+        if len(following) >= window:
+            break
+
+    previous = list(previous)
+    for position, word in enumerate(following):
+        word_id = intern(word)
+        for distance in xrange(position, min(window, \
+                                             len(previous) + position)):
+            key = (right_ids[distance], previous[distance - position], \
+                   word_id)
+            freq[key] = freq.get(key, 0) + 1
+
+    return rel_counts
+
+###############################################################################
+# Function      : _addWindowRelations(rel_counts, window)
+# Description   : Adds the window relations "R1" ... "R<window>" and their
+#                 inverse relations "L1" ... "L<window>" to rel_counts.
+# Returns       : list of the ids of "R1" ... "R<window>"
+###############################################################################
+def _addWindowRelations(rel_counts, window):
+
+    right_ids = []
+    for distance in xrange(1, window + 1):
+        right_ids.append(rel_counts.setInverse("R" + str(distance), \
+                                               "L" + str(distance)))
+    return right_ids
+
+###############################################################################
+# Function      : _iterWordBatches(sent_file, start, end, chunk_size)
+# Description   : Generator reading the words starting in a byte range of the
+#                 sentence file, in lower case. Words are given back in a
+#                 list for each chunk read.
+#
+#                 A word running over the start of the range belongs to the
+#                 range before it and is skipped. A word running over the
+#                 end of the range is read up to its end.
+# Arguments     : sent_file  - path of the sentence file
+#                 start, end - byte range. end can be None for the end of
+#                              the file.
+#                 chunk_size - number of bytes read at a time
+# Returns       : generator of lists of words
+###############################################################################
+def _iterWordBatches(sent_file, start, end, chunk_size):
+
+    if end is None:
+        end = os.path.getsize(sent_file)
+
+    sent_handle = open(sent_file, 'rb')
+    try:
+        '''
+        A word running over the start of the range belongs to the range
+        before this one, so skip it.
+        '''
+        skip_partial_word = False
+        if start > 0:
+            sent_handle.seek(start - 1)
+            previous_char = sent_handle.read(1)
+            skip_partial_word = previous_char != "" and \
+                                previous_char.lstrip(WORD_CHARS) == ""
+
+        sent_handle.seek(start)
+        position = start
+        carry = ""
+
+        while position < end:
+            chunk = sent_handle.read(min(chunk_size, end - position))
+            if not chunk:
+                break
+            position += len(chunk)
+
+            if skip_partial_word:
+                rest = chunk.lstrip(WORD_CHARS)
+                if not rest:
+                    continue
+                chunk = rest
+                skip_partial_word = False
+
+            '''
+            Give the words of the chunk except the one at its end, which
+            may continue in the next chunk.
+            '''
+            text = carry + chunk
+            complete_length = len(text.rstrip(WORD_CHARS))
+            carry = text[complete_length:]
+            yield WORD_PATTERN.findall(text[:complete_length].lower())
+
+        # read the rest of a word running over the end of the range
+        while carry:
+            chunk = sent_handle.read(chunk_size)
+            if not chunk:
+                break
+            rest = chunk.lstrip(WORD_CHARS)
+            carry += chunk[:len(chunk) - len(rest)]
+            if rest:
+                break
+
+        if carry:
+            yield [carry.lower()]
+    finally:
+        sent_handle.close()
+
+###############################################################################
+# Function      : internWordCounts(word_frq_dict, vocabulary)
+# Description   : Turns the word counts of countWords into an array indexed
+#                 by the ids of the words in vocabulary. Words not yet in
+#                 vocabulary are added to it.
+# Arguments     : word_frq_dict - dict with words as keys and their freq as
+#                                 values
+#                 vocabulary    - Vocabulary of words
+# Returns       : array of freq of each word id
+###############################################################################
+def internWordCounts(word_frq_dict, vocabulary):
+
+    for word in word_frq_dict:
+        vocabulary.idOf(word)
+
+    word_freq = array.array('l', [0]) * len(vocabulary)
+    for word, freq in word_frq_dict.iteritems():
+        word_freq[vocabulary.lookup(word)] = freq
+
+    return word_freq
+
+###############################################################################
+# Function      : mergeCounts(counts, partial_counts)
+# Description   : Adds partial counts into counts.
+# Arguments     : counts         - dict of counts to add into
+#                 partial_counts - dict of counts to be added
+# Returns       : dict counts
+###############################################################################
+def mergeCounts(counts, partial_counts):
+
+    for key, freq in partial_counts.iteritems():
+        counts[key] = counts.get(key, 0) + freq
+    return counts
+
+###############################################################################
+# Function      : subtractCounts(counts, partial_counts)
+# Description   : Takes partial counts out of counts. Keys whose count drops
+#                 to 0 are removed.
+# Arguments     : counts         - dict of counts to take out from
+#                 partial_counts - dict of counts to be taken out
+# Returns       : dict counts
+###############################################################################
+def subtractCounts(counts, partial_counts):
+
+    for key, freq in partial_counts.iteritems():
+        remaining = counts.get(key, 0) - freq
+        if remaining > 0:
+            counts[key] = remaining
+        else:
+            counts.pop(key, None)
+    return counts
+
+###############################################################################
+# Function      : saveCorpusCounts(counts_path, word_frq_dict, rel_counts),
+#                 loadCorpusCounts(counts_path)
+# Description   : Write and read the word counts of the sentence file and the
+#                 relation counts together in one file, so that the model
+#                 can be built from them later without reading the corpus
+#                 again. The file is written with a temporary name and then
+#                 renamed.
+# Returns       : loadCorpusCounts returns tuple (word_frq_dict, rel_counts)
+###############################################################################
+def saveCorpusCounts(counts_path, word_frq_dict, rel_counts):
+    _savePickle({"version": COUNTS_STATE_VERSION, \
+                 "word_frq_dict": word_frq_dict, \
+                 "rel_counts": rel_counts}, counts_path)
+
+def loadCorpusCounts(counts_path):
+    counts = _loadPickle(counts_path)
+    if counts.get("version") != COUNTS_STATE_VERSION:
+        raise ValueError(counts_path + " was saved by another version of " \
+                         "this program")
+    return counts["word_frq_dict"], counts["rel_counts"]
+
+###############################################################################
+# Function      : _countIngested(partial_rel_counts)
+# Description   : Counts a parse file and its relations, counted by a worker
+#                 process, in the metrics of this process. Files counted in
+#                 this process are counted by countRelations.
+###############################################################################
+def _countIngested(partial_rel_counts):
+    metrics.count("ingest.parse_files")
+    metrics.count("ingest.relations", \
+                  sum(partial_rel_counts.freq.itervalues()))
+
+###############################################################################
+# Function      : _countParseFile(parse_file_path)
+# Description   : Counts one parse file. Work done by a worker process of
+#                 iterFileCounts.
+###############################################################################
+def _countParseFile(parse_file_path):
+    return parse_file_path, countRelations([parse_file_path])
+
+###############################################################################
+# Function      : _fileSignature(path), _fileCountsName(path, signature)
+# Description   : Size and modification time of a file, and name of the file
+#                 keeping its counts in the counts directory. The name
+#                 depends on the signature, so the counts of a changed file
+#                 never overwrite the counts still listed in the manifest.
+###############################################################################
+def _fileSignature(path):
+    file_stat = os.stat(path)
+    return [file_stat.st_size, file_stat.st_mtime]
+
+def _fileCountsName(path, signature):
+    return hashlib.md5(repr((path, signature))).hexdigest() + ".counts"
+
+###############################################################################
+# Function      : _loadCountsState(counts_directory)
+# Description   : Loads the saved counts and manifest of counts_directory. An
+#                 empty state is given when nothing was saved yet, or when
+#                 it was saved with another COUNTS_STATE_VERSION.
+###############################################################################
+def _loadCountsState(counts_directory):
+
+    state_path = os.path.join(counts_directory, COUNTS_STATE_FILE)
+    if os.path.exists(state_path):
+        state = _loadPickle(state_path)
+        if state.get("version") == COUNTS_STATE_VERSION:
+            state["saved"] = True
+            return state
+
+    return {"manifest": {}, "rel_counts": RelationCounts(), "saved": False}
+
+###############################################################################
+# Function      : _savePickle(value, path), _loadPickle(path)
+# Description   : Write and read a value in pickle format. The file is written
+#                 with a temporary name and then renamed.
+###############################################################################
+def _savePickle(value, path):
+    temp_path = path + ".tmp"
+    pickle_handle = open(temp_path, 'wb')
+    cPickle.dump(value, pickle_handle, cPickle.HIGHEST_PROTOCOL)
+    pickle_handle.close()
+    os.rename(temp_path, path)
+
+def _loadPickle(path):
+    pickle_handle = open(path, 'rb')
+    try:
+        return cPickle.load(pickle_handle)
+    finally:
+        pickle_handle.close()
+
+##############################################################################
+# End of ingest.py module
+#############################################################################
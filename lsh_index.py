@@ -0,0 +1,476 @@
+##############################################################################
+# Algorithm     :   This module is an approximate index for finding words
+#                   similar to a target word without scoring all the words
+#                   sharing a feature with it. It is optional; similarity.py
+#                   module gives the exact results.
+#
+#                   Steps followed in this module are:
+#
+#                   1) Each word gets a signature of num_bands * band_size
+#                      weighted MinHash values of its association vector.
+#                      Consistent weighted sampling (Ioffe, 2010) is used:
+#                      for hash k, every feature f with weight w gets
+#
+#                          t = floor(ln(w) / r + beta)
+#                          ln(a) = ln(c) - r * (t - beta + 1)
+#
+#                      with r and c drawn from Gamma(2,1) and beta from
+#                      U(0,1) for each (k, f), and the hash value is the
+#                      feature with the lowest a. Only the feature is kept,
+#                      without t ("0-bit" CWS, Li 2015). Two words get the
+#                      same value with probability close to the weighted
+#                      Jaccard's similarity of their vectors.
+#
+#                      Weights must be positive, so the positive t-test
+#                      association values of a word are used. Negative
+#                      values only lower Jaccard's score of similar words,
+#                      so they are left to the exact re-ranking of step 3.
+#
+#                   2) The signature is cut into num_bands bands of
+#                      band_size values (LSH banding). Words having the same
+#                      values in a band fall into the same bucket of that
+#                      band. For each band the hash of its values of every
+#                      word is kept in a sorted array, so the bucket of a
+#                      word is found by binary search.
+#
+#                   3) Candidates of a target word are the words sharing a
+#                      bucket with it in any band. They are scored with the
+#                      exact Jaccard's measure of similarity.py module and
+#                      the best num_of_sim_words are returned.
+#
+#                   Recall and speed are traded by the shape of the bands.
+#                   A word with similarity s to the target is a candidate
+#                   with probability 1 - (1 - s ** band_size) ** num_bands,
+#                   so more bands or shorter bands give more candidates and
+#                   better recall at the cost of query time. max_candidates
+#                   further limits the candidates scored at query time to
+#                   those sharing the most buckets with the target.
+#
+#                   The index can be saved into a file in the layout of
+#                   model files and memory mapped back (see model_file.py
+#                   module), so it is built only once for a model.
+##############################################################################
+
+#!/usr/bin/python
+
+'''
+import statements to include Python's in-built module functionalities in the
+program
+'''
+# array module is used for compact arrays of signatures and buckets
+import array
+
+# math module is used for logarithms of weights
+import math
+
+# random module draws the parameters of the hash functions
+import random
+
+# bisect module finds the bucket of a word in the sorted band arrays
+import bisect
+
+# heapq module picks the best candidates
+import heapq
+
+# model_file module writes and memory maps the index file
+from model_file import writeSectionFile, mapSectionFile, MappedArray, \
+                       wordsChecksum
+
+# similarity module scores the candidates exactly
+from similarity import mostSimilar, rowSharedMin
+
+# measures module has the similarity measures of the re-ranking
+from measures import similarityMeasure, DEFAULT_SIMILARITY
+
+# metrics module counts the candidates of approximate queries
+import metrics
+
+'''
+Default shape of the bands and seed of the hash functions. With 32 bands of
+2 values, a word with similarity 0.3 to the target is a candidate with
+probability 0.95 and one with similarity 0.1 with probability 0.28.
+'''
+DEFAULT_NUM_BANDS = 32
+DEFAULT_BAND_SIZE = 2
+DEFAULT_SEED = 1
+
+'''
+Magic bytes and format version at the start of each index file
+'''
+INDEX_MAGIC = "WSIMLSHI"
+INDEX_VERSION = 2
+
+'''
+Arrays of MinHashIndex which are saved into the index file
+'''
+INDEX_ARRAYS = ("row_keys", "indexed", "band_starts", "band_keys", \
+                "band_rows")
+
+###############################################################################
+# Class         : MinHashIndex
+# Description   : LSH index over the weighted MinHash signatures of the words
+#                 of a CoOccurrenceMatrix.
+#
+#                 Attributes:
+#                 num_bands, band_size, seed
+#                             - parameters the index was built with
+#                 num_rows, num_features, association, words_checksum
+#                             - shape, association measure and checksum of
+#                               the words (see wordsChecksum of
+#                               model_file.py module) of the matrix the
+#                               index belongs to
+#                 row_keys    - hash of band j of row i at i * num_bands + j
+#                 indexed     - 1 for rows having a positive association,
+#                               which are in the buckets, 0 for others
+#                 band_starts - band j is at band_starts[j]:band_starts[j+1]
+#                               of band_keys and band_rows
+#                 band_keys   - for each band, hashes of the band of all
+#                               indexed rows in increasing order
+#                 band_rows   - row id at the same position of band_keys
+###############################################################################
+class MinHashIndex(object):
+
+    def __init__(self, num_bands, band_size, seed, num_rows, num_features, \
+                 association, words_checksum):
+        self.num_bands = num_bands
+        self.band_size = band_size
+        self.seed = seed
+        self.num_rows = num_rows
+        self.num_features = num_features
+        self.association = association
+        self.words_checksum = words_checksum
+
+        self.row_keys = None
+        self.indexed = None
+        self.band_starts = None
+        self.band_keys = None
+        self.band_rows = None
+
+        self._mmap = None
+
+    ###########################################################################
+    # Method        : build(cv_matrix, num_bands, band_size, seed)
+    # Description   : Builds the index of all words of the matrix (see steps
+    #                 1 and 2 of the module description).
+    # Arguments     : cv_matrix - CoOccurrenceMatrix with association
+    #                             computed
+    #                 num_bands - number of bands
+    #                 band_size - number of MinHash values in each band
+    #                 seed      - seed of the hash functions
+    # Returns       : MinHashIndex object
+    ###########################################################################
+    @classmethod
+    def build(cls, cv_matrix, num_bands=DEFAULT_NUM_BANDS, \
+              band_size=DEFAULT_BAND_SIZE, seed=DEFAULT_SEED):
+
+        num_rows = cv_matrix.numRows()
+        lsh_index = cls(num_bands, band_size, seed, num_rows, \
+                        cv_matrix.numFeatures(), cv_matrix.association, \
+                        wordsChecksum(cv_matrix))
+
+        num_hashes = num_bands * band_size
+        signatures, indexed = minHashSignatures(cv_matrix, num_hashes, seed)
+
+        row_keys = array.array('l')
+        for row_id in xrange(num_rows):
+            start = row_id * num_hashes
+            for band_start in xrange(start, start + num_hashes, band_size):
+                row_keys.append(hash(tuple(signatures[band_start: \
+                                                      band_start + \
+                                                      band_size])))
+
+        band_starts = array.array('l', [0])
+        band_keys = array.array('l')
+        band_rows = array.array('i')
+        indexed_rows = [row_id for row_id in xrange(num_rows) \
+                        if indexed[row_id]]
+
+        for band in xrange(num_bands):
+            for key, row_id in sorted((row_keys[row_id * num_bands + band], \
+                                       row_id) for row_id in indexed_rows):
+                band_keys.append(key)
+                band_rows.append(row_id)
+            band_starts.append(len(band_keys))
+
+        lsh_index.row_keys = row_keys
+        lsh_index.indexed = indexed
+        lsh_index.band_starts = band_starts
+        lsh_index.band_keys = band_keys
+        lsh_index.band_rows = band_rows
+
+        return lsh_index
+
+    ###########################################################################
+    # Method        : candidates(target_row, max_candidates)
+    # Description   : Finds the rows sharing a bucket with the target row in
+    #                 any band. If there are more than max_candidates of
+    #                 them, the ones sharing the most buckets are kept.
+    # Returns       : list of row ids, empty if target row is not indexed
+    ###########################################################################
+    def candidates(self, target_row, max_candidates=None):
+
+        if not self.indexed[target_row]:
+            return []
+
+        band_starts = self.band_starts
+        band_keys = self.band_keys
+        band_rows = self.band_rows
+        key_start = target_row * self.num_bands
+
+        collisions = {}
+        for band in xrange(self.num_bands):
+            key = self.row_keys[key_start + band]
+            end = band_starts[band + 1]
+            position = bisect.bisect_left(band_keys, key, \
+                                          band_starts[band], end)
+            while position < end and band_keys[position] == key:
+                row_id = band_rows[position]
+                collisions[row_id] = collisions.get(row_id, 0) + 1
+                position += 1
+
+        if max_candidates is not None and len(collisions) > max_candidates:
+            return heapq.nlargest(max_candidates, collisions, \
+                                  key=collisions.get)
+        return collisions.keys()
+
+    ###########################################################################
+    # Method        : mostSimilar(cv_matrix, target_row, num_of_sim_words,
+    #                             max_candidates, measure)
+    # Description   : Approximate version of mostSimilar function of
+    #                 similarity.py module. Only the candidates of the target
+    #                 are scored, with the exact similarity measure (Jaccard's
+    #                 by default, which the signatures approximate). So the
+    #                 scores are exact, but a similar word which is not a
+    #                 candidate is missed, and fewer than num_of_sim_words
+    #                 words can be returned. A target without positive
+    #                 association is not indexed and is searched exactly.
+    # Arguments     : cv_matrix        - matrix the index was built for
+    #                 target_row       - row id of the target word
+    #                 num_of_sim_words - number of similar words needed
+    #                 max_candidates   - most candidates scored, or None
+    #                 measure          - name of the similarity measure
+    # Returns       : list of (word, score) tuples
+    ###########################################################################
+    def mostSimilar(self, cv_matrix, target_row, num_of_sim_words, \
+                    max_candidates=None, measure=DEFAULT_SIMILARITY):
+
+        if not self.indexed[target_row]:
+            return mostSimilar(cv_matrix, target_row, num_of_sim_words, \
+                               measure)
+
+        if num_of_sim_words <= 0:
+            return []
+
+        candidate_rows = self.candidates(target_row, max_candidates)
+
+        words = cv_matrix.words
+        target_features = dict(zip(*cv_matrix.row(target_row)))
+
+        shared_parts = [rowSharedMin(cv_matrix, target_features, row_id, \
+                                     measure) for row_id in candidate_rows]
+        scores = similarityMeasure(measure).scores(cv_matrix, target_row, \
+                                                   candidate_rows, \
+                                                   shared_parts)
+        scored = zip(scores, [words[row_id] for row_id in candidate_rows])
+
+        metrics.count("query.lsh_queries")
+        metrics.count("query.lsh_candidates", len(candidate_rows))
+
+        return [(word, score) for score, word in \
+                heapq.nlargest(num_of_sim_words, scored)]
+
+    ###########################################################################
+    # Method        : checkMatrix(cv_matrix)
+    # Description   : Raises ValueError if the index was built for a matrix
+    #                 of another shape, words or association measure
+    ###########################################################################
+    def checkMatrix(self, cv_matrix):
+        if self.num_rows != cv_matrix.numRows() or \
+           self.num_features != cv_matrix.numFeatures() or \
+           self.association != cv_matrix.association or \
+           self.words_checksum != wordsChecksum(cv_matrix):
+            raise ValueError("LSH index was built for another model")
+
+    ###########################################################################
+    # Method        : checkBands(num_bands, band_size)
+    # Description   : Raises ValueError if the index was built with bands of
+    #                 another shape
+    ###########################################################################
+    def checkBands(self, num_bands, band_size):
+        if self.num_bands != num_bands or self.band_size != band_size:
+            raise ValueError("LSH index was built with %d bands of %d " \
+                             "values, not %d bands of %d values; remove " \
+                             "it to build it again" % \
+                             (self.num_bands, self.band_size, num_bands, \
+                              band_size))
+
+    ###########################################################################
+    # Method        : close()
+    # Description   : Unmaps the index file of a loaded index
+    ###########################################################################
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+###############################################################################
+# End of MinHashIndex class
+###############################################################################
+
+###############################################################################
+# Function      : minHashSignatures(cv_matrix, num_hashes, seed)
+# Description   : Computes num_hashes weighted MinHash values of the positive
+#                 association values of each row (see step 1 of the module
+#                 description). Hash functions are taken one at a time, so
+#                 only the parameters of one of them, for all features, are
+#                 in memory.
+# Arguments     : cv_matrix  - CoOccurrenceMatrix with association computed
+#                 num_hashes - number of MinHash values of each row
+#                 seed       - seed of the hash functions
+# Returns       : tuple (array of MinHash values, value k of row i at
+#                 i * num_hashes + k, -1 for rows without positive values;
+#                 array with 1 for rows having positive values)
+###############################################################################
+def minHashSignatures(cv_matrix, num_hashes, seed):
+
+    num_rows = cv_matrix.numRows()
+    num_features = cv_matrix.numFeatures()
+    indptr = cv_matrix.indptr
+    indices = cv_matrix.indices
+    assoc = cv_matrix.assoc
+    log = math.log
+    floor = math.floor
+
+    '''
+    Keep the positive cells of each row, with the log of their weight, in
+    CSR arrays of their own.
+    '''
+    positive_indptr = array.array('l', [0])
+    positive_cols = array.array('i')
+    positive_log_weights = array.array('d')
+    indexed = array.array('b', [0]) * num_rows
+
+    for row_id in xrange(num_rows):
+        start = indptr[row_id]
+        end = indptr[row_id + 1]
+        for col, value in zip(indices[start:end], assoc[start:end]):
+            if value > 0:
+                positive_cols.append(col)
+                positive_log_weights.append(log(value))
+        positive_indptr.append(len(positive_cols))
+        if positive_indptr[-1] > positive_indptr[-2]:
+            indexed[row_id] = 1
+
+    signatures = array.array('l', [-1]) * (num_rows * num_hashes)
+
+    for hash_id in xrange(num_hashes):
+
+        rng = random.Random(seed * 1000003 + hash_id)
+        r = array.array('d', [0.0]) * num_features
+        log_c = array.array('d', [0.0]) * num_features
+        beta = array.array('d', [0.0]) * num_features
+        for col in xrange(num_features):
+            r[col] = rng.gammavariate(2.0, 1.0)
+            log_c[col] = log(rng.gammavariate(2.0, 1.0))
+            beta[col] = rng.random()
+
+        for row_id in xrange(num_rows):
+            best_log_a = float("inf")
+            best_col = -1
+
+            for position in xrange(positive_indptr[row_id], \
+                                   positive_indptr[row_id + 1]):
+                col = positive_cols[position]
+                r_col = r[col]
+                beta_col = beta[col]
+                t = floor(positive_log_weights[position] / r_col + beta_col)
+                log_a = log_c[col] - r_col * (t - beta_col + 1.0)
+                if log_a < best_log_a:
+                    best_log_a = log_a
+                    best_col = col
+
+            signatures[row_id * num_hashes + hash_id] = best_col
+
+    return signatures, indexed
+
+###############################################################################
+# End of minHashSignatures function
+###############################################################################
+
+###############################################################################
+# Function      : saveIndex(lsh_index, index_path)
+# Description   : Writes the index into a file in the layout of model files
+# Arguments     : lsh_index  - MinHashIndex object
+#                 index_path - path of the index file
+# Returns       : None
+###############################################################################
+def saveIndex(lsh_index, index_path):
+
+    sections = [(name, getattr(lsh_index, name)) for name in INDEX_ARRAYS]
+
+    writeSectionFile(index_path, INDEX_MAGIC, INDEX_VERSION, \
+                     {"num_bands": lsh_index.num_bands, \
+                      "band_size": lsh_index.band_size, \
+                      "seed": lsh_index.seed, \
+                      "num_rows": lsh_index.num_rows, \
+                      "num_features": lsh_index.num_features, \
+                      "association": lsh_index.association, \
+                      "words_checksum": lsh_index.words_checksum}, sections)
+
+###############################################################################
+# Function      : loadIndex(index_path)
+# Description   : Memory maps an index file written by saveIndex
+# Arguments     : index_path - path of the index file
+# Returns       : MinHashIndex object reading its arrays from the file
+###############################################################################
+def loadIndex(index_path):
+
+    mapped, header, sections = mapSectionFile(index_path, INDEX_MAGIC, \
+                                              INDEX_VERSION)
+
+    lsh_index = MinHashIndex(header["num_bands"], header["band_size"], \
+                             header["seed"], header["num_rows"], \
+                             header["num_features"], \
+                             str(header["association"]), \
+                             header["words_checksum"])
+    lsh_index._mmap = mapped
+
+    for name in INDEX_ARRAYS:
+        offset, typecode, length = sections[name]
+        setattr(lsh_index, name, MappedArray(mapped, offset, typecode, \
+                                             length))
+
+    return lsh_index
+
+###############################################################################
+# Function      : recallAt(cv_matrix, lsh_index, target_rows,
+#                          num_of_sim_words, max_candidates, measure)
+# Description   : Measures how many of the exact top num_of_sim_words words
+#                 of the target words are found by the index.
+# Returns       : recall between 0 and 1, or None for no target words
+###############################################################################
+def recallAt(cv_matrix, lsh_index, target_rows, num_of_sim_words, \
+             max_candidates=None, measure=DEFAULT_SIMILARITY):
+
+    found = 0
+    expected = 0
+    for target_row in target_rows:
+        exact_words = set(word for word, score in \
+                          mostSimilar(cv_matrix, target_row, \
+                                      num_of_sim_words, measure) \
+                          if score > 0)
+        approximate_words = set(word for word, score in \
+                                lsh_index.mostSimilar(cv_matrix, target_row, \
+                                                      num_of_sim_words, \
+                                                      max_candidates, \
+                                                      measure))
+        found += len(exact_words & approximate_words)
+        expected += len(exact_words)
+
+    if expected == 0:
+        return None
+    return float(found) / expected
+
+##############################################################################
+# End of lsh_index.py module
+#############################################################################
@@ -68,6 +68,12 @@
 #
 #                     Please note that sequence of the inputs SHOULD be same as
 #                     shown above.
+#
+#                     Optional arguments can follow the inputs, e.g.
+#                     --work-dir DIR to keep all files of a run in DIR,
+#                     --features window to use window features instead of
+#                     parsing, --force STAGE to run a stage again. Run
+#                     python main_program.py --help for all of them.
 #                    
 #                     Also, this program internally calls two programs:
 #                     I) parse_corpus_sentences.py : It takes following inputs:
@@ -152,16 +158,25 @@
 #                      
 # Algorithm         : 1) This program first reads the inputs given by user.
 #                       
-#                     2) It then calls parse_corpus_sentences.py to create
-#                        parse files containing grammatical relations for
-#                        the sentences in the corpus. Detailed algo for
-#                        parsing is present in parse_corpus_sentences.py
-#                        file.
+#                     2) It then runs the functions of
+#                        parse_corpus_sentences.py to create parse files
+#                        containing grammatical relations for the sentences
+#                        in the corpus. Detailed algo for parsing is present
+#                        in parse_corpus_sentences.py file.
 #               
-#                     3) It then calls word_sim.py, which finds the words
-#                        similar to target words. Detail algo of this 
+#                     3) It then runs the functions of word_sim.py, which
+#                        count the corpus, build the model and find the
+#                        words similar to target words. Detail algo of this 
 #                        process is present word_sim.py file.
 #
+#                     These steps are run as stages of a pipeline (see
+#                     pipeline.py), in this process: extract, shard, parse,
+#                     ingest, build and query. A stage whose inputs did not
+#                     change since its last run is skipped, e.g. only the
+#                     query stage is run again when the target word file
+#                     changes. Similar words are written into
+#                     similar_words.txt of the work directory and shown.
+#
 #
 # Author            : Swapnil Nawale 
 #
@@ -248,6 +263,282 @@ import sys
 # os module is used to access file manipulation features
 import os
 
+# argparse module is used to read the command line arguments
+import argparse
+
+# pipeline module runs the stages of this project, skipping up to date ones
+from pipeline import Stage, Pipeline
+
+# parse_corpus_sentences module extracts, shards and parses the sentences
+from parse_corpus_sentences import corpusFilePaths, extractSentences, \
+                                   shardSentences, shardPaths, \
+                                   parseSplitFiles, MAX_PARAGRAPHS, \
+                                   SHARD_TOKENS, SHARD_MANIFEST, \
+                                   PARSE_WORKERS, PARSER_MEMORY, \
+                                   PARSE_BATCH_SIZE, PARSER_COMMAND
+
+# ingest module saves and loads the counts of the corpus
+from ingest import saveCorpusCounts, loadCorpusCounts, DEFAULT_WINDOW
+
+# word_sim module builds the model and finds similar words
+from word_sim import countCorpus, buildModelFromCounts, printSimilarWords
+
+# pruning module drops words and features while the model is built
+from pruning import Pruning
+
+# measures module has the association and similarity measures
+from measures import ASSOCIATION_MEASURES, SIMILARITY_MEASURES, \
+                     DEFAULT_ASSOCIATION, DEFAULT_SIMILARITY
+
+# model_file module saves and memory maps the model
+from model_file import saveModel, loadModel
+
+# metrics module records time, counts and memory of the stages
+import metrics
+
+'''
+Names of the stages of the pipeline, in the order they are run
+'''
+STAGES = ("extract", "shard", "parse", "ingest", "build", "query")
+
+###############################################################################
+# Function      : parseArguments(argv)
+# Description   : Reads the command line arguments of the program. Four
+#                 positional arguments are needed as before, rest of the
+#                 arguments are optional.
+# Arguments     : argv - command line arguments without the program name
+# Returns       : argparse namespace with the values of the arguments
+###############################################################################
+def parseArguments(argv):
+
+    parser = argparse.ArgumentParser(description="Find words similar to " \
+                                     "target words in a corpus. Stages " \
+                                     "whose inputs did not change since " \
+                                     "the last run are skipped.")
+    parser.add_argument("corpus_path", \
+                        help="directory where all corpus files are present")
+    parser.add_argument("parser_base_path", \
+                        help="base directory of Standford parser")
+    parser.add_argument("target_word_file_name", \
+                        help="file containing all words for which similar " \
+                             "words have to be found")
+    parser.add_argument("max_num_of_results", type=int, \
+                        help="number of similar words shown per target word")
+    parser.add_argument("--work-dir", default=".", \
+                        help="directory for the sentence file, counts, " \
+                             "model, results and pipeline state")
+    parser.add_argument("--split-dir", default="split", \
+                        help="directory for shards and parse files, " \
+                             "relative to --work-dir")
+    parser.add_argument("--features", choices=("parse", "window"), \
+                        default="parse", \
+                        help="build the model from parse files, or from " \
+                             "windows of words of the sentence file (no " \
+                             "shard and parse stages)")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, \
+                        help="window size with --features window")
+    parser.add_argument("--workers", type=int, default=1, \
+                        help="number of processes extracting corpus files " \
+                             "and counting the corpus")
+    parser.add_argument("--max-paragraphs", type=int, \
+                        default=MAX_PARAGRAPHS, \
+                        help="number of <P> tags whose sentences are " \
+                             "extracted")
+    parser.add_argument("--num-shards", type=int, \
+                        help="number of shards the sentence file is split " \
+                             "into for parsing")
+    parser.add_argument("--shard-tokens", type=int, default=SHARD_TOKENS, \
+                        help="tokens per shard, if --num-shards is not " \
+                             "given")
+    parser.add_argument("--parse-workers", type=int, default=PARSE_WORKERS, \
+                        help="number of parser processes running at the " \
+                             "same time")
+    parser.add_argument("--parser-memory", type=int, default=PARSER_MEMORY, \
+                        help="memory of each parser process in MB")
+    parser.add_argument("--memory-budget", type=int, \
+                        help="memory in MB for all parser processes")
+    parser.add_argument("--parse-batch", type=int, default=PARSE_BATCH_SIZE, \
+                        help="number of shards given to a parser process")
+    parser.add_argument("--parser-command", default=PARSER_COMMAND, \
+                        help="parser command template (see " \
+                             "parse_corpus_sentences.py)")
+    parser.add_argument("--association", \
+                        choices=sorted(ASSOCIATION_MEASURES), \
+                        default=DEFAULT_ASSOCIATION, \
+                        help="association measure the model is built with")
+    parser.add_argument("--similarity", \
+                        choices=sorted(SIMILARITY_MEASURES), \
+                        default=DEFAULT_SIMILARITY, \
+                        help="similarity measure the words are compared " \
+                             "with")
+    parser.add_argument("--min-word-freq", type=int, default=0, \
+                        help="drop words occurring fewer times in the " \
+                             "corpus from the model")
+    parser.add_argument("--min-feature-freq", type=int, default=0, \
+                        help="drop features occurring fewer times from the " \
+                             "model")
+    parser.add_argument("--max-features", type=int, \
+                        help="keep only this many features of each word, " \
+                             "the ones with the highest association")
+    parser.add_argument("--exclude-relation", action="append", default=[], \
+                        metavar="RELATION", \
+                        help="drop features of this relation, e.g. det or " \
+                             "aux (can be repeated)")
+    parser.add_argument("--force", action="append", choices=STAGES, \
+                        default=[], \
+                        help="run this stage even if it is up to date " \
+                             "(can be repeated)")
+    parser.add_argument("--metrics", metavar="METRICS_FILE", \
+                        help="write time, counts and peak memory of each " \
+                             "stage into this JSON file ('-' for a JSON " \
+                             "line on stderr)")
+    return parser.parse_args(argv)
+
+###############################################################################
+# Function      : makeStages(args)
+# Description   : Creates the stages of the pipeline with their inputs,
+#                 outputs and parameters. Each stage works on the files
+#                 written by the stages before it:
+#
+#                 extract - corpus files         -> sentence file (op_file)
+#                 shard   - sentence file        -> shards and manifest
+#                 parse   - shards               -> parse files
+#                 ingest  - sentence file and
+#                           parse files          -> corpus counts
+#                 build   - corpus counts        -> model file
+#                 query   - model file and
+#                           target word file     -> results file
+#
+#                 With window features, there are no shard and parse
+#                 stages and ingest reads the sentence file alone.
+# Arguments     : args - command line arguments (see parseArguments)
+# Returns       : list of Stage objects
+###############################################################################
+def makeStages(args):
+
+    work_dir = args.work_dir
+    split_files_path = os.path.join(work_dir, args.split_dir)
+    op_file_path = os.path.join(work_dir, "op_file")
+    counts_path = os.path.join(work_dir, "corpus_counts.pickle")
+    model_path = os.path.join(work_dir, "model.bin")
+    results_path = os.path.join(work_dir, "similar_words.txt")
+
+    def parseFilePaths():
+        return [shard_path + ".parse" for shard_path in \
+                shardPaths(split_files_path)]
+
+    def runExtract():
+        extractSentences(corpusFilePaths(args.corpus_path), op_file_path, \
+                         args.workers, args.max_paragraphs)
+
+    def runShard():
+        if not os.path.exists(split_files_path):
+            os.makedirs(split_files_path)
+        shardSentences(op_file_path, split_files_path, args.num_shards, \
+                       args.shard_tokens)
+
+    def runParse():
+        failed_files = parseSplitFiles(shardPaths(split_files_path), \
+                                       os.path.abspath(args.parser_base_path), \
+                                       args.parse_workers, \
+                                       args.parser_memory, \
+                                       args.memory_budget, args.parse_batch, \
+                                       args.parser_command, \
+                                       "parse" not in args.force)
+        if failed_files:
+            raise RuntimeError("split files not parsed: " + \
+                               " ".join(failed_files))
+
+    def runIngest():
+        if args.features == "window":
+            word_frq_dict, rel_counts = countCorpus([], op_file_path, \
+                                                    args.workers, \
+                                                    window=args.window)
+        else:
+            word_frq_dict, rel_counts = countCorpus(parseFilePaths(), \
+                                                    op_file_path, \
+                                                    args.workers)
+        saveCorpusCounts(counts_path, word_frq_dict, rel_counts)
+
+    pruning = Pruning(args.min_word_freq, args.min_feature_freq, \
+                      args.max_features, args.exclude_relation)
+
+    def runBuild():
+        word_frq_dict, rel_counts = loadCorpusCounts(counts_path)
+        saveModel(buildModelFromCounts(word_frq_dict, rel_counts, pruning, \
+                                       args.association), \
+                  model_path)
+
+    def runQuery():
+        target_file_handle = open(args.target_word_file_name, 'r')
+        target_words_list = [target_word.replace("\n", "") for \
+                             target_word in target_file_handle.readlines()]
+        target_file_handle.close()
+
+        cv_matrix = loadModel(model_path)
+        results_handle = open(results_path, 'w')
+        try:
+            printSimilarWords(cv_matrix, target_words_list, \
+                              args.max_num_of_results, results_handle, \
+                              measure=args.similarity)
+        finally:
+            results_handle.close()
+            cv_matrix.close()
+
+    extract_stage = Stage("extract", runExtract, \
+                          inputs=lambda: corpusFilePaths(args.corpus_path), \
+                          outputs=[op_file_path], \
+                          params={"max_paragraphs": args.max_paragraphs})
+
+    shard_stage = Stage("shard", runShard, \
+                        inputs=[op_file_path], \
+                        outputs=lambda: [os.path.join(split_files_path, \
+                                                      SHARD_MANIFEST)] + \
+                                        shardPaths(split_files_path), \
+                        params={"num_shards": args.num_shards, \
+                                "shard_tokens": args.shard_tokens})
+
+    parse_stage = Stage("parse", runParse, \
+                        inputs=lambda: shardPaths(split_files_path), \
+                        outputs=parseFilePaths, \
+                        params={"parser_command": args.parser_command})
+
+    if args.features == "window":
+        ingest_inputs = [op_file_path]
+    else:
+        ingest_inputs = lambda: [op_file_path] + parseFilePaths()
+
+    ingest_stage = Stage("ingest", runIngest, \
+                         inputs=ingest_inputs, \
+                         outputs=[counts_path], \
+                         params={"features": args.features, \
+                                 "window": args.window \
+                                           if args.features == "window" \
+                                           else None})
+
+    build_stage = Stage("build", runBuild, \
+                        inputs=[counts_path], \
+                        outputs=[model_path], \
+                        params={"pruning": pruning.settings(), \
+                                "association": args.association})
+
+    query_stage = Stage("query", runQuery, \
+                        inputs=[model_path, args.target_word_file_name], \
+                        outputs=[results_path], \
+                        params={"max_num_of_results": \
+                                args.max_num_of_results, \
+                                "similarity": args.similarity})
+
+    if args.features == "window":
+        return [extract_stage, ingest_stage, build_stage, query_stage]
+
+    return [extract_stage, shard_stage, parse_stage, ingest_stage, \
+            build_stage, query_stage]
+
+###############################################################################
+# End of makeStages function
+###############################################################################
+
 ###############################################################################
 # Function      : main()
 # Description   : Entry point for the project.
@@ -258,67 +549,61 @@ import os
 def main():
     
     '''
-    Check if any command line argument is passed to program. If not 
-    throw error showing proper sample usage. 
+    Get the values for following command line arguments:
+    
+    1) Absolute path of directory where all corpus files are present
+    2) Absolute path of base directory of Standford parser
+    3) Absolute path of a file containing all words for which similar
+       words have to found
+    4) Number of maximum similar words to be shown in the output 
+
+    Optional arguments are described in parseArguments function. If any
+    of the four is missing, argparse shows the proper sample usage.
     '''
+    args = parseArguments(sys.argv[1:])
 
-    if (len(sys.argv) > 1):
-        
-        '''
-        Get the values for following command line arguments:
-        
-        1) Absolute path of directory where all corpus files are present
-        2) Absolute path of base directory of Standford parser
-        3) Absolute path of a file containing all words for which similar
-           words have to found
-        4) Number of maximum similar words to be shown in the output 
-        '''
-
-        corpus_path = sys.argv[1]
-        parser_base_path = sys.argv[2]
-        target_word_file_name = sys.argv[3]
-        max_num_of_results =  sys.argv[4]
-
-        '''
-        Set the name of directory where all split sentence files and parse
-        files will be stored.
-        '''
-        split_files_path = "split"
-
-        '''
-        Run parse_corpus_sentences.py program to parse the sentences present
-        in the corpus. Only a small subset of sentences present in the 
-        corpus will be parsed. The sentences from the small subset of corpus 
-        xml files will be fetched by xml parsing and 
-        put into a output file named as "op_file" and this op_file
-        will be split again into files containing 100000 lines per split file.
-        These split files will be parsed by Standford parser. The split files
-        and parsed file will be placed in directory set by variable 
-        split_files_path above.
-        '''
-
-        os.system("python parse_corpus_sentences.py " + corpus_path + " " \
-                    + split_files_path + " " + parser_base_path)
-
-        print "Finished parsing files ...."
-
-        '''
-        Run word_sim.py program to find words similar to the target words 
-        mentioned in target_word_file_name. This program applies statistical
-        method for finding word similarity using t-test association measure 
-        and Jaccard's similarity measure. To find word similarity, the relation
-        present in the parse files generated by parse_corpus_sentences.py
-        program above, will be used. 
-        '''
-
-        os.system("python word_sim.py " + split_files_path + " " + "op_file" \
-                  + " " + target_word_file_name + " " + max_num_of_results)
-    
-        print "Finished finding similar words ...."
+    if not os.path.exists(args.work_dir):
+        os.makedirs(args.work_dir)
 
+    '''
+    Run the stages of the project in this process, in the order:
+    extract, shard, parse, ingest, build and query (see makeStages
+    function). Each stage declares its input and output files, and
+    the pipeline skips a stage whose outputs are newer than its inputs
+    or whose inputs have the same content as in its last run, with the
+    same parameters. So after a change of the target word file only
+    the query stage is run again.
 
-    else:
-        print "Give proper arguments to the program!!"
+    Only a small subset of sentences present in the corpus will be
+    parsed. The sentences from the small subset of corpus xml files
+    will be fetched by xml parsing and put into a output file named as
+    "op_file" and this op_file will be split again into shards. These
+    shards will be parsed by Standford parser. The shards and parsed
+    files will be placed in the directory given by --split-dir. Parsed
+    shards are recorded in a ledger there, so a parse stage which was
+    stopped goes on with the shards not parsed yet when it is run again,
+    and --force parse parses all of them again.
+
+    Similar words of target words are found by applying statistical
+    method for finding word similarity using t-test association measure 
+    and Jaccard's similarity measure, to the relations present in the
+    parse files.
+    '''
+    if args.metrics is not None:
+        metrics.addSink(metrics.sinkFor(args.metrics))
+
+    pipeline = Pipeline(os.path.join(args.work_dir, "pipeline_state.json"))
+    try:
+        pipeline.run(makeStages(args), args.force)
+    finally:
+        metrics.emit()
+
+    print "Finished finding similar words ...."
+
+    results_handle = open(os.path.join(args.work_dir, "similar_words.txt"), \
+                          'r')
+    sys.stdout.write(results_handle.read())
+    results_handle.close()
 
 ###############################################################################
 # End of main function
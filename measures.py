@@ -0,0 +1,313 @@
+##############################################################################
+# Algorithm     :   This module is the registry of the association measures
+#                   and similarity measures (sections 20.7.2 and 20.7.3 of JM
+#                   text) a model can be built and queried with.
+#
+#                   Association measures weigh each cell of the
+#                   co-occurrence matrix (see cv_matrix.py module):
+#
+#                      ttest - (P(f,w) - P(w)P(f)) / sqrt(P(w)P(f))
+#                      pmi   - log2(P(f,w) / (P(w)P(f)))
+#                      ppmi  - max(pmi, 0)
+#
+#                   Each one is a kernel over the whole matrix at once: it
+#                   gets P(f,w) and P(w)P(f) of all cells as two flat arrays
+#                   of plain probabilities and gives back the array of
+#                   association values, without calling pow or log10 for
+#                   every cell.
+#
+#                   Similarity measures compare the association vectors t
+#                   and c of two words:
+#
+#                      jaccard - sum of min(t_f, c_f) / sum of max(t_f, c_f)
+#                      dice    - 2 * sum of min(t_f, c_f) / sum of (t_f + c_f)
+#                      cosine  - sum of t_f * c_f / (|t| * |c|)
+#
+#                   Each one is split the same way (see similarity.py
+#                   module): a shared part summed over the features shared
+#                   by the two words, which is all that needs visiting the
+#                   cells, and a kernel turning the shared parts of many
+#                   candidates into scores from the row sums (sum, sum of
+#                   negative values, norm) kept next to the matrix. A cheap
+#                   upper bound of the score from the row sums alone lets
+#                   the search stop early.
+##############################################################################
+
+#!/usr/bin/python
+
+'''
+import statements to include Python's in-built module functionalities in the
+program
+'''
+# array module is used for compact arrays of C doubles
+import array
+
+# math module for logarithmic functionalities
+import math
+
+# itertools module walks the flat arrays of the kernels together
+import itertools
+
+'''
+Measures used when none is asked for, the ones this project always used
+'''
+DEFAULT_ASSOCIATION = "ttest"
+DEFAULT_SIMILARITY = "jaccard"
+
+# 1 / ln(2), to turn natural logarithms into base 2
+INVERSE_LN_2 = 1.0 / math.log(2.0)
+
+###############################################################################
+# Function      : tTestKernel(joint, expected), pmiKernel(joint, expected),
+#                 ppmiKernel(joint, expected)
+# Description   : Association kernels. joint has P(f,w) and expected has
+#                 P(w)P(f) of every cell, both as plain probabilities.
+# Returns       : array of association values of the cells
+###############################################################################
+def tTestKernel(joint, expected):
+    sqrt = math.sqrt
+    return array.array('d', [(joint_prob - expected_prob) / \
+                             sqrt(expected_prob) for joint_prob, \
+                             expected_prob in itertools.izip(joint, \
+                                                             expected)])
+
+def pmiKernel(joint, expected):
+    log = math.log
+    return array.array('d', [log(joint_prob / expected_prob) * \
+                             INVERSE_LN_2 for joint_prob, expected_prob in \
+                             itertools.izip(joint, expected)])
+
+def ppmiKernel(joint, expected):
+    return array.array('d', [value if value > 0.0 else 0.0 for value in \
+                             pmiKernel(joint, expected)])
+
+'''
+Association measures by name
+'''
+ASSOCIATION_MEASURES = {"ttest": tTestKernel, \
+                        "pmi": pmiKernel, \
+                        "ppmi": ppmiKernel}
+
+###############################################################################
+# Class         : JaccardMeasure
+# Description   : Jaccard's measure. Shared part of a feature is what it adds
+#                 to sum of min over neg(t) + neg(c), and sum of max is
+#                 sum(t) + sum(c) - sum of min (see similarity.py module).
+#
+#                 Every similarity measure has these methods:
+#
+#                 shared(target_value, other_value)
+#                     shared part of a feature of both words
+#                 score(cv_matrix, target_row, other_row, shared)
+#                     score of one word from its shared part
+#                 scores(cv_matrix, target_row, row_ids, shared_parts)
+#                     kernel giving the scores of many words at once
+#                 upperBounds(cv_matrix, target_row, row_ids)
+#                     kernel giving bounds of the scores of many words from
+#                     the row sums only, infinity when there is no bound
+###############################################################################
+class JaccardMeasure(object):
+
+    name = "jaccard"
+
+    def shared(self, target_value, other_value):
+        shared = min(target_value, other_value)
+        if target_value < 0:
+            shared -= target_value
+        if other_value < 0:
+            shared -= other_value
+        return shared
+
+    def score(self, cv_matrix, target_row, other_row, shared):
+        return jaccard(cv_matrix.assoc_sum[target_row], \
+                       cv_matrix.assoc_neg_sum[target_row], \
+                       cv_matrix.assoc_sum[other_row], \
+                       cv_matrix.assoc_neg_sum[other_row], shared)
+
+    def scores(self, cv_matrix, target_row, row_ids, shared_parts):
+
+        assoc_sum = cv_matrix.assoc_sum
+        assoc_neg_sum = cv_matrix.assoc_neg_sum
+        target_sum = assoc_sum[target_row]
+        target_neg_sum = assoc_neg_sum[target_row]
+
+        sums_of_min = [target_neg_sum + assoc_neg_sum[row_id] + shared \
+                       for row_id, shared in itertools.izip(row_ids, \
+                                                            shared_parts)]
+        sums_of_max = [target_sum + assoc_sum[row_id] - sum_of_min \
+                       for row_id, sum_of_min in itertools.izip(row_ids, \
+                                                                sums_of_min)]
+        return [_ratio(sum_of_min, sum_of_max) for sum_of_min, sum_of_max \
+                in itertools.izip(sums_of_min, sums_of_max)]
+
+    def upperBounds(self, cv_matrix, target_row, row_ids):
+
+        assoc_sum = cv_matrix.assoc_sum
+        assoc_neg_sum = cv_matrix.assoc_neg_sum
+        target_sum = assoc_sum[target_row]
+        target_neg_sum = assoc_neg_sum[target_row]
+
+        return [jaccardUpperBound(target_sum, target_neg_sum, \
+                                  assoc_sum[row_id], assoc_neg_sum[row_id]) \
+                for row_id in row_ids]
+
+###############################################################################
+# End of JaccardMeasure class
+###############################################################################
+
+###############################################################################
+# Class         : DiceMeasure
+# Description   : Dice's measure. Shared part is the same as for Jaccard's
+#                 measure, and sum of (t_f + c_f) is sum(t) + sum(c). Its
+#                 bound uses the same highest sum of min as Jaccard's.
+###############################################################################
+class DiceMeasure(JaccardMeasure):
+
+    name = "dice"
+
+    def score(self, cv_matrix, target_row, other_row, shared):
+        return self.scores(cv_matrix, target_row, [other_row], [shared])[0]
+
+    def scores(self, cv_matrix, target_row, row_ids, shared_parts):
+
+        assoc_sum = cv_matrix.assoc_sum
+        assoc_neg_sum = cv_matrix.assoc_neg_sum
+        target_sum = assoc_sum[target_row]
+        target_neg_sum = assoc_neg_sum[target_row]
+
+        return [_ratio(2.0 * (target_neg_sum + assoc_neg_sum[row_id] + \
+                              shared), \
+                       target_sum + assoc_sum[row_id]) \
+                for row_id, shared in itertools.izip(row_ids, shared_parts)]
+
+    def upperBounds(self, cv_matrix, target_row, row_ids):
+
+        assoc_sum = cv_matrix.assoc_sum
+        assoc_neg_sum = cv_matrix.assoc_neg_sum
+        target_sum = assoc_sum[target_row]
+        target_pos_sum = target_sum - assoc_neg_sum[target_row]
+
+        bounds = []
+        for row_id in row_ids:
+            sum_of_both = target_sum + assoc_sum[row_id]
+            if sum_of_both <= 0:
+                bounds.append(float('inf'))
+            else:
+                bounds.append(2.0 * min(target_pos_sum, \
+                                        assoc_sum[row_id] - \
+                                        assoc_neg_sum[row_id]) / sum_of_both)
+        return bounds
+
+###############################################################################
+# End of DiceMeasure class
+###############################################################################
+
+###############################################################################
+# Class         : CosineMeasure
+# Description   : Cosine of the angle between the vectors. Shared part is
+#                 the product of the values, i.e. the sparse dot product is
+#                 summed over the shared features only, and it is divided
+#                 by the norms of the rows (see rowNorms of cv_matrix.py
+#                 module). Scores are never above 1, which is its only
+#                 bound.
+###############################################################################
+class CosineMeasure(object):
+
+    name = "cosine"
+
+    def shared(self, target_value, other_value):
+        return target_value * other_value
+
+    def score(self, cv_matrix, target_row, other_row, shared):
+        assoc_norm = cv_matrix.rowNorms()
+        return _ratio(shared, assoc_norm[target_row] * assoc_norm[other_row])
+
+    def scores(self, cv_matrix, target_row, row_ids, shared_parts):
+
+        assoc_norm = cv_matrix.rowNorms()
+        target_norm = assoc_norm[target_row]
+
+        return [_ratio(shared, target_norm * assoc_norm[row_id]) \
+                for row_id, shared in itertools.izip(row_ids, shared_parts)]
+
+    def upperBounds(self, cv_matrix, target_row, row_ids):
+        return [1.0] * len(row_ids)
+
+###############################################################################
+# End of CosineMeasure class
+###############################################################################
+
+'''
+Similarity measures by name
+'''
+SIMILARITY_MEASURES = {"jaccard": JaccardMeasure(), \
+                       "dice": DiceMeasure(), \
+                       "cosine": CosineMeasure()}
+
+###############################################################################
+# Function      : similarityMeasure(name), associationKernel(name)
+# Description   : Measure of the given name, raising ValueError for an
+#                 unknown name
+###############################################################################
+def similarityMeasure(name):
+    try:
+        return SIMILARITY_MEASURES[name]
+    except KeyError:
+        raise ValueError("unknown similarity measure " + str(name))
+
+def associationKernel(name):
+    try:
+        return ASSOCIATION_MEASURES[name]
+    except KeyError:
+        raise ValueError("unknown association measure " + str(name))
+
+###############################################################################
+# Function      : jaccard(target_sum, target_neg_sum, other_sum,
+#                         other_neg_sum, shared_min)
+# Description   : Jaccard's similarity score of two words from the sums of
+#                 their rows and the shared part of their sum of min.
+# Returns       : similarity score. It is 0 when sum of max is 0.
+###############################################################################
+def jaccard(target_sum, target_neg_sum, other_sum, other_neg_sum, shared_min):
+
+    sum_of_min = target_neg_sum + other_neg_sum + shared_min
+    sum_of_max = target_sum + other_sum - sum_of_min
+
+    try:
+        return sum_of_min / sum_of_max
+    except ZeroDivisionError:
+        return 0.0
+
+###############################################################################
+# Function      : jaccardUpperBound(target_sum, target_neg_sum, other_sum,
+#                                   other_neg_sum)
+# Description   : Cheap upper bound of Jaccard's similarity score of two words
+#                 from the sums of their rows only. Sum of min is at most
+#                 min(pos(t), pos(c)), where pos(x) is the sum of positive
+#                 values of x, and sum of max is at least max(sum(t), sum(c)).
+#                 For words with non-negative association values this is the
+#                 ratio of the L1 norms of the two rows.
+# Returns       : upper bound of the score, infinity when there is no bound
+###############################################################################
+def jaccardUpperBound(target_sum, target_neg_sum, other_sum, other_neg_sum):
+
+    lowest_sum_of_max = max(target_sum, other_sum)
+    if lowest_sum_of_max <= 0:
+        return float('inf')
+
+    highest_sum_of_min = min(target_sum - target_neg_sum, \
+                             other_sum - other_neg_sum)
+    return highest_sum_of_min / lowest_sum_of_max
+
+###############################################################################
+# Function      : _ratio(numerator, denominator)
+# Description   : numerator / denominator, or 0 when denominator is 0
+###############################################################################
+def _ratio(numerator, denominator):
+    if denominator == 0:
+        return 0.0
+    return numerator / denominator
+
+##############################################################################
+# End of measures.py module
+#############################################################################
@@ -0,0 +1,283 @@
+##############################################################################
+# Algorithm     :   This module records metrics of the programs of this
+#                   project: wall time of each stage, counters like lines
+#                   and relations ingested or candidates scored per query,
+#                   gauges like the number of words and features of the CV,
+#                   and peak memory (max RSS) of the process and of its
+#                   worker processes.
+#
+#                   Steps followed for recording metrics are:
+#
+#                   1) A stage is timed by a with block, or by the timed
+#                      decorator for a whole function:
+#
+#                          with metrics.timer("count_words"):
+#                              ...
+#
+#                      Time of all runs of a stage is added up, together
+#                      with the number of runs, and the peak memory at the
+#                      end of the last run is kept.
+#
+#                   2) Counters are added to by count and gauges are set by
+#                      gauge. Both are cheap, so they are updated once per
+#                      file, batch or query, never per line.
+#
+#                   3) At the end of a program, emit gives a snapshot of all
+#                      metrics to each sink added by addSink. A sink is any
+#                      object with an emit(snapshot) method, e.g.
+#                      JsonFileSink writing the snapshot into a JSON file.
+#
+#                   Metrics of the whole program are kept in one Metrics
+#                   object of this module, used through the functions timer,
+#                   timed, count, gauge, addSink, snapshot and emit.
+#                   Counters can be updated from many threads. Worker
+#                   processes have their own copy, so their metrics are
+#                   recorded by the parent process from what the workers
+#                   give back.
+##############################################################################
+
+#!/usr/bin/python
+
+'''
+import statements to include Python's in-built module functionalities in the
+program
+'''
+# sys module is used to write metrics on standard error
+import sys
+
+# os module is used to access file manipulation features
+import os
+
+# json module is used to write the metrics
+import json
+
+# time module for time related functionality
+import time
+
+# threading module makes counters safe to update from many threads
+import threading
+
+# resource module gives the peak memory of the process
+import resource
+
+# functools module keeps the name and docstring of timed functions
+import functools
+
+###############################################################################
+# Class         : Metrics
+# Description   : Timers, counters and gauges of a program.
+#
+#                 Attributes:
+#                 stages   - dict mapping name of a stage to dict with its
+#                            seconds, calls, peak_rss_kb and
+#                            children_peak_rss_kb
+#                 counters - dict mapping name of a counter to its value
+#                 gauges   - dict mapping name of a gauge to its last value
+#                 sinks    - list of sinks the metrics are emitted to
+###############################################################################
+class Metrics(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sinks = []
+        self.reset()
+
+    ###########################################################################
+    # Method        : reset()
+    # Description   : Throws away all recorded metrics. Sinks are kept.
+    ###########################################################################
+    def reset(self):
+        with self.lock:
+            self.start_time = time.time()
+            self.stages = {}
+            self.counters = {}
+            self.gauges = {}
+
+    ###########################################################################
+    # Method        : timer(name)
+    # Description   : Returns a context manager timing a run of the stage
+    ###########################################################################
+    def timer(self, name):
+        return StageTimer(self, name)
+
+    ###########################################################################
+    # Method        : addStageTime(name, seconds)
+    # Description   : Adds the time of a run of the stage, with the peak
+    #                 memory at its end. Called by StageTimer.
+    ###########################################################################
+    def addStageTime(self, name, seconds):
+        with self.lock:
+            stage = self.stages.setdefault(name, {"seconds": 0.0, \
+                                                  "calls": 0})
+            stage["seconds"] += seconds
+            stage["calls"] += 1
+            stage["peak_rss_kb"] = peakMemory(resource.RUSAGE_SELF)
+            stage["children_peak_rss_kb"] = \
+                peakMemory(resource.RUSAGE_CHILDREN)
+
+    ###########################################################################
+    # Method        : count(name, amount), gauge(name, value)
+    # Description   : Adds amount to a counter, sets the value of a gauge
+    ###########################################################################
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    ###########################################################################
+    # Method        : addSink(sink)
+    # Description   : Adds a sink, an object with emit(snapshot) method
+    ###########################################################################
+    def addSink(self, sink):
+        self.sinks.append(sink)
+
+    ###########################################################################
+    # Method        : snapshot()
+    # Description   : Returns all metrics as a dict which can be written in
+    #                 JSON format
+    ###########################################################################
+    def snapshot(self):
+        with self.lock:
+            stages = dict((name, dict(stage)) for name, stage in \
+                          self.stages.iteritems())
+            for stage in stages.itervalues():
+                stage["seconds"] = round(stage["seconds"], 6)
+            return {"program": os.path.basename(sys.argv[0]), \
+                    "started": self.start_time, \
+                    "wall_seconds": round(time.time() - self.start_time, 6), \
+                    "peak_rss_kb": peakMemory(resource.RUSAGE_SELF), \
+                    "children_peak_rss_kb": \
+                        peakMemory(resource.RUSAGE_CHILDREN), \
+                    "stages": stages, \
+                    "counters": dict(self.counters), \
+                    "gauges": dict(self.gauges)}
+
+    ###########################################################################
+    # Method        : emit()
+    # Description   : Gives a snapshot of the metrics to all sinks
+    ###########################################################################
+    def emit(self):
+        if not self.sinks:
+            return
+        current_snapshot = self.snapshot()
+        for sink in self.sinks:
+            sink.emit(current_snapshot)
+
+###############################################################################
+# End of Metrics class
+###############################################################################
+
+###############################################################################
+# Class         : StageTimer
+# Description   : Context manager adding the wall time of its with block to
+#                 a stage of a Metrics object. Time is added even if the
+#                 block raises an exception.
+###############################################################################
+class StageTimer(object):
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start_time = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.addStageTime(self.name, time.time() - self.start_time)
+        return False
+
+###############################################################################
+# End of StageTimer class
+###############################################################################
+
+###############################################################################
+# Function      : timed(name)
+# Description   : Decorator timing every call of a function as a run of the
+#                 stage name of the metrics of this program, e.g.
+#
+#                     @metrics.timed("extract")
+#                     def extractSentences(...):
+###############################################################################
+def timed(name):
+
+    def decorate(function):
+
+        @functools.wraps(function)
+        def timedFunction(*args, **kwargs):
+            with registry.timer(name):
+                return function(*args, **kwargs)
+
+        return timedFunction
+
+    return decorate
+
+###############################################################################
+# Class         : JsonFileSink, StreamSink
+# Description   : Sinks writing a snapshot into a JSON file, which is written
+#                 with a temporary name and renamed so it is never seen half
+#                 written; or as one JSON line into an open file like
+#                 sys.stderr.
+###############################################################################
+class JsonFileSink(object):
+
+    def __init__(self, path):
+        self.path = path
+
+    def emit(self, snapshot):
+        temp_path = self.path + ".tmp"
+        metrics_handle = open(temp_path, 'w')
+        json.dump(snapshot, metrics_handle, indent=1, sort_keys=True)
+        metrics_handle.write("\n")
+        metrics_handle.close()
+        os.rename(temp_path, self.path)
+
+class StreamSink(object):
+
+    def __init__(self, handle):
+        self.handle = handle
+
+    def emit(self, snapshot):
+        self.handle.write(json.dumps(snapshot, sort_keys=True) + "\n")
+        self.handle.flush()
+
+###############################################################################
+# Function      : sinkFor(destination)
+# Description   : Sink for the value of --metrics option of the programs:
+#                 "-" for standard error, otherwise path of a JSON file
+###############################################################################
+def sinkFor(destination):
+    if destination == "-":
+        return StreamSink(sys.stderr)
+    return JsonFileSink(destination)
+
+###############################################################################
+# Function      : peakMemory(who)
+# Description   : Peak memory in KB of this process (RUSAGE_SELF) or of its
+#                 largest finished child process (RUSAGE_CHILDREN).
+#                 ru_maxrss is in bytes on Mac OS and in KB elsewhere.
+###############################################################################
+def peakMemory(who=resource.RUSAGE_SELF):
+    max_rss = resource.getrusage(who).ru_maxrss
+    if sys.platform == "darwin":
+        max_rss //= 1024
+    return max_rss
+
+'''
+Metrics of this program, and functions using them
+'''
+registry = Metrics()
+
+timer = registry.timer
+count = registry.count
+gauge = registry.gauge
+addSink = registry.addSink
+snapshot = registry.snapshot
+emit = registry.emit
+
+##############################################################################
+# End of metrics.py module
+#############################################################################
@@ -0,0 +1,475 @@
+##############################################################################
+# Algorithm     :   This module saves a built co-occurrence matrix (see
+#                   cv_matrix.py module) into a compact model file and loads
+#                   it back through memory mapping, so that word_sim.py does
+#                   not have to read the sentence file and parse files again
+#                   for every run.
+#
+#                   Layout of a model file is:
+#
+#                   1) 8 bytes of MODEL_MAGIC, followed by format version and
+#                      length of the header as two 4 byte unsigned ints.
+#
+#                   2) Header in JSON format. It has the number of words and
+#                      features, the name of the association measure and,
+#                      for each section, its offset from the start of data,
+#                      array typecode, item size and length.
+#
+#                   3) Data, starting at the first multiple of 8 bytes after
+#                      the header. Each section starts at a multiple of 8
+#                      bytes. Numeric sections are the raw arrays of the
+#                      matrix. Word and feature tables are stored as a blob
+#                      of strings with an array of offsets into it, plus
+#                      the row ids ordered by word for binary search.
+#
+#                   Loaded model reads all values straight from the mapped
+#                   pages. Nothing is parsed at load time, so loading is
+#                   near-instant and processes loading the same model file
+#                   share its pages through the OS page cache.
+##############################################################################
+
+#!/usr/bin/python
+
+'''
+import statements to include Python's in-built module functionalities in the
+program
+'''
+# os module is used to access file manipulation features
+import os
+
+# array module is used for compact arrays of C ints and doubles
+import array
+
+# mmap module is used for memory mapping of model files
+import mmap
+
+# struct module is used to read values from the mapped model file
+import struct
+
+# json module is used to write and read header of model file
+import json
+
+# zlib module computes the checksum of the words of a model
+import zlib
+
+# cv_matrix module holds the co-occurrence vectors as a sparse matrix
+from cv_matrix import CoOccurrenceMatrix
+
+# measures module names the association measure of a model
+from measures import DEFAULT_ASSOCIATION
+
+'''
+Magic bytes and format version at the start of each model file
+'''
+MODEL_MAGIC = "WSIMMODL"
+MODEL_VERSION = 1
+
+# magic, version and header length
+PREAMBLE = struct.Struct("<8sII")
+
+'''
+Numeric arrays of CoOccurrenceMatrix which are saved into model file
+'''
+MATRIX_ARRAYS = ("indptr", "indices", "freq", "assoc", "assoc_sum", \
+                 "assoc_neg_sum", "word_freq", "feature_freq", \
+                 "feature_prob", "feature_indptr", "feature_rows", \
+                 "feature_cells")
+
+###############################################################################
+# Function      : saveModel(cv_matrix, model_path)
+# Description   : Writes the co-occurrence matrix into a model file. The file
+#                 is first written with a temporary name and then renamed, so
+#                 a model file is never seen half written.
+# Arguments     : cv_matrix  - CoOccurrenceMatrix with association computed
+#                 model_path - path of the model file
+# Returns       : None
+###############################################################################
+def saveModel(cv_matrix, model_path):
+
+    if cv_matrix.assoc is None or cv_matrix.feature_indptr is None:
+        raise ValueError("association and feature index of the matrix " \
+                         "must be computed before saving it")
+
+    sections = []
+
+    for name in MATRIX_ARRAYS:
+        values = getattr(cv_matrix, name)
+        if values is None:
+            values = array.array('l', [0]) * cv_matrix.numRows()
+        sections.append((name, _toArray(values)))
+
+    word_offsets, word_blob = _packStrings(cv_matrix.words)
+    feature_offsets, feature_blob = _packStrings([relation + "\t" + word \
+                                                  for relation, word in \
+                                                  cv_matrix.features])
+
+    word_order = array.array('i', sorted(xrange(cv_matrix.numRows()), \
+                                         key=cv_matrix.words.__getitem__))
+
+    sections.append(("word_offsets", word_offsets))
+    sections.append(("word_blob", word_blob))
+    sections.append(("word_order", word_order))
+    sections.append(("feature_offsets", feature_offsets))
+    sections.append(("feature_blob", feature_blob))
+
+    writeSectionFile(model_path, MODEL_MAGIC, MODEL_VERSION, \
+                     {"num_rows": cv_matrix.numRows(), \
+                      "num_features": cv_matrix.numFeatures(), \
+                      "association": cv_matrix.association}, sections)
+
+###############################################################################
+# End of saveModel function
+###############################################################################
+
+###############################################################################
+# Function      : writeSectionFile(file_path, magic, version, header,
+#                                  sections)
+# Description   : Writes a file in the layout of model files (see the
+#                 description of this module): magic, version, JSON header
+#                 and aligned sections. Offsets, typecodes and lengths of
+#                 the sections are added to the header. The file is first
+#                 written with a temporary name and then renamed. Other
+#                 memory mapped files of this project use the same layout.
+# Arguments     : file_path - path of the file
+#                 magic     - 8 bytes identifying the kind of file
+#                 version   - format version of the kind of file
+#                 header    - dict of values to keep in the header
+#                 sections  - list of (name, values) tuples, values being an
+#                             array.array or a string
+# Returns       : None
+###############################################################################
+def writeSectionFile(file_path, magic, version, header, sections):
+
+    '''
+    Find the offset of each section from the start of data, keeping every
+    section aligned to 8 bytes.
+    '''
+    header = dict(header, sections={})
+    data_size = 0
+
+    for name, values in sections:
+        if isinstance(values, array.array):
+            typecode = values.typecode
+            itemsize = values.itemsize
+        else:
+            typecode = "c"
+            itemsize = 1
+
+        header["sections"][name] = {"offset": data_size, \
+                                    "typecode": typecode, \
+                                    "itemsize": itemsize, \
+                                    "length": len(values)}
+        data_size = _align(data_size + len(values) * itemsize)
+
+    header_text = json.dumps(header, sort_keys=True)
+    data_start = _align(PREAMBLE.size + len(header_text))
+
+    temp_path = file_path + ".tmp"
+    model_handle = open(temp_path, 'wb')
+
+    model_handle.write(PREAMBLE.pack(magic, version, len(header_text)))
+    model_handle.write(header_text)
+    model_handle.write("\0" * (data_start - model_handle.tell()))
+
+    for name, values in sections:
+        offset = data_start + header["sections"][name]["offset"]
+        model_handle.write("\0" * (offset - model_handle.tell()))
+        if isinstance(values, array.array):
+            values.tofile(model_handle)
+        else:
+            model_handle.write(values)
+
+    model_handle.close()
+    os.rename(temp_path, file_path)
+
+###############################################################################
+# Function      : mapSectionFile(file_path, magic, version)
+# Description   : Memory maps a file written by writeSectionFile and checks
+#                 its magic, version and the item sizes of its sections.
+# Arguments     : file_path - path of the file
+#                 magic     - expected magic bytes
+#                 version   - expected format version
+# Returns       : tuple (mmap object, header dict, dict mapping name of each
+#                 section to its (offset, typecode, length) in the file).
+#                 ValueError is raised for a file of another kind, version
+#                 or platform.
+###############################################################################
+def mapSectionFile(file_path, magic, version):
+
+    file_handle = open(file_path, 'rb')
+    mapped = mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ)
+    file_handle.close()
+
+    if len(mapped) < PREAMBLE.size:
+        mapped.close()
+        raise ValueError(file_path + " is not a " + magic + " file")
+
+    file_magic, file_version, header_length = PREAMBLE.unpack_from(mapped, 0)
+    if file_magic != magic:
+        mapped.close()
+        raise ValueError(file_path + " is not a " + magic + " file")
+    if file_version != version:
+        mapped.close()
+        raise ValueError(file_path + " has unsupported " + magic + \
+                         " file version " + str(file_version))
+
+    header = json.loads(mapped[PREAMBLE.size:PREAMBLE.size + header_length])
+    data_start = _align(PREAMBLE.size + header_length)
+
+    sections = {}
+    for name, section in header["sections"].iteritems():
+        typecode = str(section["typecode"])
+        if typecode != "c" and \
+           struct.calcsize(typecode) != section["itemsize"]:
+            mapped.close()
+            raise ValueError(file_path + " was written on a platform " \
+                             "with different size of '" + typecode + \
+                             "' values")
+        sections[name] = (data_start + section["offset"], typecode, \
+                          section["length"])
+
+    return mapped, header, sections
+
+###############################################################################
+# Function      : loadModel(model_path)
+# Description   : Memory maps a model file written by saveModel.
+# Arguments     : model_path - path of the model file
+# Returns       : MappedCoOccurrenceMatrix object
+###############################################################################
+def loadModel(model_path):
+    return MappedCoOccurrenceMatrix(model_path)
+
+###############################################################################
+# End of loadModel function
+###############################################################################
+
+###############################################################################
+# Function      : readModel(model_path)
+# Description   : Reads a model file written by saveModel into memory. Values
+#                 are unpacked once instead of on each access, which makes
+#                 long jobs scoring all the words about twice as fast, at the
+#                 cost of the memory of the whole model.
+# Arguments     : model_path - path of the model file
+# Returns       : MappedCoOccurrenceMatrix object whose arrays and word and
+#                 feature tables are in memory
+###############################################################################
+def readModel(model_path):
+
+    cv_matrix = MappedCoOccurrenceMatrix(model_path)
+
+    for name in MATRIX_ARRAYS + ("word_order",):
+        setattr(cv_matrix, name, _toArray(getattr(cv_matrix, name)))
+
+    cv_matrix.words = list(cv_matrix.words)
+    cv_matrix.features = list(cv_matrix.features)
+
+    return cv_matrix
+
+###############################################################################
+# Class         : MappedArray
+# Description   : Read-only array of numbers stored in a memory mapped file.
+#                 It can be indexed and sliced like array.array, but values
+#                 are unpacked from the mapped pages on each access.
+###############################################################################
+class MappedArray(object):
+
+    def __init__(self, buffer_object, offset, typecode, length):
+        self._buffer = buffer_object
+        self._offset = offset
+        self._typecode = typecode
+        self._itemsize = struct.calcsize(typecode)
+        self._item = struct.Struct(typecode)
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._length)
+            if step != 1:
+                raise ValueError("MappedArray slices can not have a step")
+            count = max(0, stop - start)
+            return struct.unpack_from("%d%s" % (count, self._typecode), \
+                                      self._buffer, \
+                                      self._offset + start * self._itemsize)
+
+        if index < 0:
+            index += self._length
+        if index < 0 or index >= self._length:
+            raise IndexError("MappedArray index out of range")
+
+        return self._item.unpack_from(self._buffer, \
+                                      self._offset + \
+                                      index * self._itemsize)[0]
+
+    def __iter__(self):
+        chunk_size = 65536
+        for start in xrange(0, self._length, chunk_size):
+            for value in self[start:start + chunk_size]:
+                yield value
+
+###############################################################################
+# End of MappedArray class
+###############################################################################
+
+###############################################################################
+# Class         : MappedStrings
+# Description   : Read-only list of strings stored in a memory mapped file as
+#                 a blob and an array of offsets. If separator is given, each
+#                 string is returned split into a tuple at the separator.
+###############################################################################
+class MappedStrings(object):
+
+    def __init__(self, buffer_object, offsets, blob_offset, separator=None):
+        self._buffer = buffer_object
+        self._offsets = offsets
+        self._blob_offset = blob_offset
+        self._separator = separator
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("MappedStrings index out of range")
+
+        start, end = self._offsets[index:index + 2]
+        value = self._buffer[self._blob_offset + start: \
+                             self._blob_offset + end]
+
+        if self._separator is not None:
+            return tuple(value.split(self._separator, 1))
+        return value
+
+    def __iter__(self):
+        for index in xrange(len(self)):
+            yield self[index]
+
+###############################################################################
+# End of MappedStrings class
+###############################################################################
+
+###############################################################################
+# Class         : MappedCoOccurrenceMatrix
+# Description   : Read-only CoOccurrenceMatrix whose arrays and word and
+#                 feature tables are read from a memory mapped model file.
+#                 Words are looked up by binary search over the row ids
+#                 ordered by word, so no dict is built at load time.
+#                 P(f,w) values are not part of model file, so joint_prob
+#                 is not available.
+###############################################################################
+class MappedCoOccurrenceMatrix(CoOccurrenceMatrix):
+
+    def __init__(self, model_path):
+
+        self.model_path = model_path
+
+        self._mmap, header, sections = mapSectionFile(model_path, \
+                                                      MODEL_MAGIC, \
+                                                      MODEL_VERSION)
+
+        for name in MATRIX_ARRAYS + ("word_offsets", "word_order", \
+                                     "feature_offsets"):
+            offset, typecode, length = sections[name]
+            setattr(self, name, MappedArray(self._mmap, offset, typecode, \
+                                            length))
+
+        self.words = MappedStrings(self._mmap, self.word_offsets, \
+                                   sections["word_blob"][0])
+        self.features = MappedStrings(self._mmap, self.feature_offsets, \
+                                      sections["feature_blob"][0], "\t")
+
+        self.word_ids = None
+        self.feature_ids = None
+        self.joint_prob = None
+        self.assoc_norm = None
+
+        # model files written before measures could be chosen are t-test
+        self.association = header.get("association", DEFAULT_ASSOCIATION)
+
+    ###########################################################################
+    # Method        : rowOf(word)
+    # Description   : Returns row id of the word or None if word has no CV.
+    #                 Binary search over the row ids ordered by word.
+    ###########################################################################
+    def rowOf(self, word):
+
+        low = 0
+        high = len(self.word_order)
+
+        while low < high:
+            middle = (low + high) // 2
+            row_id = self.word_order[middle]
+            middle_word = self.words[row_id]
+
+            if middle_word == word:
+                return row_id
+            elif middle_word < word:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    ###########################################################################
+    # Method        : close()
+    # Description   : Unmaps the model file
+    ###########################################################################
+    def close(self):
+        self._mmap.close()
+
+###############################################################################
+# End of MappedCoOccurrenceMatrix class
+###############################################################################
+
+###############################################################################
+# Function      : wordsChecksum(cv_matrix)
+# Description   : CRC-32 checksum of the words of the matrix in the order of
+#                 their row ids. Files keyed by row id, like LSH indexes and
+#                 neighbor tables, keep it to tell that they belong to a
+#                 model: row ids of the same corpus can change with the
+#                 number of workers counting it, so the shape of the model
+#                 alone is not enough.
+###############################################################################
+def wordsChecksum(cv_matrix):
+
+    checksum = 0
+    for word in cv_matrix.words:
+        checksum = zlib.crc32(word + "\n", checksum)
+    return checksum & 0xffffffff
+
+###############################################################################
+# Function      : _toArray(values)
+# Description   : Returns values as an array.array, converting mapped arrays
+#                 of a loaded model.
+###############################################################################
+def _toArray(values):
+    if isinstance(values, array.array):
+        return values
+    return array.array(values._typecode, values)
+
+###############################################################################
+# Function      : _packStrings(strings)
+# Description   : Packs a list of strings into an array of offsets and a blob.
+#                 String i is blob[offsets[i]:offsets[i+1]].
+###############################################################################
+def _packStrings(strings):
+
+    offsets = array.array('l', [0])
+    for value in strings:
+        offsets.append(offsets[-1] + len(value))
+    return offsets, "".join(strings)
+
+###############################################################################
+# Function      : _align(size)
+# Description   : Rounds size up to a multiple of 8 bytes
+###############################################################################
+def _align(size):
+    return (size + 7) // 8 * 8
+
+##############################################################################
+# End of model_file.py module
+#############################################################################
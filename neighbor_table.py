@@ -0,0 +1,466 @@
+##############################################################################
+# Algorithm     :   This program precomputes the top k similar words of
+#                   every word of a model and writes them into a table file,
+#                   so that queries asked over and over are answered by a
+#                   lookup instead of scoring the candidates each time. It is
+#                   meant to be run offline, e.g. overnight after a model is
+#                   built.
+#
+#                   Steps followed in this program are:
+#
+#                   1) The model file is read into memory and all its rows
+#                      are cut into blocks of block_size rows. Each block is
+#                      scored by batchMostSimilar function of similarity.py
+#                      module in a pool of num_workers processes. Worker
+#                      processes are forked after the model is read, so they
+#                      share its pages instead of each getting a copy.
+#
+#                   2) Results of each block are put at the place of its
+#                      rows in three arrays, whatever the order in which the
+#                      blocks finish:
+#
+#                      counts        - number of similar words of each row,
+#                                      at most k (fewer for tiny models)
+#                      neighbor_rows - row ids of the similar words of row i
+#                                      at i * k to i * k + counts[i], best
+#                                      first, padded with -1
+#                      scores        - their similarity scores at the same
+#                                      positions
+#
+#                   3) Arrays are written into a file in the layout of model
+#                      files and memory mapped back (see model_file.py
+#                      module). Since every row takes k slots, the similar
+#                      words of a word are found from its row id (rowOf of
+#                      the model) in constant time, reading only the pages
+#                      of that row.
+#
+#                   Similar words of a row are the same, in the same order,
+#                   as given by mostSimilar function of similarity.py module.
+#                   Queries for at most k words with the measure the table
+#                   was built with are answered from the table; others are
+#                   answered by mostSimilar function.
+#
+#                   Usage           : python neighbor_table.py <model_file>
+#                                     <table_file> <num_of_sim_words>
+#                                     [--workers N] [--similarity MEASURE]
+#                                     [--block-size N] [--metrics FILE]
+##############################################################################
+
+#!/usr/bin/python
+
+'''
+import statements to include Python's in-built module functionalities in the
+program
+'''
+# argparse module is used to read the command line arguments
+import argparse
+
+# array module is used for compact arrays of row ids and scores
+import array
+
+# multiprocessing module scores blocks of rows in parallel
+import multiprocessing
+
+# model_file module loads the model and writes and memory maps the table
+from model_file import readModel, writeSectionFile, mapSectionFile, \
+                       MappedArray, wordsChecksum
+
+# similarity module scores the similar words of each block
+from similarity import mostSimilar, batchMostSimilar, DEFAULT_BLOCK_SIZE
+
+# measures module has the similarity measures
+from measures import SIMILARITY_MEASURES, DEFAULT_SIMILARITY
+
+# metrics module records time and counts of the build and the lookups
+import metrics
+
+'''
+Magic bytes and format version at the start of each table file
+'''
+TABLE_MAGIC = "WSIMNBRS"
+TABLE_VERSION = 1
+
+'''
+Arrays of NeighborTable which are saved into the table file
+'''
+TABLE_ARRAYS = ("counts", "neighbor_rows", "scores")
+
+'''
+Model and dict of row ids by word used by the blocks of a build. They are
+set before worker processes are forked, so workers get them without any
+pickling.
+'''
+_block_matrix = None
+_block_row_ids = None
+
+###############################################################################
+# Class         : NeighborTable
+# Description   : Top similar words of every word of a CoOccurrenceMatrix.
+#
+#                 Attributes:
+#                 num_of_sim_words   - k, number of similar words kept for
+#                                      each word
+#                 measure            - name of the similarity measure
+#                 association        - name of the association measure of
+#                                      the model
+#                 num_rows,
+#                 num_features,
+#                 words_checksum     - shape and checksum of the words of
+#                                      the matrix the table belongs to. Row
+#                                      ids of the same corpus can change
+#                                      with the number of workers counting
+#                                      it, so the shape alone is not enough.
+#                 counts, neighbor_rows, scores
+#                                    - arrays described in step 2 of the
+#                                      module description
+###############################################################################
+class NeighborTable(object):
+
+    def __init__(self, num_of_sim_words, measure, association, num_rows, \
+                 num_features, words_checksum):
+        self.num_of_sim_words = num_of_sim_words
+        self.measure = measure
+        self.association = association
+        self.num_rows = num_rows
+        self.num_features = num_features
+        self.words_checksum = words_checksum
+
+        self.counts = None
+        self.neighbor_rows = None
+        self.scores = None
+
+        self._mmap = None
+
+    ###########################################################################
+    # Method        : build(cv_matrix, num_of_sim_words, measure, num_workers,
+    #                       block_size)
+    # Description   : Builds the table of all words of the matrix (see steps
+    #                 1 and 2 of the module description).
+    # Arguments     : cv_matrix        - CoOccurrenceMatrix with association
+    #                                    computed
+    #                 num_of_sim_words - number of similar words of each word
+    #                 measure          - name of the similarity measure
+    #                 num_workers      - number of worker processes. With 1
+    #                                    worker the blocks are scored in this
+    #                                    process.
+    #                 block_size       - number of rows of each block
+    # Returns       : NeighborTable object
+    ###########################################################################
+    @classmethod
+    def build(cls, cv_matrix, num_of_sim_words, \
+              measure=DEFAULT_SIMILARITY, num_workers=1, \
+              block_size=DEFAULT_BLOCK_SIZE):
+
+        num_rows = cv_matrix.numRows()
+        table = cls(num_of_sim_words, measure, cv_matrix.association, \
+                    num_rows, cv_matrix.numFeatures(), \
+                    wordsChecksum(cv_matrix))
+
+        table.counts = array.array('i', [0]) * num_rows
+        table.neighbor_rows = array.array('i', [-1]) * \
+                              (num_rows * num_of_sim_words)
+        table.scores = array.array('d', [0.0]) * \
+                       (num_rows * num_of_sim_words)
+
+        for block_start, counts, neighbor_rows, scores in \
+                iterBlockNeighbors(cv_matrix, num_of_sim_words, measure, \
+                                   num_workers, block_size):
+            slot_start = block_start * num_of_sim_words
+            slot_end = slot_start + len(neighbor_rows)
+
+            table.counts[block_start:block_start + len(counts)] = counts
+            table.neighbor_rows[slot_start:slot_end] = neighbor_rows
+            table.scores[slot_start:slot_end] = scores
+
+            metrics.count("neighbors.rows", len(counts))
+
+        return table
+
+    ###########################################################################
+    # Method        : covers(num_of_sim_words, measure)
+    # Description   : Tells if queries for num_of_sim_words words with the
+    #                 measure are answered from the table
+    ###########################################################################
+    def covers(self, num_of_sim_words, measure=DEFAULT_SIMILARITY):
+        return num_of_sim_words <= self.num_of_sim_words and \
+               measure == self.measure
+
+    ###########################################################################
+    # Method        : mostSimilar(cv_matrix, target_row, num_of_sim_words,
+    #                             measure)
+    # Description   : Same as mostSimilar function of similarity.py module.
+    #                 When the table covers the query, the similar words are
+    #                 read from the row of the target word in the table;
+    #                 otherwise they are found by mostSimilar function.
+    # Arguments     : cv_matrix        - matrix the table was built for
+    #                 target_row       - row id of the target word
+    #                 num_of_sim_words - number of similar words needed
+    #                 measure          - name of the similarity measure
+    # Returns       : list of (word, score) tuples
+    ###########################################################################
+    def mostSimilar(self, cv_matrix, target_row, num_of_sim_words, \
+                    measure=DEFAULT_SIMILARITY):
+
+        if not self.covers(num_of_sim_words, measure):
+            metrics.count("query.table_misses")
+            return mostSimilar(cv_matrix, target_row, num_of_sim_words, \
+                               measure)
+
+        metrics.count("query.table_lookups")
+
+        count = min(num_of_sim_words, self.counts[target_row])
+        slot_start = target_row * self.num_of_sim_words
+        words = cv_matrix.words
+
+        return [(words[row_id], score) for row_id, score in \
+                zip(self.neighbor_rows[slot_start:slot_start + count], \
+                    self.scores[slot_start:slot_start + count])]
+
+    ###########################################################################
+    # Method        : checkMatrix(cv_matrix)
+    # Description   : Raises ValueError if the table was built for a matrix
+    #                 of another shape, words or association measure
+    ###########################################################################
+    def checkMatrix(self, cv_matrix):
+        if self.num_rows != cv_matrix.numRows() or \
+           self.num_features != cv_matrix.numFeatures() or \
+           self.association != cv_matrix.association or \
+           self.words_checksum != wordsChecksum(cv_matrix):
+            raise ValueError("neighbor table was built for another model")
+
+    ###########################################################################
+    # Method        : close()
+    # Description   : Unmaps the table file of a loaded table
+    ###########################################################################
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+###############################################################################
+# End of NeighborTable class
+###############################################################################
+
+###############################################################################
+# Function      : iterBlockNeighbors(cv_matrix, num_of_sim_words, measure,
+#                                    num_workers, block_size)
+# Description   : Generator scoring the rows of the matrix block by block, in
+#                 a pool of num_workers processes when more than one worker
+#                 is asked for. Blocks are given out in the order in which
+#                 they finish. Counters the workers updated while scoring
+#                 their blocks, e.g. query.candidates, are added to the
+#                 metrics of this process.
+# Arguments     : cv_matrix        - CoOccurrenceMatrix with association
+#                                    computed
+#                 num_of_sim_words - number of similar words of each row
+#                 measure          - name of the similarity measure
+#                 num_workers      - number of worker processes
+#                 block_size       - number of rows of each block
+# Returns       : generator of tuples (block_start, array of counts,
+#                 array of row ids of similar words, array of scores)
+###############################################################################
+def iterBlockNeighbors(cv_matrix, num_of_sim_words, measure, num_workers, \
+                       block_size):
+
+    global _block_matrix, _block_row_ids
+
+    num_rows = cv_matrix.numRows()
+    block_args = [(block_start, min(num_rows, block_start + block_size), \
+                   num_of_sim_words, measure) \
+                  for block_start in xrange(0, num_rows, block_size)]
+
+    '''
+    Words are turned back into row ids through a dict built once, as a
+    loaded model finds the row of a word by binary search. Row norms used
+    by cosine measure are computed once here too, instead of by every
+    worker.
+    '''
+    cv_matrix.rowNorms()
+    _block_matrix = cv_matrix
+    _block_row_ids = dict((word, row_id) for row_id, word in \
+                          enumerate(cv_matrix.words))
+
+    try:
+        if num_workers <= 1 or len(block_args) <= 1:
+            for args in block_args:
+                yield _blockNeighbors(args)[:4]
+            return
+
+        pool = multiprocessing.Pool(min(num_workers, len(block_args)))
+        try:
+            for block_neighbors in pool.imap_unordered(_blockNeighbors, \
+                                                       block_args):
+                for name, amount in block_neighbors[4].iteritems():
+                    metrics.count(name, amount)
+                yield block_neighbors[:4]
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+    finally:
+        _block_matrix = None
+        _block_row_ids = None
+
+###############################################################################
+# Function      : _blockNeighbors(block_args)
+# Description   : Finds the similar words of a block of rows. Work done by a
+#                 worker process of iterBlockNeighbors.
+# Arguments     : block_args - tuple (block_start, block_end,
+#                                     num_of_sim_words, measure)
+# Returns       : tuple (block_start, array of counts, array of row ids of
+#                 similar words, array of scores, dict of counters), the
+#                 arrays of row ids and scores with num_of_sim_words slots
+#                 for each row, and the dict with how much each counter of
+#                 metrics.py module went up while scoring the block
+###############################################################################
+def _blockNeighbors(block_args):
+
+    block_start, block_end, num_of_sim_words, measure = block_args
+
+    counters_before = metrics.snapshot()["counters"]
+
+    counts = array.array('i')
+    neighbor_rows = array.array('i')
+    scores = array.array('d')
+
+    for block_results in batchMostSimilar(_block_matrix, \
+                                          range(block_start, block_end), \
+                                          num_of_sim_words, \
+                                          block_end - block_start, measure):
+        for target_row, word_sim in block_results:
+            counts.append(len(word_sim))
+            for word, score in word_sim:
+                neighbor_rows.append(_block_row_ids[word])
+                scores.append(score)
+
+            padding = num_of_sim_words - len(word_sim)
+            neighbor_rows.extend([-1] * padding)
+            scores.extend([0.0] * padding)
+
+    counter_deltas = {}
+    for name, value in metrics.snapshot()["counters"].iteritems():
+        if value != counters_before.get(name, 0):
+            counter_deltas[name] = value - counters_before.get(name, 0)
+
+    return block_start, counts, neighbor_rows, scores, counter_deltas
+
+###############################################################################
+# Function      : saveTable(table, table_path)
+# Description   : Writes the table into a file in the layout of model files
+# Arguments     : table      - NeighborTable object
+#                 table_path - path of the table file
+# Returns       : None
+###############################################################################
+def saveTable(table, table_path):
+
+    sections = [(name, getattr(table, name)) for name in TABLE_ARRAYS]
+
+    writeSectionFile(table_path, TABLE_MAGIC, TABLE_VERSION, \
+                     {"num_of_sim_words": table.num_of_sim_words, \
+                      "measure": table.measure, \
+                      "association": table.association, \
+                      "num_rows": table.num_rows, \
+                      "num_features": table.num_features, \
+                      "words_checksum": table.words_checksum}, sections)
+
+###############################################################################
+# Function      : loadTable(table_path)
+# Description   : Memory maps a table file written by saveTable
+# Arguments     : table_path - path of the table file
+# Returns       : NeighborTable object reading its arrays from the file
+###############################################################################
+def loadTable(table_path):
+
+    mapped, header, sections = mapSectionFile(table_path, TABLE_MAGIC, \
+                                              TABLE_VERSION)
+
+    table = NeighborTable(header["num_of_sim_words"], \
+                          str(header["measure"]), \
+                          str(header["association"]), \
+                          header["num_rows"], header["num_features"], \
+                          header["words_checksum"])
+    table._mmap = mapped
+
+    for name in TABLE_ARRAYS:
+        offset, typecode, length = sections[name]
+        setattr(table, name, MappedArray(mapped, offset, typecode, length))
+
+    return table
+
+###############################################################################
+# Function      : main()
+# Description   : Entry point for the program. Builds the table of a model
+#                 file and saves it.
+# Arguments     : None. Command Line Arguments in Python are retrieved from
+#                 sys.argv variable of sys module.
+# Returns       : None.
+###############################################################################
+def main():
+
+    parser = argparse.ArgumentParser(description="Precompute the top " \
+                                     "similar words of every word of a " \
+                                     "model file.")
+    parser.add_argument("model_file", \
+                        help="model file written by word_sim.py " \
+                             "--save-model")
+    parser.add_argument("table_file", \
+                        help="table file to write")
+    parser.add_argument("num_of_sim_words", type=int, \
+                        help="number of similar words kept for each word")
+    parser.add_argument("--workers", type=int, \
+                        default=multiprocessing.cpu_count(), \
+                        help="number of worker processes scoring the blocks")
+    parser.add_argument("--similarity", \
+                        choices=sorted(SIMILARITY_MEASURES), \
+                        default=DEFAULT_SIMILARITY, \
+                        help="similarity measure the words are compared " \
+                             "with")
+    parser.add_argument("--block-size", type=int, \
+                        default=DEFAULT_BLOCK_SIZE, \
+                        help="number of words scored together by a worker")
+    parser.add_argument("--metrics", metavar="METRICS_FILE", \
+                        help="write time, counts and peak memory of each " \
+                             "stage into this JSON file ('-' for a JSON " \
+                             "line on stderr)")
+    args = parser.parse_args()
+
+    if args.num_of_sim_words < 1:
+        parser.error("num_of_sim_words must be at least 1")
+    if args.block_size < 1:
+        parser.error("--block-size must be at least 1")
+
+    if args.metrics is not None:
+        metrics.addSink(metrics.sinkFor(args.metrics))
+
+    with metrics.timer("load_model"):
+        cv_matrix = readModel(args.model_file)
+
+    with metrics.timer("build_neighbor_table"):
+        table = NeighborTable.build(cv_matrix, args.num_of_sim_words, \
+                                    args.similarity, args.workers, \
+                                    args.block_size)
+
+    with metrics.timer("save_neighbor_table"):
+        saveTable(table, args.table_file)
+
+    cv_matrix.close()
+    metrics.emit()
+
+###############################################################################
+# End of main function
+###############################################################################
+
+'''
+Boilerplate syntax to specify that main() method is the entry point for
+this program.
+'''
+
+if __name__ == '__main__':
+
+    main()
+
+##############################################################################
+# End of neighbor_table.py program
+#############################################################################
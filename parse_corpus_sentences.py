@@ -13,15 +13,37 @@
 #                      each sentence.
 #                   
 #                   2) To extract sentence from <P> tags xml parser is used.
+#                      Each corpus file is parsed as a stream, fixing it up
+#                      for the xml parser on the fly and dropping each <DOC>
+#                      once it is read, so no copy of the corpus file is
+#                      written and memory does not grow with file size.
+#                      Corpus files can be extracted by a pool of worker
+#                      processes, each writing its own ordered shard of
+#                      sentences.
 #
 #                   3) Each parsed sentence is written to a file.
 #                   
 #                   4) File generated in step 3 is split into multiple small 
-#                      files.
+#                      files. Small files have about the same number of
+#                      tokens, as a proxy of the time taken to parse them,
+#                      and are listed in a manifest.
 #
 #                   5) Each of these small file is given as input to
 #                      Standford Parser to create parse file containing
-#                      grammatical relations of words in sentences.
+#                      grammatical relations of words in sentences. A
+#                      bounded pool of parser workers takes the small files
+#                      from a queue, in batches parsed by one parser process
+#                      each, until all of them are parsed.
+#
+#                   6) Each parse file is written under a temporary name and
+#                      renamed only when the parser finished it, and then
+#                      recorded in a ledger. When parsing is run again, e.g.
+#                      after the parser was killed, split files recorded in
+#                      the ledger are not parsed again.
+#
+#                   Time, counts and peak memory of steps 1-5 are recorded
+#                   by metrics.py module and written into a JSON file with
+#                   --metrics option.
 ##############################################################################
 
 #!/usr/bin/python
@@ -42,9 +64,80 @@ import os
 # threading module used to do multithreading
 import threading
 
+# multiprocessing module is used to extract corpus files in parallel
+import multiprocessing
+
+# argparse module is used to read the command line arguments
+import argparse
+
+# array module is used for compact arrays of offsets
+import array
+
+# subprocess and shlex modules are used to run the parser command
+import subprocess
+import shlex
+
+# Queue module holds the split files waiting to be parsed
+import Queue
+
+# shutil module copies split files which cannot be linked
+import shutil
+
+# filecmp module compares a new shard with the one written by an earlier run
+import filecmp
+
+# json module is used to write the manifest of shards
+import json
+
+# metrics module records time and counts of extraction and parsing
+import metrics
+
 # ElementTree module used for xml parsing
 import xml.etree.ElementTree as ET
 
+'''
+Number of <P> tags whose sentences are extracted from the corpus files
+'''
+MAX_PARAGRAPHS = 500000
+
+'''
+Command running Standford parser on a batch of files. {memory} is replaced
+by the memory of the parser process in MB and {files} by the names of the
+files. Each file is parsed into <file_name>.parse.
+'''
+PARSER_COMMAND = 'java -mx{memory}m -cp "./*:" ' \
+                 'edu.stanford.nlp.parser.lexparser.LexicalizedParser ' \
+                 '-outputFormat "typedDependenciesCollapsed" -maxLength 60 ' \
+                 '-writeOutputFiles -outputFilesExtension parse ' \
+                 'edu/stanford/nlp/models/lexparser/englishPCFG.ser.gz ' \
+                 '{files}'
+
+'''
+Default number of parser processes running at the same time, memory of
+each of them in MB and number of files given to each of them
+'''
+PARSE_WORKERS = 10
+PARSER_MEMORY = 2048
+PARSE_BATCH_SIZE = 16
+
+'''
+Default number of tokens in each shard of the sentence file, ends of lines
+at which a shard can be closed and name of the manifest of shards
+'''
+SHARD_TOKENS = 100000
+SENTENCE_ENDINGS = (".", "?", "!", "\"", "'")
+SHARD_MANIFEST = "shards.json"
+
+# names of shards and of their parse files
+SHARD_NAME_PATTERN = re.compile(r"^(shard-\d{5})(\.parse)?$")
+
+'''
+Name of the ledger of parsed split files, kept next to them, and suffix of
+the temporary names split files are parsed under
+'''
+PARSE_LEDGER = "parsed.ledger"
+PARTIAL_SUFFIX = ".partial"
+
 ###############################################################################
 # Function      : absoluteFilePaths(directory)
 # Description   : This function returns the list containing absolute paths
@@ -69,25 +162,514 @@ def absoluteFilePaths(directory):
 ###############################################################################
 
 ###############################################################################
-# Function      : parseFile(file_name)
+# Class         : SanitizedCorpusFile
+# Description   : Read-only file-like object giving the contents of a corpus
+#                 file fixed up for xml parsing, without writing a copy of it.
+#
+#                 Each corpus file has many xml documents with <DOC> as their
+#                 root tag, so all of them are wrapped into one <DUMMY> root
+#                 tag. Corpus files also have the character entities &AMP;
+#                 and &amp;, which stand for the word "and" (basically the
+#                 symbol &). The xml parser does not recognize them, so they
+#                 are replaced with "and" and any other "&" is dropped. Empty
+#                 lines are skipped.
+#
+#                 Lines are read from the corpus file and fixed up only when
+#                 the xml parser asks for more data, so only a few lines of
+#                 the file are in memory at a time.
+###############################################################################
+class SanitizedCorpusFile(object):
+
+    def __init__(self, corpus_file_path):
+        self._pieces = _sanitizedCorpusLines(corpus_file_path)
+        self._buffer = ""
+
+    ###########################################################################
+    # Method        : read(size)
+    # Description   : Returns up to size bytes of the fixed up contents, or
+    #                 all remaining contents if size is negative. Empty string
+    #                 is returned at the end.
+    ###########################################################################
+    def read(self, size=-1):
+
+        pieces = [self._buffer]
+        length = len(self._buffer)
+
+        while size < 0 or length < size:
+            piece = next(self._pieces, None)
+            if piece is None:
+                break
+            pieces.append(piece)
+            length += len(piece)
+
+        data = "".join(pieces)
+        if size < 0:
+            size = len(data)
+
+        self._buffer = data[size:]
+        return data[:size]
+
+###############################################################################
+# End of SanitizedCorpusFile class
+###############################################################################
+
+###############################################################################
+# Function      : _sanitizedCorpusLines(corpus_file_path)
+# Description   : Generator of the fixed up contents of a corpus file, a line
+#                 at a time, wrapped into <DUMMY> root tag. Used by
+#                 SanitizedCorpusFile.
+###############################################################################
+def _sanitizedCorpusLines(corpus_file_path):
+
+    yield "<DUMMY>"
+
+    doc_handle = open(corpus_file_path, 'r')
+    try:
+        for line in doc_handle:
+
+            if "&AMP;" in line or "&amp;" in line:
+                line = line.replace("&AMP;", "and").replace("&amp;", "and")
+
+            if "&" in line:
+                line = line.replace("&", "")
+
+            if line != "\n":
+                yield line
+    finally:
+        doc_handle.close()
+
+    yield "</DUMMY>"
+
+###############################################################################
+# Function      : iterParagraphs(corpus_file_path)
+# Description   : Generator of the text of each <P> tag of a corpus file, in
+#                 the order they appear in the file.
+#
+#                 The corpus file is parsed incrementally by iterparse of
+#                 ElementTree module. Once a <DOC> (or any other tag right
+#                 under the <DUMMY> root) is fully read, it is removed from
+#                 the tree, so the tree never holds more than one <DOC>.
+# Arguments     : corpus_file_path - path of a corpus file
+# Returns       : generator of text of <P> tags. Text of an empty <P> tag is
+#                 "None", same as str(None).
+###############################################################################
+def iterParagraphs(corpus_file_path):
+
+    root = None
+    depth = 0
+
+    for event, element in ET.iterparse(SanitizedCorpusFile(corpus_file_path), \
+                                       events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+            depth += 1
+            continue
+
+        depth -= 1
+
+        if element.tag == "P":
+            yield str(element.text)
+
+        # drop the documents already read
+        if depth == 1:
+            root.clear()
+
+###############################################################################
+# End of iterParagraphs function
+###############################################################################
+
+###############################################################################
+# Function      : corpusFilePaths(document_path)
+# Description   : Returns the paths of all corpus files present in the
+#                 document directory. The code to get directory listing from
+#                 a directory is borrowed from the link:
+#                 http://mail.python.org/pipermail/tutor/2004-August/031232.html
+#
+#                 Corpus files are taken in the order of their names, so
+#                 that the same <P> tags are extracted on every run,
+#                 whatever the number of workers is.
+# Arguments     : document_path - path of directory of corpus files
+# Returns       : sorted list of paths of corpus files
+###############################################################################
+def corpusFilePaths(document_path):
+
+    docsList=os.listdir(document_path)
+
+    return [os.path.join(document_path, document) for \
+            document in sorted(docsList)]
+
+###############################################################################
+# Function      : extractSentences(corpus_file_paths, op_file_path,
+#                                  num_workers, max_paragraphs)
+# Description   : Writes the text of the first max_paragraphs <P> tags of
+#                 the corpus files into the sentence file. Corpus files are
+#                 read in the order they are given, so the same corpus
+#                 always gives the same sentence file.
+#
+#                 With more than one worker, corpus files are extracted by
+#                 a pool of worker processes. Each worker writes the text of
+#                 the <P> tags of one corpus file into its own shard, next
+#                 to the sentence file, and gives back where each <P> text
+#                 ends in the shard. Shards are added to the sentence file
+#                 in the order of corpus files, and the last one needed is
+#                 cut at the max_paragraphs-th <P> tag in total. So the
+#                 sentence file is the same as with one worker.
+# Arguments     : corpus_file_paths - list of paths of corpus files
+#                 op_file_path      - path of the sentence file to write
+#                 num_workers       - number of worker processes
+#                 max_paragraphs    - number of <P> tags to extract
+# Returns       : number of <P> tags extracted
+###############################################################################
+@metrics.timed("extract")
+def extractSentences(corpus_file_paths, op_file_path, num_workers=1, \
+                     max_paragraphs=MAX_PARAGRAPHS):
+
+    op_file = open(op_file_path, 'w')
+
+    try:
+        if num_workers <= 1 or len(corpus_file_paths) <= 1:
+            loop_counter = _extractSerially(corpus_file_paths, op_file, \
+                                            max_paragraphs)
+            metrics.count("extract.paragraphs", loop_counter)
+            return loop_counter
+
+        shard_prefix = op_file_path + ".shard."
+        extract_args = [(corpus_file_path, shard_prefix + str(index), \
+                         max_paragraphs) for index, corpus_file_path in \
+                        enumerate(corpus_file_paths)]
+
+        loop_counter = 0
+
+        pool = multiprocessing.Pool(min(num_workers, len(extract_args)))
+        try:
+            '''
+            imap gives back the shards in the order of corpus files, while
+            the workers go on extracting the next files.
+            '''
+            for shard_path, para_ends in pool.imap(_extractToShard, \
+                                                   extract_args):
+                needed = min(len(para_ends), max_paragraphs - loop_counter)
+
+                if needed > 0:
+                    _copyShard(shard_path, op_file, para_ends[needed - 1])
+                    loop_counter = loop_counter + needed
+                os.remove(shard_path)
+
+                if loop_counter >= max_paragraphs:
+                    break
+
+            # stop the workers extracting files which are not needed
+            pool.terminate()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            for corpus_file_path, shard_path, limit in extract_args:
+                if os.path.exists(shard_path):
+                    os.remove(shard_path)
+
+        metrics.count("extract.paragraphs", loop_counter)
+        return loop_counter
+    finally:
+        op_file.close()
+
+###############################################################################
+# End of extractSentences function
+###############################################################################
+
+###############################################################################
+# Function      : _extractSerially(corpus_file_paths, op_file,
+#                                  max_paragraphs)
+# Description   : Writes the text of the first max_paragraphs <P> tags of
+#                 the corpus files into op_file, in this process.
+###############################################################################
+def _extractSerially(corpus_file_paths, op_file, max_paragraphs):
+
+    loop_counter = 0
+
+    for corpus_file_path in corpus_file_paths:
+
+        if loop_counter >= max_paragraphs:
+            break
+
+        print "Processing document " + corpus_file_path + "..."
+
+        for para_text in iterParagraphs(corpus_file_path):
+            op_file.write(para_text.rstrip())
+            loop_counter = loop_counter + 1
+            if loop_counter >= max_paragraphs:
+                break
+
+    return loop_counter
+
+###############################################################################
+# Function      : _extractToShard(extract_args)
+# Description   : Writes the text of the <P> tags of one corpus file into a
+#                 shard, up to max_paragraphs of them. Work done by a worker
+#                 process of extractSentences.
+# Arguments     : extract_args - tuple (corpus_file_path, shard_path,
+#                                max_paragraphs)
+# Returns       : tuple (shard_path, array of the offsets in the shard at
+#                 which the text of each <P> tag ends)
+###############################################################################
+def _extractToShard(extract_args):
+
+    corpus_file_path, shard_path, max_paragraphs = extract_args
+
+    print "Processing document " + corpus_file_path + "..."
+
+    para_ends = array.array('l')
+    shard_size = 0
+
+    shard_handle = open(shard_path, 'w')
+    try:
+        for para_text in iterParagraphs(corpus_file_path):
+            if len(para_ends) >= max_paragraphs:
+                break
+            para_text = para_text.rstrip()
+            shard_handle.write(para_text)
+            shard_size += len(para_text)
+            para_ends.append(shard_size)
+    finally:
+        shard_handle.close()
+
+    return shard_path, para_ends
+
+###############################################################################
+# Function      : _copyShard(shard_path, op_file, size)
+# Description   : Copies the first size bytes of a shard into op_file.
+###############################################################################
+def _copyShard(shard_path, op_file, size):
+
+    shard_handle = open(shard_path, 'r')
+    try:
+        while size > 0:
+            data = shard_handle.read(min(size, 1024 * 1024))
+            if not data:
+                break
+            op_file.write(data)
+            size -= len(data)
+    finally:
+        shard_handle.close()
+
+###############################################################################
+# Function      : shardSentences(op_file_path, split_file_path, num_shards,
+#                                shard_tokens)
+# Description   : Splits the sentence file into shards of about the same
+#                 parse cost, so that no shard keeps the parser running long
+#                 after the others are done. Number of tokens of a line is
+#                 taken as its parse cost.
+#
+#                 The sentence file is read twice, a line at a time. First
+#                 read counts the tokens, to find the cost each shard should
+#                 have. Second read writes the lines into shards. A shard
+#                 is closed once it reaches its cost, at the end of the
+#                 next line which ends a sentence, so that sentences
+#                 running over more than one line are not cut. If no line
+#                 ends a sentence within a tenth of the cost of a shard,
+#                 the shard is closed anyway. Lines stay in the same order
+#                 as in the sentence file.
+#
+#                 Each shard is written under a temporary name first. A
+#                 shard with the same content as the one left by an earlier
+#                 run is not replaced, so it keeps its modification time
+#                 and the ledger of parsed files still knows it was parsed
+#                 (see parseSplitFiles).
+#
+#                 A manifest listing the shards with their lines and tokens
+#                 is written next to them (see SHARD_MANIFEST). Shards of an
+#                 earlier run which are not in it any more, e.g. when there
+#                 are fewer shards now, are removed with their parse files
+#                 and their entries in the ledger of parsed files, so their
+#                 relations are not counted with the new ones.
+# Arguments     : op_file_path    - path of the sentence file
+#                 split_file_path - directory to write the shards into
+#                 num_shards      - number of shards, or None to have
+#                                   shards of about shard_tokens tokens
+#                 shard_tokens    - tokens per shard if num_shards is None
+# Returns       : list of the paths of shards
+###############################################################################
+@metrics.timed("shard")
+def shardSentences(op_file_path, split_file_path, num_shards=None, \
+                   shard_tokens=SHARD_TOKENS):
+
+    total_tokens = 0
+    op_file = open(op_file_path, 'r')
+    for line in op_file:
+        total_tokens += len(line.split())
+    op_file.close()
+
+    if num_shards is None:
+        num_shards = (total_tokens + shard_tokens - 1) // shard_tokens
+    num_shards = max(1, num_shards)
+
+    # a shard is closed anyway if no end of sentence is found soon enough
+    max_overrun = total_tokens // num_shards // 10
+
+    shards = []
+    shard_handle = None
+    shard_target = 0
+    written_tokens = 0
+
+    op_file = open(op_file_path, 'r')
+    try:
+        for line in op_file:
+
+            if shard_handle is None:
+                shard_name = "shard-%05d" % len(shards)
+                shard_path = os.path.join(split_file_path, shard_name)
+                shard_handle = open(shard_path + ".tmp", 'w')
+                shards.append({"file": shard_name, "lines": 0, "tokens": 0})
+                shard_target = total_tokens * len(shards) // num_shards
+
+            tokens = len(line.split())
+            shard_handle.write(line)
+            shards[-1]["lines"] += 1
+            shards[-1]["tokens"] += tokens
+            written_tokens += tokens
+
+            if written_tokens >= shard_target and \
+               len(shards) < num_shards and \
+               (line.rstrip().endswith(SENTENCE_ENDINGS) or \
+                written_tokens >= shard_target + max_overrun):
+                shard_handle.close()
+                shard_handle = None
+                _replaceIfChanged(shard_path + ".tmp", shard_path)
+    finally:
+        op_file.close()
+        if shard_handle is not None:
+            shard_handle.close()
+
+    if shard_handle is not None:
+        _replaceIfChanged(shard_path + ".tmp", shard_path)
+
+    manifest_handle = open(os.path.join(split_file_path, SHARD_MANIFEST), 'w')
+    json.dump({"sentence_file": os.path.abspath(op_file_path), \
+               "total_tokens": total_tokens, \
+               "shards": shards}, manifest_handle, indent=1)
+    manifest_handle.close()
+
+    _removeStaleShards(split_file_path, \
+                       set(shard["file"] for shard in shards))
+
+    metrics.gauge("shard.shards", len(shards))
+    metrics.gauge("shard.tokens", total_tokens)
+
+    return [os.path.abspath(os.path.join(split_file_path, shard["file"])) \
+            for shard in shards]
+
+###############################################################################
+# End of shardSentences function
+###############################################################################
+
+###############################################################################
+# Function      : _replaceIfChanged(temp_path, path)
+# Description   : Renames temp_path to path, unless path already has the same
+#                 content, in which case temp_path is removed and path is
+#                 left as it was.
+###############################################################################
+def _replaceIfChanged(temp_path, path):
+    if os.path.exists(path) and filecmp.cmp(temp_path, path, shallow=False):
+        os.remove(temp_path)
+    else:
+        os.rename(temp_path, path)
+
+###############################################################################
+# Function      : _removeStaleShards(split_file_path, shard_names)
+# Description   : Removes the shards named like SHARD_NAME_PATTERN which are
+#                 not in shard_names, with their parse files, and drops them
+#                 from the ledger of parsed files in the same directory.
+###############################################################################
+def _removeStaleShards(split_file_path, shard_names):
+
+    for file_name in os.listdir(split_file_path):
+        match = SHARD_NAME_PATTERN.match(file_name)
+        if match and match.group(1) not in shard_names:
+            os.remove(os.path.join(split_file_path, file_name))
+
+    ledger_path = os.path.join(split_file_path, PARSE_LEDGER)
+    if os.path.exists(ledger_path):
+        ledger = readParseLedger(ledger_path)
+        kept = dict((file_name, entry) for file_name, entry in \
+                    ledger.iteritems() if file_name in shard_names)
+        if len(kept) != len(ledger):
+            _writeLedger(ledger_path, kept)
+
+###############################################################################
+# Function      : shardPaths(split_file_path)
+# Description   : Returns the paths of the shards listed in the manifest
+#                 written by shardSentences, or an empty list if there is no
+#                 manifest.
+# Arguments     : split_file_path - directory of the shards
+# Returns       : list of the paths of shards
+###############################################################################
+def shardPaths(split_file_path):
+
+    manifest_path = os.path.join(split_file_path, SHARD_MANIFEST)
+    if not os.path.exists(manifest_path):
+        return []
+
+    manifest_handle = open(manifest_path, 'r')
+    manifest = json.load(manifest_handle)
+    manifest_handle.close()
+
+    return [os.path.abspath(os.path.join(split_file_path, \
+                                         str(shard["file"]))) \
+            for shard in manifest["shards"]]
+
+###############################################################################
+# Function      : parseFiles(file_names, parser_base_path, parser_memory,
+#                            parser_command)
 # Description   : This function makes a call to Standford parser to parse
-#                 file given as argument to it. It stores the output of parsed
-#                 files into a file with name as <file_name>.parse. Note that
-#                 <file_name> is same as the file_name argument here.
-# Arguments     : file_name- Name of the file to be parsed
-# Returns       : None
+#                 the files given as argument to it. A single parser process
+#                 parses all of them, so the parser starts up and loads its
+#                 model only once for all the files. It stores the output of
+#                 each parsed file into a file with name as
+#                 <file_name>.parse. Note that <file_name> is same as the
+#                 name of the file in file_names.
+#
+#                 The parser command is a template. {memory} in it is
+#                 replaced by parser_memory and the {files} argument by
+#                 the names of the files. Any other command writing the
+#                 parse files the same way, e.g. a stub for testing, can
+#                 be given instead of Standford parser.
+#
+#                 The parser is given links to the files with
+#                 PARTIAL_SUFFIX added to their names, so it writes
+#                 <file_name>.partial.parse. These are renamed to
+#                 <file_name>.parse only after the parser exited
+#                 successfully, so a parse file is never left half written
+#                 under its final name.
+# Arguments     : file_names       - names of the files to be parsed
+#                 parser_base_path - directory the parser is run in
+#                 parser_memory    - memory of the parser process in MB
+#                 parser_command   - parser command template
+# Returns       : list of the names of files which were not parsed
 ###############################################################################
 
-def parseFile(file_name):
-    print "Parsing " +  file_name + "...."
-    
-    # Make a call to Standford Parser
-    os.system("java -mx2048m -cp \"./*:\" \
-              edu.stanford.nlp.parser.lexparser.LexicalizedParser\
-              -outputFormat \"typedDependenciesCollapsed\" -maxLength 60  \
-              edu/stanford/nlp/models/lexparser/englishPCFG.ser.gz " + \
-              file_name+ " >" + file_name + ".parse")
+def parseFiles(file_names, parser_base_path, parser_memory=PARSER_MEMORY, \
+               parser_command=PARSER_COMMAND):
+    partial_names = []
+    for file_name in file_names:
+        print "Parsing " +  file_name + "...."
+        partial_name = file_name + PARTIAL_SUFFIX
+        _removeIfExists(partial_name)
+        _removeIfExists(partial_name + ".parse")
+        try:
+            os.link(file_name, partial_name)
+        except OSError:
+            shutil.copyfile(file_name, partial_name)
+        partial_names.append(partial_name)
 
+    command = []
+    for argument in shlex.split(parser_command):
+        if argument == "{files}":
+            command.extend(partial_names)
+        else:
+            command.append(argument.replace("{memory}", str(parser_memory)))
+    
     '''
     Standford parser does full parsing of sentences present in a file.
     The parsing of sentences generates grammatical relations of words
@@ -125,9 +707,240 @@ def parseFile(file_name):
 
     '''
 
+    # Make a call to Standford Parser
+    try:
+        status = subprocess.call(command, cwd=parser_base_path)
+    except OSError, error:
+        print "Parser could not be started: " + str(error)
+        status = None
+
+    if status:
+        print "Parser exited with status " + str(status)
+
+    failed_files = []
+    for file_name, partial_name in zip(file_names, partial_names):
+        if status == 0 and os.path.exists(partial_name + ".parse"):
+            os.rename(partial_name + ".parse", file_name + ".parse")
+        else:
+            _removeIfExists(partial_name + ".parse")
+            failed_files.append(file_name)
+        os.remove(partial_name)
+
+    return failed_files
+
+###############################################################################
+# End of parseFiles function
+###############################################################################
+
+###############################################################################
+# Function      : parseSplitFiles(file_names, parser_base_path, num_workers,
+#                                 parser_memory, memory_budget, batch_size,
+#                                 parser_command)
+# Description   : Parses all split files with a bounded pool of parser
+#                 workers. Split files are put into a queue. Each worker
+#                 takes up to batch_size files at a time from the queue and
+#                 parses them with one parser process (see parseFiles), and
+#                 goes on until the queue is empty. So a worker which gets
+#                 short files takes more batches, and the parser loads its
+#                 model once per batch instead of once per file.
+#
+#                 Number of workers is num_workers, lowered so that the
+#                 parser processes running at the same time fit in the
+#                 memory budget.
+#
+#                 Each parsed batch is recorded in the ledger of parsed
+#                 files (see readParseLedger), which is written to disk
+#                 right away. With resume, split files recorded in the
+#                 ledger, which did not change since and whose parse file
+#                 is still there, are not parsed again. So a run which was
+#                 stopped goes on with the missing and failed files only.
+# Arguments     : file_names       - names of the split files to be parsed
+#                 parser_base_path - directory the parser is run in
+#                 num_workers      - number of parser processes running at
+#                                    the same time
+#                 parser_memory    - memory of each parser process in MB
+#                 memory_budget    - memory in MB for all parser processes,
+#                                    or None for no limit
+#                 batch_size       - number of files given to a parser
+#                                    process
+#                 parser_command   - parser command template (see
+#                                    parseFiles)
+#                 resume           - if False, all files are parsed again
+#                 ledger_path      - path of the ledger, by default
+#                                    PARSE_LEDGER in the directory of the
+#                                    first file
+# Returns       : list of the names of files which were not parsed
+###############################################################################
+@metrics.timed("parse")
+def parseSplitFiles(file_names, parser_base_path, num_workers=PARSE_WORKERS, \
+                    parser_memory=PARSER_MEMORY, memory_budget=None, \
+                    batch_size=PARSE_BATCH_SIZE, \
+                    parser_command=PARSER_COMMAND, resume=True, \
+                    ledger_path=None):
+
+    if not file_names:
+        return []
+
+    if ledger_path is None:
+        ledger_path = os.path.join(os.path.dirname(file_names[0]), \
+                                   PARSE_LEDGER)
+    ledger_directory = os.path.dirname(os.path.abspath(ledger_path))
+
+    '''
+    Keep only the entries of the ledger which are still valid, rewriting
+    it so it does not grow with every run, and leave out the files they
+    record.
+    '''
+    ledger = {}
+    if resume:
+        for file_name, entry in readParseLedger(ledger_path).iteritems():
+            if entry == _ledgerEntry(os.path.join(ledger_directory, \
+                                                  file_name)):
+                ledger[file_name] = entry
+    _writeLedger(ledger_path, ledger)
+
+    parsed_names = set(os.path.join(ledger_directory, file_name) for \
+                       file_name in ledger)
+    file_names = [file_name for file_name in file_names \
+                  if os.path.abspath(file_name) not in parsed_names]
+    if parsed_names:
+        print "Skipping " + str(len(parsed_names)) + " split files " \
+              "parsed before"
+    metrics.count("parse.skipped_files", len(parsed_names))
+    if not file_names:
+        return []
+
+    if memory_budget is not None:
+        num_workers = min(num_workers, memory_budget // parser_memory)
+    num_workers = max(1, min(num_workers, len(file_names)))
+
+    file_queue = Queue.Queue()
+    for file_name in file_names:
+        file_queue.put(file_name)
+
+    failed_files = []
+    failed_lock = threading.Lock()
+    ledger_handle = open(ledger_path, 'a')
+
+    def parserWorker():
+        while True:
+            batch = []
+            try:
+                while len(batch) < batch_size:
+                    batch.append(file_queue.get_nowait())
+            except Queue.Empty:
+                pass
+
+            if not batch:
+                return
+
+            '''
+            An error while parsing or recording a batch, e.g. a split file
+            which can not be linked or a full disk, must not end the
+            worker silently with its batch neither parsed nor failed. The
+            whole batch is counted as failed and the worker goes on.
+            '''
+            try:
+                with metrics.timer("parse_batch"):
+                    failed = parseFiles(batch, parser_base_path, \
+                                        parser_memory, parser_command)
+                with failed_lock:
+                    for file_name in batch:
+                        if file_name not in failed:
+                            entry = _ledgerEntry(file_name)
+                            entry["file"] = os.path.relpath(file_name, \
+                                                            ledger_directory)
+                            ledger_handle.write(json.dumps(entry, \
+                                                           sort_keys=True) + \
+                                                "\n")
+                    ledger_handle.flush()
+                    os.fsync(ledger_handle.fileno())
+            except Exception, error:
+                print "Parsing of a batch failed: " + str(error)
+                failed = batch
+
+            metrics.count("parse.files", len(batch) - len(failed))
+            metrics.count("parse.failed_files", len(failed))
+            with failed_lock:
+                failed_files.extend(failed)
+
+    workers = [threading.Thread(target=parserWorker) for i in \
+               xrange(num_workers)]
+    try:
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    finally:
+        ledger_handle.close()
+
+    return sorted(failed_files)
+
 ###############################################################################
-# End of main function
+# End of parseSplitFiles function
+###############################################################################
+
+###############################################################################
+# Function      : readParseLedger(ledger_path)
+# Description   : Reads the ledger of parsed split files. Each line of the
+#                 ledger is a JSON object with the name of a split file,
+#                 relative to the directory of the ledger, the size and
+#                 modification time the split file had when it was parsed
+#                 and the size of its parse file. Lines are only appended,
+#                 so a last line cut short by a crash is skipped.
+# Arguments     : ledger_path - path of the ledger
+# Returns       : dict mapping name of split file to its entry, empty if
+#                 there is no ledger
 ###############################################################################
+def readParseLedger(ledger_path):
+
+    ledger = {}
+    if not os.path.exists(ledger_path):
+        return ledger
+
+    ledger_handle = open(ledger_path, 'r')
+    try:
+        for ledger_line in ledger_handle:
+            try:
+                entry = json.loads(ledger_line)
+            except ValueError:
+                continue
+            ledger[str(entry.pop("file"))] = entry
+    finally:
+        ledger_handle.close()
+
+    return ledger
+
+###############################################################################
+# Function      : _ledgerEntry(file_name), _writeLedger(ledger_path,
+#                 ledger), _removeIfExists(path)
+# Description   : Ledger entry of a split file as it is now, None if it has
+#                 no parse file; writing of the whole ledger under a
+#                 temporary name renamed over the old one; removal of a
+#                 file which may not exist.
+###############################################################################
+def _ledgerEntry(file_name):
+    parse_file_name = file_name + ".parse"
+    if not os.path.exists(file_name) or not os.path.exists(parse_file_name):
+        return None
+    file_stat = os.stat(file_name)
+    return {"size": file_stat.st_size, \
+            "mtime": file_stat.st_mtime, \
+            "parse_size": os.path.getsize(parse_file_name)}
+
+def _writeLedger(ledger_path, ledger):
+    temp_path = ledger_path + ".tmp"
+    ledger_handle = open(temp_path, 'w')
+    for file_name in sorted(ledger):
+        entry = dict(ledger[file_name], file=file_name)
+        ledger_handle.write(json.dumps(entry, sort_keys=True) + "\n")
+    ledger_handle.close()
+    os.rename(temp_path, ledger_path)
+
+def _removeIfExists(path):
+    if os.path.exists(path):
+        os.remove(path)
+
 
 ###############################################################################
 # Function      : main()
@@ -144,10 +957,63 @@ def main():
     2) Path where the files split from corpus files and parsed files
        will be placed
     3) Base path of Standford Parser
+
+    Optionally, the number of worker processes extracting corpus files,
+    the number of <P> tags to extract and the settings of parser workers
+    can be given too.
     '''
-	document_path = sys.argv[1]
-	split_file_path = sys.argv[2]
-	parser_base_path = sys.argv[3]
+    parser = argparse.ArgumentParser(description="Extract sentences of " \
+                                     "corpus files and parse them with " \
+                                     "Standford parser.")
+    parser.add_argument("document_path", \
+                        help="directory containing all corpus files")
+    parser.add_argument("split_file_path", \
+                        help="directory for split files and parse files")
+    parser.add_argument("parser_base_path", \
+                        help="base path of Standford parser")
+    parser.add_argument("--extract-workers", type=int, default=1, \
+                        help="number of processes extracting corpus files")
+    parser.add_argument("--max-paragraphs", type=int, \
+                        default=MAX_PARAGRAPHS, \
+                        help="number of <P> tags whose sentences are " \
+                             "extracted")
+    parser.add_argument("--num-shards", type=int, \
+                        help="number of shards the sentence file is split " \
+                             "into for parsing")
+    parser.add_argument("--shard-tokens", type=int, default=SHARD_TOKENS, \
+                        help="tokens per shard, if --num-shards is not " \
+                             "given")
+    parser.add_argument("--parse-workers", type=int, default=PARSE_WORKERS, \
+                        help="number of parser processes running at the " \
+                             "same time")
+    parser.add_argument("--parser-memory", type=int, default=PARSER_MEMORY, \
+                        help="memory of each parser process in MB")
+    parser.add_argument("--memory-budget", type=int, \
+                        help="memory in MB for all parser processes; " \
+                             "fewer parser processes are run if needed")
+    parser.add_argument("--parse-batch", type=int, default=PARSE_BATCH_SIZE, \
+                        help="number of split files given to a parser " \
+                             "process")
+    parser.add_argument("--parser-command", default=PARSER_COMMAND, \
+                        help="parser command template; {memory} is " \
+                             "replaced by parser memory and {files} by " \
+                             "the split files, each of which must be " \
+                             "parsed into <file>.parse")
+    parser.add_argument("--no-resume", dest="resume", action="store_false", \
+                        help="parse all split files again, even those " \
+                             "recorded as parsed in the ledger")
+    parser.add_argument("--metrics", metavar="METRICS_FILE", \
+                        help="write time, counts and peak memory of each " \
+                             "stage into this JSON file ('-' for a JSON " \
+                             "line on stderr)")
+    args = parser.parse_args()
+
+    if args.metrics is not None:
+        metrics.addSink(metrics.sinkFor(args.metrics))
+
+    document_path = args.document_path
+    split_file_path = args.split_file_path
+    parser_base_path = os.path.abspath(args.parser_base_path)
 
     '''
     Create a o/p file named as "op_file". This file will contain the
@@ -157,9 +1023,9 @@ def main():
     be used here. This file op_file is referred as sentence file hereafter in
     the program.
     '''
-	op_file =  open("op_file","w")
+    op_file_path = "op_file"
 
-	'''
+    '''
     Create a directory to hold files split from sentence file and to store
     parsed files generated by Standford Parser.
 
@@ -171,158 +1037,84 @@ def main():
     
     '''
     if not os.path.exists(split_file_path):
-		os.makedirs(split_file_path)
+        os.makedirs(split_file_path)
 
 
     '''
-    Get the list of all corpus files present in document_path directory. 
-    The code to get directory listing from a directory is borrowed from
-    the link:
-	http://mail.python.org/pipermail/tutor/2004-August/031232.html
+    Get the list of all corpus files present in document_path directory,
+    by corpusFilePaths function.
     '''
+    corpus_file_paths = corpusFilePaths(document_path)
 
-	docsList=os.listdir(document_path)
-
-	loop_counter = 0
-
-	'''
-    Iterate over each corpus file to extract sentences from <P> tags
-    '''
-    for document in docsList:
-		
-		print "Processing document " +  document + "..."
-
-        '''
-        Open and read corpus file into a list doc_lines
-        '''
-		doc_handle =  open(document_path + "/" + document,'r')
-		doc_lines =  doc_handle.readlines()
-		doc_handle.close()
-
-        '''
-        Since I want to
-        retrieve the sentences of <P> tags, I need to do xml parsing of the
-        corpus file. To facilitate xml parsing, add <DUMMY> tag as root
-        of all <DOC> tags present in the corpus file. 
-        
-        This is required as there are many xml files in each corpus file with 
-        <DOC> as their root tag. Adding <DUMMY> tag will convert all those
-        many xml files as a single xml file with <DUMMY> root tag. The <DUMMY>
-        opening and closing tags will be added to doc_lines list.
-        '''
-
-		doc_lines.insert(0,"<DUMMY>")
-		doc_lines.append("</DUMMY>")
-		
-        '''
-        All corpus files have some xml character entities like &AMP; and &amp;.
-        These entities represent the word "and" (basically symbol &). These
-        entities cause problem in xml parsing as the xml parser does not 
-        recognize them. So replace these entities with word "and".
-        And write the converted contents of doc_lines into a file with same
-        name as the original corpus file.
-
-        Thus our new corpus file will have <DUMMY> tag as root and all 
-        character entities replaced with "and". 
-        '''
-        
-        doc_handle =  open(document,'w')
-		
-		for line in doc_lines:
-			
-			if "&AMP;" in line or "&amp;" in line: 
-				line = line.replace("&AMP;", "and").replace("&amp;", "and")
-
-			if "&" in line:
-				line = line.replace("&", "")
-
-			if line != "\n":
-				doc_handle.write(line)
-
-		doc_handle.close()
-
-		
-        '''
-        Next parse each corpus file using Python's xml parser provided by
-        ElementTree module. Extract all sentences present in the <P> tags.
-
-        And write them into op_file. Stop writing after extracting sentences 
-        from first 500000 <P> tags. Thus the extracted sentences from these
-        first 500000 <P> tags will act as a small subset of corpus and will
-        be used for further processing. This is required as Standford Parser
-        takes a lot of memory and time to do full parsing. And because of this,
-        we will do parsing of sentences of belonging to 
-        first 500000 <P> tags only.
-        '''
-        tree = ET.parse(document)
-		root = tree.getroot()
-
-		for child in root.iter():
-			if child.tag == "P":
-				para_text = str(child.text).rstrip()
-				op_file.write(para_text)
-				loop_counter = loop_counter + 1
-
-
-        '''
-        Stop when first 500000 <P> tag sentences are extracted. 
-        Here, our op_file has sentences from 500000 <P> tags.
-        Next split op_file into multiple files containing 10000 lines
-        of text. For splitting files, UNIX utility split will be used.
-        The total number of lines in op_file was 2,559,717 and after 
-        splitting them into files of 10000 lines, we get total 256 
-        split files.
-
-
-        This splitting is required as we can feed these split files to
-        Standford Parser in concurrent fashion. These split files will 
-        be stored in the directory specified by command line argument
-        split_file_path.
-        '''
-		if loop_counter >= 500000:
-			op_file.close()
-			os.chdir(split_file_path)
-			print "Splitting the output file ..."
-			os.system("split -l 10000 ../op_file")
-			break
-
-	
     '''
-    Get the list of all absolute path of split files from split_file_path.
+    Next parse each corpus file using Python's xml parser provided by
+    ElementTree module. Extract all sentences present in the <P> tags.
 
-    The code to get absolute paths of all files from a directory is taken
-    from an answer given by stackoverflow forum user "phihag" for a 
-    question asked on the forum. That question is present in the link:
+    Each corpus file is read and parsed as a stream by iterParagraphs
+    function. The <DUMMY> root tag and the replacement of character
+    entities, which the xml parser needs, are done on the fly by
+    SanitizedCorpusFile class, so no copy of the corpus file is
+    written and the whole file is never held in memory.
 
-    http://stackoverflow.com/questions/9816816/relative-and-absolute-
-    paths-of-all-files
+    And write them into op_file. Stop writing after extracting sentences 
+    from first 500000 <P> tags. Thus the extracted sentences from these
+    first 500000 <P> tags will act as a small subset of corpus and will
+    be used for further processing. This is required as Standford Parser
+    takes a lot of memory and time to do full parsing. And because of this,
+    we will do parsing of sentences of belonging to 
+    first 500000 <P> tags only.
 
-    Call absoluteFilePaths function to get directory listing. It takes
-    the relative path of directory for which listing is required.
+    This is done by extractSentences function. With more than one
+    worker, corpus files are extracted in parallel, each into its own
+    shard, and the shards are joined in the order of corpus files.
     '''
-    
-    file_paths = absoluteFilePaths(".")
-
+    loop_counter = extractSentences(corpus_file_paths, op_file_path, \
+                                    args.extract_workers, \
+                                    args.max_paragraphs)
 
-	os.chdir("../" + parser_base_path)
+    print "Extracted sentences of " + str(loop_counter) + " <P> tags"
 
     '''
-    Next start parsing split files using Standford parser in multithreaded
-    manner. For multithreading, Python's module threading will be used.
+    Here, our op_file has sentences from 500000 <P> tags.
+    Next split op_file into multiple files, called shards, by
+    shardSentences function. Each shard has about the same number of
+    tokens, since the time the parser takes for a shard grows with
+    the number and length of its sentences. Number of shards is given
+    by --num-shards, or else shards have about --shard-tokens tokens.
 
-    To do multithreaded call to Stanford Parser, call parseFile function.
+    This splitting is required as we can feed these split files to
+    Standford Parser in concurrent fashion. These split files will 
+    be stored in the directory specified by command line argument
+    split_file_path, together with a manifest listing them.
+    '''
+    print "Splitting the output file ..."
+    file_paths = shardSentences(op_file_path, split_file_path, \
+                                args.num_shards, args.shard_tokens)
 
-    It takes the name of split file (which we need to parse) as input.
+    '''
+    Next parse all split files using Standford parser. This is done by
+    parseSplitFiles function, which runs a bounded pool of parser workers
+    fed with the split files from a queue. Each worker parses a batch of
+    split files with one parser process, so the parser model is loaded
+    once per batch. The number of workers is set by --parse-workers and
+    is lowered to fit --memory-budget.
 
     The parsed output of each split file will be store in split_file_path
-    directory only with the extension as ".parse".
+    directory only with the extension as ".parse". Parsed split files
+    are recorded in a ledger in the same directory, so when this program
+    is run again after it was stopped, only the split files which were
+    not parsed yet are parsed, unless --no-resume is given.
     '''
+    failed_files = parseSplitFiles(file_paths, parser_base_path, \
+                                   args.parse_workers, args.parser_memory, \
+                                   args.memory_budget, args.parse_batch, \
+                                   args.parser_command, args.resume)
+
+    metrics.emit()
 
-	for i in range(0,10):
-		t = threading.Thread(target=parseFile, args=[file_paths[i]])
-		t.start()
-		 
-	op_file.close()
+    if failed_files:
+        print "Split files not parsed: " + " ".join(failed_files)
+        sys.exit(1)
 
 ###############################################################################
 # End of main function
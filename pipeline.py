@@ -0,0 +1,261 @@
+##############################################################################
+# Algorithm     :   This module runs the programs of this project as a chain
+#                   of stages, like a small make. main_program.py uses it to
+#                   run extraction of sentences, sharding, parsing, counting,
+#                   building of the model and queries.
+#
+#                   Steps followed for each stage are:
+#
+#                   1) Input and output files of the stage are found. They
+#                      can depend on the outputs of earlier stages, e.g. the
+#                      parse stage parses the shards listed by the shard
+#                      stage, so they are found only when the stage is
+#                      reached.
+#
+#                   2) Stage is skipped if all its outputs exist, it was run
+#                      before with the same parameters, and either its
+#                      outputs are newer than its inputs, which are the same
+#                      files as in its last run, or the content of its
+#                      inputs is the same as in its last run.
+#
+#                   3) Otherwise the stage is run and the parameters, the
+#                      paths and the content hash of its inputs are kept in
+#                      a state file, to be compared on the next run.
+#
+#                   Content hash of each file is cached in the state file by
+#                   its size and modification time, so a file is read again
+#                   for hashing only when it changed.
+##############################################################################
+
+#!/usr/bin/python
+
+'''
+import statements to include Python's in-built module functionalities in the
+program
+'''
+# os module is used to access file manipulation features
+import os
+
+# json module is used to write and read the state file
+import json
+
+# hashlib module is used for content hashes of input files
+import hashlib
+
+# time module for time related functionality
+import time
+
+# metrics module records the time of each stage
+import metrics
+
+'''
+Number of bytes read at a time while hashing a file
+'''
+HASH_CHUNK_SIZE = 1024 * 1024
+
+###############################################################################
+# Class         : Stage
+# Description   : A stage of the pipeline.
+#
+#                 Attributes:
+#                 name    - name of the stage
+#                 run     - function running the stage, called without
+#                           arguments
+#                 inputs  - list of input file paths, or a function giving
+#                           it when the stage is reached
+#                 outputs - list of output file paths, or a function giving
+#                           it when the stage is reached
+#                 params  - dict of parameters of the stage. Stage is run
+#                           again when they change. Values must be JSON
+#                           serializable.
+###############################################################################
+class Stage(object):
+
+    def __init__(self, name, run, inputs=(), outputs=(), params=None):
+        self.name = name
+        self.run = run
+        self.inputs = inputs
+        self.outputs = outputs
+        self.params = params if params is not None else {}
+
+    ###########################################################################
+    # Method        : inputPaths(), outputPaths()
+    # Description   : Sorted lists of input and output file paths
+    ###########################################################################
+    def inputPaths(self):
+        return sorted(_resolve(self.inputs))
+
+    def outputPaths(self):
+        return sorted(_resolve(self.outputs))
+
+###############################################################################
+# End of Stage class
+###############################################################################
+
+###############################################################################
+# Class         : Pipeline
+# Description   : Runs stages in order, skipping the ones which are up to
+#                 date. State of the last run of each stage is kept in a
+#                 JSON file.
+###############################################################################
+class Pipeline(object):
+
+    def __init__(self, state_path):
+        self.state_path = state_path
+        self.state = {"stages": {}, "file_hashes": {}}
+
+        if os.path.exists(state_path):
+            state_handle = open(state_path, 'r')
+            self.state = json.load(state_handle)
+            state_handle.close()
+
+    ###########################################################################
+    # Method        : run(stages, force)
+    # Description   : Runs the stages in order. Stages whose names are in
+    #                 force are run even if they are up to date. A stage
+    #                 after a stage which was run is checked against the new
+    #                 outputs, so it is run again only if they changed.
+    # Returns       : list of names of the stages which were run
+    ###########################################################################
+    def run(self, stages, force=()):
+
+        ran_stages = []
+
+        for stage in stages:
+
+            if stage.name not in force and self.isUpToDate(stage):
+                print "Stage " + stage.name + " is up to date, skipping"
+                metrics.count("pipeline.skipped_stages")
+                continue
+
+            print "Running stage " + stage.name + " ..."
+            start_time = time.time()
+            with metrics.timer("pipeline." + stage.name):
+                stage.run()
+
+            missing = [path for path in stage.outputPaths() \
+                       if not os.path.exists(path)]
+            if missing:
+                raise RuntimeError("stage " + stage.name + " did not " \
+                                   "write " + ", ".join(missing))
+
+            self.state["stages"][stage.name] = \
+                {"params": _jsonValue(stage.params), \
+                 "input_paths": stage.inputPaths(), \
+                 "inputs_hash": self.inputsHash(stage)}
+            self._save()
+
+            print "Finished stage %s in %.1f s" % (stage.name, \
+                                                   time.time() - start_time)
+            ran_stages.append(stage.name)
+
+        return ran_stages
+
+    ###########################################################################
+    # Method        : isUpToDate(stage)
+    # Description   : Tells if a stage can be skipped (see step 2 of the
+    #                 module description)
+    ###########################################################################
+    def isUpToDate(self, stage):
+
+        last_run = self.state["stages"].get(stage.name)
+        if last_run is None or last_run["params"] != _jsonValue(stage.params):
+            return False
+
+        output_paths = stage.outputPaths()
+        if not all(os.path.exists(path) for path in output_paths):
+            return False
+
+        input_paths = stage.inputPaths()
+        if not all(os.path.exists(path) for path in input_paths):
+            return False
+
+        '''
+        Outputs newer than the inputs tell nothing when an input was
+        removed, or added with an old modification time, so the content
+        hash is compared then.
+        '''
+        if input_paths and output_paths and \
+           last_run.get("input_paths") == input_paths:
+            newest_input = max(os.path.getmtime(path) for path in input_paths)
+            oldest_output = min(os.path.getmtime(path) for path in \
+                                output_paths)
+            if oldest_output >= newest_input:
+                return True
+
+        return last_run["inputs_hash"] == self.inputsHash(stage)
+
+    ###########################################################################
+    # Method        : inputsHash(stage)
+    # Description   : Content hash of all input files of a stage, with their
+    #                 paths
+    ###########################################################################
+    def inputsHash(self, stage):
+
+        inputs_hash = hashlib.md5()
+        for path in stage.inputPaths():
+            inputs_hash.update(path + "\0" + self.fileHash(path) + "\0")
+        return inputs_hash.hexdigest()
+
+    ###########################################################################
+    # Method        : fileHash(path)
+    # Description   : Content hash of a file, cached by its size and
+    #                 modification time
+    ###########################################################################
+    def fileHash(self, path):
+
+        file_stat = os.stat(path)
+        signature = [file_stat.st_size, file_stat.st_mtime]
+
+        cached = self.state["file_hashes"].get(path)
+        if cached is not None and cached["signature"] == signature:
+            return cached["hash"]
+
+        file_hash = hashlib.md5()
+        file_handle = open(path, 'rb')
+        try:
+            while True:
+                data = file_handle.read(HASH_CHUNK_SIZE)
+                if not data:
+                    break
+                file_hash.update(data)
+        finally:
+            file_handle.close()
+
+        self.state["file_hashes"][path] = {"signature": signature, \
+                                           "hash": file_hash.hexdigest()}
+        return file_hash.hexdigest()
+
+    ###########################################################################
+    # Method        : _save()
+    # Description   : Writes the state file with a temporary name and renames
+    #                 it, so a stopped run never leaves it half written.
+    ###########################################################################
+    def _save(self):
+        temp_path = self.state_path + ".tmp"
+        state_handle = open(temp_path, 'w')
+        json.dump(self.state, state_handle, indent=1, sort_keys=True)
+        state_handle.close()
+        os.rename(temp_path, self.state_path)
+
+###############################################################################
+# End of Pipeline class
+###############################################################################
+
+###############################################################################
+# Function      : _resolve(paths), _jsonValue(value)
+# Description   : List of paths given as a list or by a function, and value
+#                 as it is read back from the JSON state file, for
+#                 comparing parameters.
+###############################################################################
+def _resolve(paths):
+    if callable(paths):
+        paths = paths()
+    return [os.path.abspath(path) for path in paths]
+
+def _jsonValue(value):
+    return json.loads(json.dumps(value))
+
+##############################################################################
+# End of pipeline.py module
+#############################################################################
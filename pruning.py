@@ -0,0 +1,314 @@
+##############################################################################
+# Algorithm     :   This module prunes the co-occurrence vectors (CV) while
+#                   the model is built, dropping words and features which
+#                   take memory and query time but hardly change which words
+#                   are found similar.
+#
+#                   Steps followed in this module are:
+#
+#                   1) Before probabilities are calculated, cells of the CV
+#                      are dropped if
+#
+#                      - the word of the row, or the word of the feature,
+#                        occurs fewer than min_word_freq times in the
+#                        sentence file (e.g. hapaxes),
+#                      - the feature (rel, word) occurs fewer than
+#                        min_feature_freq times in all relations, or
+#                      - the relation of the feature is one of the excluded
+#                        relations (e.g. det and aux, whose features are
+#                        mostly determiners and auxiliary verbs).
+#
+#                      Words and features left without any cell are dropped
+#                      too. P(w), P(f) and P(f,w) are then calculated from
+#                      what is left, as if the dropped cells were never
+#                      counted.
+#
+#                   2) After the association is calculated, only the
+#                      max_features cells of each word with the highest
+#                      association values are kept. Their association
+#                      values are not changed.
+#
+#                   3) If asked, a report compares the pruned model with the
+#                      unpruned model built from the same counts: how much
+#                      the rows, features, cells and bytes shrank, and how
+#                      many of the top k similar words of a sample of words
+#                      are still found by the pruned model.
+##############################################################################
+
+#!/usr/bin/python
+
+'''
+import statements to include Python's in-built module functionalities in the
+program
+'''
+# random module draws the sample of words of the report
+import random
+
+# heapq module picks the features with the highest association values
+import heapq
+
+# similarity module finds the similar words compared by the report
+from similarity import mostSimilar
+
+# measures module names the similarity measure of the report
+from measures import DEFAULT_SIMILARITY
+
+# model_file module tells which arrays make up a saved model
+from model_file import MATRIX_ARRAYS
+
+# metrics module counts the dropped cells
+import metrics
+
+'''
+Number of words, besides the target words, whose similar words are compared
+by the report
+'''
+REPORT_SAMPLE_SIZE = 200
+
+###############################################################################
+# Class         : Pruning
+# Description   : Settings of the pruning of a model (see the description of
+#                 this module). Default settings prune nothing.
+#
+#                 Attributes:
+#                 min_word_freq      - least corpus freq of the words of rows
+#                                      and features
+#                 min_feature_freq   - least freq of a feature
+#                 max_features       - most features kept for each word, or
+#                                      None for all
+#                 excluded_relations - relations whose features are dropped
+###############################################################################
+class Pruning(object):
+
+    def __init__(self, min_word_freq=0, min_feature_freq=0, \
+                 max_features=None, excluded_relations=()):
+        self.min_word_freq = min_word_freq
+        self.min_feature_freq = min_feature_freq
+        self.max_features = max_features
+        self.excluded_relations = frozenset(excluded_relations)
+
+    ###########################################################################
+    # Method        : isActive()
+    # Description   : Tells if these settings prune anything at all
+    ###########################################################################
+    def isActive(self):
+        return self.min_word_freq > 0 or self.min_feature_freq > 0 or \
+               self.max_features is not None or bool(self.excluded_relations)
+
+    ###########################################################################
+    # Method        : settings()
+    # Description   : Settings as a dict which can be written in JSON format,
+    #                 e.g. as parameters of a pipeline stage
+    ###########################################################################
+    def settings(self):
+        return {"min_word_freq": self.min_word_freq, \
+                "min_feature_freq": self.min_feature_freq, \
+                "max_features": self.max_features, \
+                "excluded_relations": sorted(self.excluded_relations)}
+
+    ###########################################################################
+    # Method        : pruneCounts(cv_matrix, word_frq_dict)
+    # Description   : Step 1 of the module description. Must be called before
+    #                 probabilities of cv_matrix are calculated.
+    # Arguments     : cv_matrix     - CoOccurrenceMatrix built from relation
+    #                                 counts
+    #                 word_frq_dict - dict of corpus freq of words
+    # Returns       : pruned CoOccurrenceMatrix, or cv_matrix itself when
+    #                 nothing is dropped
+    ###########################################################################
+    def pruneCounts(self, cv_matrix, word_frq_dict):
+
+        min_word_freq = self.min_word_freq
+
+        keep_rows = [word_frq_dict.get(word, 0) >= min_word_freq \
+                     for word in cv_matrix.words]
+        keep_cols = [word_frq_dict.get(word, 0) >= min_word_freq and \
+                     feature_freq >= self.min_feature_freq and \
+                     relation not in self.excluded_relations \
+                     for (relation, word), feature_freq in \
+                     zip(cv_matrix.features, cv_matrix.feature_freq)]
+
+        indptr = cv_matrix.indptr
+        indices = cv_matrix.indices
+
+        keep_cells = bytearray(cv_matrix.numCells())
+        for row_id in xrange(cv_matrix.numRows()):
+            if keep_rows[row_id]:
+                for position in xrange(indptr[row_id], indptr[row_id + 1]):
+                    keep_cells[position] = keep_cols[indices[position]]
+
+        return _subMatrix(cv_matrix, keep_cells)
+
+    ###########################################################################
+    # Method        : pruneFeatures(cv_matrix)
+    # Description   : Step 2 of the module description. Must be called after
+    #                 association of cv_matrix is calculated.
+    # Arguments     : cv_matrix - CoOccurrenceMatrix with association
+    #                             computed
+    # Returns       : pruned CoOccurrenceMatrix, or cv_matrix itself when
+    #                 nothing is dropped
+    ###########################################################################
+    def pruneFeatures(self, cv_matrix):
+
+        if self.max_features is None:
+            return cv_matrix
+
+        indptr = cv_matrix.indptr
+        assoc = cv_matrix.assoc
+
+        keep_cells = bytearray(cv_matrix.numCells())
+        for row_id in xrange(cv_matrix.numRows()):
+            positions = xrange(indptr[row_id], indptr[row_id + 1])
+            if len(positions) > self.max_features:
+                positions = heapq.nlargest(self.max_features, positions, \
+                                           key=assoc.__getitem__)
+            for position in positions:
+                keep_cells[position] = 1
+
+        return _subMatrix(cv_matrix, keep_cells)
+
+###############################################################################
+# End of Pruning class
+###############################################################################
+
+###############################################################################
+# Function      : _subMatrix(cv_matrix, keep_cells)
+# Description   : Keeps the marked cells of cv_matrix, counting the dropped
+#                 ones. cv_matrix itself is returned when all are kept.
+###############################################################################
+def _subMatrix(cv_matrix, keep_cells):
+
+    dropped_cells = len(keep_cells) - sum(keep_cells)
+    if dropped_cells == 0:
+        return cv_matrix
+
+    metrics.count("prune.dropped_cells", dropped_cells)
+    return cv_matrix.subMatrix(keep_cells)
+
+###############################################################################
+# Function      : modelSize(cv_matrix)
+# Description   : Shape of cv_matrix and the number of bytes of the arrays
+#                 and strings written into a model file for it
+# Returns       : dict with rows, features, cells and bytes
+###############################################################################
+def modelSize(cv_matrix):
+
+    model_bytes = 0
+    for name in MATRIX_ARRAYS:
+        values = getattr(cv_matrix, name)
+        if values is not None:
+            model_bytes += len(values) * values.itemsize
+
+    model_bytes += sum(len(word) for word in cv_matrix.words)
+    model_bytes += sum(len(relation) + len(word) + 1 for relation, word in \
+                       cv_matrix.features)
+
+    return {"rows": cv_matrix.numRows(), \
+            "features": cv_matrix.numFeatures(), \
+            "cells": cv_matrix.numCells(), \
+            "bytes": model_bytes}
+
+###############################################################################
+# Function      : pruneReport(full_matrix, pruned_matrix, pruning,
+#                             target_words_list, num_of_sim_words, seed,
+#                             measure)
+# Description   : Step 3 of the module description. The similar words of the
+#                 target words and of a random sample of other words of the
+#                 pruned model are found in both models. Overlap of a word is
+#                 the part of its top num_of_sim_words words in the unpruned
+#                 model (the word itself left out) which are also in its top
+#                 num_of_sim_words words in the pruned model.
+# Arguments     : full_matrix       - CoOccurrenceMatrix built without
+#                                     pruning
+#                 pruned_matrix     - CoOccurrenceMatrix built with pruning
+#                 pruning           - Pruning object used for pruned_matrix
+#                 target_words_list - list of target words
+#                 num_of_sim_words  - number of similar words compared
+#                 seed              - seed of the random sample of words
+#                 measure           - name of the similarity measure
+# Returns       : dict with the report, which can be written in JSON format
+###############################################################################
+def pruneReport(full_matrix, pruned_matrix, pruning, target_words_list, \
+                num_of_sim_words, seed=1, measure=DEFAULT_SIMILARITY):
+
+    full_size = modelSize(full_matrix)
+    pruned_size = modelSize(pruned_matrix)
+
+    kept = {}
+    for key in full_size:
+        if full_size[key]:
+            kept[key] = round(float(pruned_size[key]) / full_size[key], 6)
+
+    '''
+    Target words come first, then words of the pruned model drawn at
+    random, so the sample is the same for the same model and seed.
+    '''
+    sample_words = []
+    seen_words = set()
+    for word in target_words_list:
+        if word not in seen_words and full_matrix.rowOf(word) is not None:
+            sample_words.append(word)
+            seen_words.add(word)
+
+    other_words = [word for word in pruned_matrix.words \
+                   if word not in seen_words]
+    random.Random(seed).shuffle(other_words)
+    sample_words.extend(other_words[:REPORT_SAMPLE_SIZE])
+
+    overlaps = []
+    unchanged_lists = 0
+    dropped_words = []
+    target_overlaps = {}
+
+    for word in sample_words:
+        full_words = _similarWords(full_matrix, word, num_of_sim_words, \
+                                   measure)
+
+        if pruned_matrix.rowOf(word) is None:
+            dropped_words.append(word)
+            overlap = 0.0
+        else:
+            pruned_words = _similarWords(pruned_matrix, word, \
+                                         num_of_sim_words, measure)
+            if pruned_words == full_words:
+                unchanged_lists += 1
+            if full_words:
+                overlap = float(len(set(full_words) & set(pruned_words))) / \
+                          len(full_words)
+            else:
+                overlap = 1.0
+
+        overlaps.append(overlap)
+        if word in target_words_list:
+            target_overlaps[word] = round(overlap, 6)
+
+    neighbors = {"k": num_of_sim_words, \
+                 "measure": measure, \
+                 "words": len(sample_words), \
+                 "dropped_words": len(dropped_words), \
+                 "unchanged_lists": unchanged_lists, \
+                 "target_overlap": target_overlaps}
+    if overlaps:
+        neighbors["mean_overlap"] = round(sum(overlaps) / len(overlaps), 6)
+        neighbors["min_overlap"] = round(min(overlaps), 6)
+
+    return {"pruning": pruning.settings(), \
+            "unpruned": full_size, \
+            "pruned": pruned_size, \
+            "kept": kept, \
+            "neighbors": neighbors}
+
+###############################################################################
+# Function      : _similarWords(cv_matrix, word, num_of_sim_words, measure)
+# Description   : Top num_of_sim_words words similar to word, in order of
+#                 score, leaving out the word itself and words with score 0
+###############################################################################
+def _similarWords(cv_matrix, word, num_of_sim_words, measure):
+    word_sim = mostSimilar(cv_matrix, cv_matrix.rowOf(word), \
+                           num_of_sim_words + 1, measure)
+    return [sim_word for sim_word, score in word_sim \
+            if sim_word != word and score > 0][:num_of_sim_words]
+
+##############################################################################
+# End of pruning.py module
+#############################################################################
@@ -0,0 +1,421 @@
+##############################################################################
+# Algorithm     :   This program is a long running query server for word
+#                   similarity. It loads a model file, written earlier by
+#                   word_sim.py with --save-model option, only once and then
+#                   answers similarity queries over HTTP.
+#
+#                   Steps followed in this program are:
+#
+#                   1) Model file is memory mapped by loadModel function of
+#                      model_file.py module.
+#
+#                   2) A threaded HTTP server is started on a TCP port or on
+#                      a Unix socket. Each request is answered on its own
+#                      thread, so requests are served concurrently.
+#
+#                   3) Following requests are supported. All answers are in
+#                      JSON format and have the time taken to answer the
+#                      request in "timing_ms" key. The same time is sent in
+#                      X-Elapsed-Ms header and logged on stderr.
+#
+#                      GET /similar?word=<word>&k=<number>
+#                          top k words similar to the word
+#                          e.g. {"word": "hamburger", "frequency": 95,
+#                                "neighbors": [["hamburger", 1.0],
+#                                              ["metropolitan", 0.0814]],
+#                                "timing_ms": 0.52}
+#
+#                          With an LSH index given by --lsh-index, similar
+#                          words are found through the index (see
+#                          lsh_index.py module), unless exact=1 is part of
+#                          the request; "approximate" key of the answer tells
+#                          which was used.
+#
+#                          With a table of the top similar words of all
+#                          words given by --neighbors-table, the similar words
+#                          are read from the table when it has at least k
+#                          words of the measure asked for (see
+#                          neighbor_table.py module); "precomputed" key of the
+#                          answer tells if it was used. Scores are exact
+#                          either way.
+#
+#                      GET /similarity?word1=<word>&word2=<word>
+#                          Jaccard's similarity score of two words
+#                          e.g. {"word1": "car", "word2": "truck",
+#                                "score": 0.12, "timing_ms": 0.08}
+#
+#                      Both requests take measure=<name> to compare the
+#                      words with Dice's or cosine measure instead of
+#                      Jaccard's (see measures.py module), e.g.
+#                      GET /similar?word=car&k=10&measure=cosine
+#
+#                   Usage           : python sim_server.py <model_file>
+#                                     [--host HOST] [--port PORT]
+#                                     [--unix-socket PATH]
+#                                     [--lsh-index INDEX_FILE]
+#                                     [--neighbors-table TABLE_FILE]
+##############################################################################
+
+#!/usr/bin/python
+
+'''
+import statements to include Python's in-built module functionalities in the
+program
+'''
+# sys module is used to access command line argument, exit function etc.
+import sys
+
+# os module is used to access file manipulation features
+import os
+
+# argparse module is used to read the command line arguments
+import argparse
+
+# json module is used to write answers in JSON format
+import json
+
+# time module for time related functionality
+import time
+
+# urlparse module is used to read the path and query of requests
+import urlparse
+
+# BaseHTTPServer and SocketServer modules provide the threaded HTTP server
+import BaseHTTPServer
+import SocketServer
+
+# model_file module memory maps the model built by word_sim.py
+from model_file import loadModel
+
+# similarity module finds the words most similar to target words
+from similarity import mostSimilar, pairSimilarity
+
+# lsh_index module memory maps the LSH index of the model
+from lsh_index import loadIndex
+
+# neighbor_table module memory maps the table of similar words of the model
+from neighbor_table import loadTable
+
+# measures module has the similarity measures
+from measures import SIMILARITY_MEASURES, DEFAULT_SIMILARITY
+
+'''
+Number of similar words given when k is not part of the request
+'''
+DEFAULT_NUM_OF_SIM_WORDS = 20
+
+###############################################################################
+# Class         : QueryError
+# Description   : Raised by request handlers with the HTTP status code and
+#                 message of a failed request.
+###############################################################################
+class QueryError(Exception):
+
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+###############################################################################
+# Function      : similarQuery(cv_matrix, params, lsh_index, neighbor_table)
+# Description   : Answers /similar request.
+# Arguments     : cv_matrix      - loaded model
+#                 params         - dict of query parameters of the request
+#                 lsh_index      - loaded LSH index of the model, or None
+#                 neighbor_table - loaded neighbor table of the model, or
+#                                  None
+# Returns       : dict with the answer
+###############################################################################
+def similarQuery(cv_matrix, params, lsh_index=None, neighbor_table=None):
+
+    word = _wordParameter(params, "word")
+    num_of_sim_words = _numberParameter(params, "k", \
+                                        DEFAULT_NUM_OF_SIM_WORDS)
+    exact = _numberParameter(params, "exact", 0)
+    measure = _measureParameter(params)
+
+    target_row = _rowOfWord(cv_matrix, word)
+
+    precomputed = neighbor_table is not None and \
+                  neighbor_table.covers(num_of_sim_words, measure)
+    approximate = lsh_index is not None and not exact and not precomputed
+    if precomputed:
+        neighbors = neighbor_table.mostSimilar(cv_matrix, target_row, \
+                                               num_of_sim_words, measure)
+    elif approximate:
+        neighbors = lsh_index.mostSimilar(cv_matrix, target_row, \
+                                          num_of_sim_words, None, measure)
+    else:
+        neighbors = mostSimilar(cv_matrix, target_row, num_of_sim_words, \
+                                measure)
+
+    return {"word": word, \
+            "frequency": cv_matrix.word_freq[target_row], \
+            "neighbors": neighbors, \
+            "measure": measure, \
+            "approximate": approximate, \
+            "precomputed": precomputed}
+
+###############################################################################
+# Function      : similarityQuery(cv_matrix, params, lsh_index,
+#                                 neighbor_table)
+# Description   : Answers /similarity request.
+# Arguments     : cv_matrix      - loaded model
+#                 params         - dict of query parameters of the request
+#                 lsh_index,
+#                 neighbor_table - not used, the score is always computed
+# Returns       : dict with the answer
+###############################################################################
+def similarityQuery(cv_matrix, params, lsh_index=None, neighbor_table=None):
+
+    word_1 = _wordParameter(params, "word1")
+    word_2 = _wordParameter(params, "word2")
+    measure = _measureParameter(params)
+
+    return {"word1": word_1, \
+            "word2": word_2, \
+            "measure": measure, \
+            "score": pairSimilarity(cv_matrix, \
+                                    _rowOfWord(cv_matrix, word_1), \
+                                    _rowOfWord(cv_matrix, word_2), \
+                                    measure)}
+
+'''
+Handlers of the supported request paths
+'''
+QUERY_HANDLERS = {"/similar": similarQuery, \
+                  "/similarity": similarityQuery}
+
+###############################################################################
+# Class         : SimilarityRequestHandler
+# Description   : Handles one HTTP request by calling the query handler of
+#                 its path with the model of the server.
+###############################################################################
+class SimilarityRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+
+        start_time = time.time()
+
+        url = urlparse.urlparse(self.path)
+        params = dict((key, values[0]) for key, values in \
+                      urlparse.parse_qs(url.query).iteritems())
+
+        handler = QUERY_HANDLERS.get(url.path)
+
+        try:
+            if handler is None:
+                raise QueryError(404, "unknown request path " + url.path)
+            status = 200
+            answer = handler(self.server.cv_matrix, params, \
+                             self.server.lsh_index, \
+                             self.server.neighbor_table)
+        except QueryError, error:
+            status = error.status
+            answer = {"error": str(error)}
+
+        elapsed_ms = (time.time() - start_time) * 1000
+        answer["timing_ms"] = round(elapsed_ms, 3)
+
+        body = json.dumps(answer)
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Elapsed-Ms", "%.3f" % elapsed_ms)
+        self.end_headers()
+        self.wfile.write(body)
+
+        self.log_message('"%s" %d %.3f ms', self.path, status, elapsed_ms)
+
+    ###########################################################################
+    # Method        : log_request(code, size)
+    # Description   : Default request log line is replaced by the one with
+    #                 the timing, written at the end of do_GET.
+    ###########################################################################
+    def log_request(self, code='-', size='-'):
+        pass
+
+    ###########################################################################
+    # Method        : log_message(format, *args)
+    # Description   : Writes a log line on stderr. Unix socket clients have no
+    #                 host address, so they are logged as "unix".
+    ###########################################################################
+    def log_message(self, format, *args):
+        if isinstance(self.client_address, tuple):
+            client = self.client_address[0]
+        else:
+            client = "unix"
+        sys.stderr.write("%s - - [%s] %s\n" % (client, \
+                                               self.log_date_time_string(), \
+                                               format % args))
+
+###############################################################################
+# End of SimilarityRequestHandler class
+###############################################################################
+
+###############################################################################
+# Class         : ThreadedHTTPServer, ThreadedUnixHTTPServer
+# Description   : HTTP servers answering each request on its own thread, on a
+#                 TCP port or on a Unix socket. Model, its LSH index and
+#                 its neighbor table are shared by all threads through
+#                 cv_matrix, lsh_index and neighbor_table attributes.
+###############################################################################
+class ThreadedHTTPServer(SocketServer.ThreadingMixIn, \
+                         BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class ThreadedUnixHTTPServer(SocketServer.ThreadingMixIn, \
+                             SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+###############################################################################
+# Function      : makeServer(cv_matrix, host, port, unix_socket, lsh_index,
+#                            neighbor_table)
+# Description   : Creates the query server for a loaded model.
+# Arguments     : cv_matrix      - loaded model
+#                 host, port     - TCP address to listen on
+#                 unix_socket    - path of Unix socket to listen on instead
+#                                  of TCP address, if it is given
+#                 lsh_index      - loaded LSH index of the model, or None
+#                 neighbor_table - loaded neighbor table of the model, or
+#                                  None
+# Returns       : server object
+###############################################################################
+def makeServer(cv_matrix, host, port, unix_socket=None, lsh_index=None, \
+               neighbor_table=None):
+
+    if unix_socket is not None:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = ThreadedUnixHTTPServer(unix_socket, SimilarityRequestHandler)
+    else:
+        server = ThreadedHTTPServer((host, port), SimilarityRequestHandler)
+
+    server.cv_matrix = cv_matrix
+    server.lsh_index = lsh_index
+    server.neighbor_table = neighbor_table
+    return server
+
+###############################################################################
+# Function      : _wordParameter(params, name), _numberParameter(params, name,
+#                 default), _measureParameter(params), _rowOfWord(cv_matrix,
+#                 word)
+# Description   : Read the parameters of a request and look up its words,
+#                 raising QueryError for bad requests and unknown words.
+###############################################################################
+def _wordParameter(params, name):
+    word = params.get(name)
+    if not word:
+        raise QueryError(400, "missing parameter " + name)
+    return word.lower()
+
+def _numberParameter(params, name, default):
+    if name not in params:
+        return default
+    try:
+        number = int(params[name])
+    except ValueError:
+        raise QueryError(400, "parameter " + name + " must be a number")
+    if number < 0:
+        raise QueryError(400, "parameter " + name + " must not be negative")
+    return number
+
+def _measureParameter(params):
+    measure = params.get("measure", DEFAULT_SIMILARITY)
+    if measure not in SIMILARITY_MEASURES:
+        raise QueryError(400, "unknown measure " + measure + ", use one " \
+                         "of " + ", ".join(sorted(SIMILARITY_MEASURES)))
+    return measure
+
+def _rowOfWord(cv_matrix, word):
+    row_id = cv_matrix.rowOf(word)
+    if row_id is None:
+        raise QueryError(404, "word " + word + " has no CV in the model")
+    return row_id
+
+###############################################################################
+# Function      : main()
+# Description   : Entry point for the program.
+# Arguments     : None. Command Line Arguments in Python are retrieved from
+#                 sys.argv variable of sys module.
+# Returns       : None.
+###############################################################################
+def main():
+
+    parser = argparse.ArgumentParser(description="Serve word similarity " \
+                                     "queries from a model file.")
+    parser.add_argument("model_file", \
+                        help="model file written by word_sim.py " \
+                             "--save-model")
+    parser.add_argument("--host", default="127.0.0.1", \
+                        help="address to listen on")
+    parser.add_argument("--port", type=int, default=8080, \
+                        help="TCP port to listen on")
+    parser.add_argument("--unix-socket", \
+                        help="listen on this Unix socket instead of TCP port")
+    parser.add_argument("--lsh-index", metavar="INDEX_FILE", \
+                        help="answer /similar requests through this LSH " \
+                             "index, written by word_sim.py --approximate " \
+                             "--lsh-index for the same model")
+    parser.add_argument("--neighbors-table", metavar="TABLE_FILE", \
+                        help="answer /similar requests from this table of " \
+                             "the top similar words of all words, written " \
+                             "by neighbor_table.py for the same model")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    cv_matrix = loadModel(args.model_file)
+    sys.stderr.write("Loaded model %s with %d words in %.3f ms\n" % \
+                     (args.model_file, cv_matrix.numRows(), \
+                      (time.time() - start_time) * 1000))
+
+    lsh_index = None
+    if args.lsh_index is not None:
+        try:
+            lsh_index = loadIndex(args.lsh_index)
+            lsh_index.checkMatrix(cv_matrix)
+        except ValueError, error:
+            sys.exit("Error: " + str(error))
+
+    neighbor_table = None
+    if args.neighbors_table is not None:
+        neighbor_table = loadTable(args.neighbors_table)
+        try:
+            neighbor_table.checkMatrix(cv_matrix)
+        except ValueError, error:
+            sys.exit("Error: " + str(error))
+
+    server = makeServer(cv_matrix, args.host, args.port, args.unix_socket, \
+                        lsh_index, neighbor_table)
+    sys.stderr.write("Serving on %s ...\n" % \
+                     (args.unix_socket or "%s:%d" % (args.host, args.port)))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if lsh_index is not None:
+            lsh_index.close()
+        if neighbor_table is not None:
+            neighbor_table.close()
+        cv_matrix.close()
+
+###############################################################################
+# End of main function
+###############################################################################
+
+'''
+Boilerplate syntax to specify that main() method is the entry point for
+this program.
+'''
+
+if __name__ == '__main__':
+
+    main()
+
+##############################################################################
+# End of sim_server.py program
+#############################################################################
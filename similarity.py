@@ -0,0 +1,425 @@
+##############################################################################
+# Algorithm     :   This module finds Jaccard's similarity scores of a target
+#                   word against all words of the co-occurrence matrix built
+#                   by cv_matrix.py module.
+#
+#                   Jaccard's measure (section 20.7.3 of JM text) for the
+#                   association vectors t and c of two words is:
+#
+#                       sum over f of min(t_f, c_f)
+#                       ----------------------------
+#                       sum over f of max(t_f, c_f)
+#
+#                   where f runs over the features of both words and a
+#                   missing feature has association 0.
+#
+#                   Steps followed in this module are:
+#
+#                   1) Since max(a,b) = a + b - min(a,b), the sum of max is
+#                      sum(t) + sum(c) - sum of min. So only sum of min is
+#                      needed for each pair of words.
+#
+#                   2) A feature present in only one of the words adds
+#                      min(value, 0) to sum of min. So sum of min is
+#
+#                      neg(t) + neg(c) + sum over shared f of
+#                                  (min(t_f,c_f) - min(t_f,0) - min(c_f,0))
+#
+#                      where neg(x) is the sum of negative values of x.
+#                      sum(x) and neg(x) of every row are kept in the
+#                      matrix, so only the shared features of two words have
+#                      to be visited.
+#
+#                   3) Shared part of every word is accumulated in a single
+#                      pass over the non-zero cells of the matrix.
+#
+#                   4) A word sharing no feature with the target has shared
+#                      part 0, so its sum of min is neg(t) + neg(c) <= 0 and
+#                      its score is never above 0. For ranking only the
+#                      candidates sharing some feature with the target are
+#                      scored, by walking the inverted index of the matrix
+#                      for the features of the target. The other words are
+#                      looked at only when too few candidates score above 0.
+#
+#                   5) For the top N words, candidates are scored in
+#                      decreasing order of an upper bound of their score,
+#                      keeping the best N in a heap, until no remaining
+#                      candidate can beat the N-th best score.
+#
+#                   6) Many target words are scored in blocks. The inverted
+#                      index entry of a feature is read once per block for
+#                      all targets of the block having that feature.
+#
+#                   Dice's and cosine measures (see measures.py module) are
+#                   found the same way, with their own shared part of a
+#                   feature, score and bound. The measure is chosen by name
+#                   for each query; Jaccard's measure is the default.
+##############################################################################
+
+#!/usr/bin/python
+
+'''
+import statements to include Python's in-built module functionalities in the
+program
+'''
+# array module is used for compact arrays of C doubles
+import array
+
+# heapq module is used to keep the best scores in a bounded heap
+import heapq
+
+# metrics module counts the queries and the candidates they score
+import metrics
+
+# measures module has the similarity measures
+from measures import similarityMeasure, jaccard, \
+                     DEFAULT_SIMILARITY
+
+'''
+Number of target words scored together by batchMostSimilar.
+'''
+DEFAULT_BLOCK_SIZE = 256
+
+###############################################################################
+# Function      : jaccardScores(cv_matrix, target_row)
+# Description   : Calculates Jaccard's similarity score of the target word
+#                 against every word of cv_matrix.
+# Arguments     : cv_matrix  - CoOccurrenceMatrix with association computed
+#                 target_row - row id of the target word
+# Returns       : array of scores indexed by row id
+###############################################################################
+def jaccardScores(cv_matrix, target_row):
+
+    target_features = dict(zip(*cv_matrix.row(target_row)))
+
+    '''
+    Accumulate the shared part of sum of min of every word by walking
+    all non-zero cells once.
+    '''
+    shared_min = array.array('d', [0.0]) * cv_matrix.numRows()
+
+    for row_id in xrange(cv_matrix.numRows()):
+        shared_min[row_id] = rowSharedMin(cv_matrix, target_features, row_id)
+
+    return jaccardFromSharedMin(cv_matrix, target_row, shared_min)
+
+###############################################################################
+# Function      : jaccardFromSharedMin(cv_matrix, target_row, shared_min)
+# Description   : Turns the shared part of sum of min of each word into
+#                 Jaccard's similarity score with the target word.
+# Arguments     : cv_matrix  - CoOccurrenceMatrix with association computed
+#                 target_row - row id of the target word
+#                 shared_min - array with shared part of sum of min of
+#                              each row
+# Returns       : array of scores indexed by row id
+###############################################################################
+def jaccardFromSharedMin(cv_matrix, target_row, shared_min):
+
+    assoc_sum = cv_matrix.assoc_sum
+    assoc_neg_sum = cv_matrix.assoc_neg_sum
+
+    target_sum = assoc_sum[target_row]
+    target_neg_sum = assoc_neg_sum[target_row]
+
+    scores = array.array('d', [0.0]) * cv_matrix.numRows()
+
+    for row_id in xrange(cv_matrix.numRows()):
+        scores[row_id] = jaccard(target_sum, target_neg_sum, \
+                                 assoc_sum[row_id], assoc_neg_sum[row_id], \
+                                 shared_min[row_id])
+    return scores
+
+###############################################################################
+# Function      : candidateSharedMin(cv_matrix, target_row)
+# Description   : Finds the words sharing at least one feature with the target
+#                 word through the inverted index of cv_matrix and accumulates
+#                 their shared part of sum of min.
+# Arguments     : cv_matrix  - CoOccurrenceMatrix with association computed
+#                 target_row - row id of the target word
+# Returns       : dict mapping row id of each candidate to its shared part
+###############################################################################
+def candidateSharedMin(cv_matrix, target_row):
+    return blockSharedMin(cv_matrix, [target_row])[0]
+
+###############################################################################
+# Function      : blockSharedMin(cv_matrix, target_rows, measure)
+# Description   : Same as candidateSharedMin, for a block of target words at
+#                 once. The inverted index entry of each feature is read only
+#                 once for the whole block, however many targets carry it.
+#                 For measures other than Jaccard's, their own shared part
+#                 is summed instead of the shared part of sum of min.
+# Arguments     : cv_matrix   - CoOccurrenceMatrix with association computed
+#                 target_rows - list of row ids of the target words
+#                 measure     - name of the similarity measure
+# Returns       : list of dicts, one for each target word, mapping row id of
+#                 each candidate to its shared part
+###############################################################################
+def blockSharedMin(cv_matrix, target_rows, measure=DEFAULT_SIMILARITY):
+
+    assoc = cv_matrix.assoc
+    shared_part = similarityMeasure(measure).shared
+
+    # group the targets of the block by their features
+    feature_targets = {}
+    for target_index, target_row in enumerate(target_rows):
+        for col, target_value in zip(*cv_matrix.row(target_row)):
+            feature_targets.setdefault(col, []).append((target_index, \
+                                                        target_value))
+
+    shared_mins = [{} for target_row in target_rows]
+
+    '''
+    Features are taken in increasing order of column id, so that the shared
+    part of each candidate is summed in the same order as rowSharedMin does.
+    '''
+    for col in sorted(feature_targets):
+        targets = feature_targets[col]
+        rows, cells = cv_matrix.wordsWithFeature(col)
+        values = [assoc[position] for position in cells]
+
+        for target_index, target_value in targets:
+            shared_min = shared_mins[target_index]
+            for row_id, value in zip(rows, values):
+                shared_min[row_id] = shared_min.get(row_id, 0.0) + \
+                                     shared_part(target_value, value)
+    return shared_mins
+
+###############################################################################
+# Function      : jaccardCandidateScores(cv_matrix, target_row, shared_min)
+# Description   : Calculates Jaccard's similarity score of the target word
+#                 against the words sharing at least one feature with it.
+# Arguments     : cv_matrix  - CoOccurrenceMatrix with association computed
+#                 target_row - row id of the target word
+#                 shared_min - result of candidateSharedMin, if it is
+#                              already available
+# Returns       : dict mapping row id of each candidate to its score
+###############################################################################
+def jaccardCandidateScores(cv_matrix, target_row, shared_min=None):
+
+    if shared_min is None:
+        shared_min = candidateSharedMin(cv_matrix, target_row)
+
+    assoc_sum = cv_matrix.assoc_sum
+    assoc_neg_sum = cv_matrix.assoc_neg_sum
+
+    target_sum = assoc_sum[target_row]
+    target_neg_sum = assoc_neg_sum[target_row]
+
+    scores = {}
+    for row_id, shared in shared_min.iteritems():
+        scores[row_id] = jaccard(target_sum, target_neg_sum, \
+                                 assoc_sum[row_id], assoc_neg_sum[row_id], \
+                                 shared)
+    return scores
+
+###############################################################################
+# Function      : rowSharedMin(cv_matrix, target_features, row_id, measure)
+# Description   : Calculates the shared part of sum of min (or the shared
+#                 part of another measure) of the target word and one other
+#                 word by walking the row of the other word.
+# Arguments     : cv_matrix       - CoOccurrenceMatrix with association
+#                                   computed
+#                 target_features - dict mapping column id of each feature
+#                                   of the target word to its association
+#                 row_id          - row id of the other word
+#                 measure         - name of the similarity measure
+# Returns       : shared part of sum of min
+###############################################################################
+def rowSharedMin(cv_matrix, target_features, row_id, \
+                 measure=DEFAULT_SIMILARITY):
+
+    shared_part = similarityMeasure(measure).shared
+
+    shared_sum = 0.0
+    for col, value in zip(*cv_matrix.row(row_id)):
+        target_value = target_features.get(col)
+        if target_value is not None:
+            shared_sum += shared_part(target_value, value)
+    return shared_sum
+
+###############################################################################
+# Function      : pairSimilarity(cv_matrix, target_row, other_row, measure)
+# Description   : Calculates the similarity score of two words, by Jaccard's
+#                 measure unless another measure is given.
+# Arguments     : cv_matrix  - CoOccurrenceMatrix with association computed
+#                 target_row - row id of the first word
+#                 other_row  - row id of the second word
+#                 measure    - name of the similarity measure
+# Returns       : similarity score
+###############################################################################
+def pairSimilarity(cv_matrix, target_row, other_row, \
+                   measure=DEFAULT_SIMILARITY):
+
+    target_features = dict(zip(*cv_matrix.row(target_row)))
+
+    return similarityMeasure(measure).score(cv_matrix, target_row, \
+                                            other_row, \
+                                            rowSharedMin(cv_matrix, \
+                                                         target_features, \
+                                                         other_row, measure))
+
+###############################################################################
+# Function      : mostSimilar(cv_matrix, target_row, num_of_sim_words,
+#                             measure)
+# Description   : Finds the words most similar to the target word. Words are
+#                 ordered by score and then by word, both in decreasing order.
+#
+#                 Only candidates from the inverted index are considered, in
+#                 decreasing order of the upper bound of their score
+#                 (jaccardUpperBound for Jaccard's measure). The best
+#                 num_of_sim_words scores are kept in a bounded heap and the
+#                 search stops once the bound of the next candidate is below
+#                 the lowest score in a full heap. Words sharing no feature
+#                 with the target are scored only when the heap does not get
+#                 filled with scores above 0.
+# Arguments     : cv_matrix        - CoOccurrenceMatrix with association
+#                                    computed
+#                 target_row       - row id of the target word
+#                 num_of_sim_words - number of similar words needed
+#                 measure          - name of the similarity measure
+# Returns       : list of (word, score) tuples
+###############################################################################
+def mostSimilar(cv_matrix, target_row, num_of_sim_words, \
+                measure=DEFAULT_SIMILARITY):
+
+    if num_of_sim_words <= 0:
+        return []
+
+    similarity_measure = similarityMeasure(measure)
+    words = cv_matrix.words
+    target_features = dict(zip(*cv_matrix.row(target_row)))
+
+    # collect the words sharing at least one feature with the target
+    candidates = set()
+    for col in target_features:
+        candidates.update(cv_matrix.wordsWithFeature(col)[0])
+
+    candidate_rows = list(candidates)
+    bounded_candidates = sorted(zip(similarity_measure.upperBounds(cv_matrix, \
+                                                                   target_row, \
+                                                                   candidate_rows), \
+                                    candidate_rows), reverse=True)
+
+    '''
+    Heap of (score, word) tuples. heap[0] is the lowest of the best
+    scores found so far.
+    '''
+    heap = []
+    num_scored = 0
+
+    for bound, row_id in bounded_candidates:
+        if len(heap) == num_of_sim_words and bound < heap[0][0]:
+            break
+
+        score = similarity_measure.score(cv_matrix, target_row, row_id, \
+                                         rowSharedMin(cv_matrix, \
+                                                      target_features, \
+                                                      row_id, measure))
+        _pushBounded(heap, (score, words[row_id]), num_of_sim_words)
+        num_scored += 1
+
+    metrics.count("query.queries")
+    metrics.count("query.candidates", len(candidates))
+    metrics.count("query.scored", num_scored)
+
+    _rankNonCandidates(cv_matrix, target_row, candidates, heap, \
+                       num_of_sim_words, measure)
+
+    return [(word, score) for score, word in sorted(heap, reverse=True)]
+
+###############################################################################
+# Function      : batchMostSimilar(cv_matrix, target_rows, num_of_sim_words,
+#                                  block_size, measure)
+# Description   : Finds the words most similar to each of many target words.
+#                 Targets are taken in blocks of block_size. Shared parts of
+#                 sum of min of all targets of a block are found together by
+#                 blockSharedMin and the best num_of_sim_words candidates of
+#                 each target, scored together by the kernel of the measure,
+#                 are kept in a bounded heap, as in mostSimilar.
+#                 Results are given out block by block, so that they can be
+#                 written out while the next block is being scored.
+# Arguments     : cv_matrix        - CoOccurrenceMatrix with association
+#                                    computed
+#                 target_rows      - list of row ids of the target words
+#                 num_of_sim_words - number of similar words needed
+#                 block_size       - number of targets scored together
+#                 measure          - name of the similarity measure
+# Returns       : generator of lists of (target_row, list of (word, score))
+#                 tuples, one list for each block
+###############################################################################
+def batchMostSimilar(cv_matrix, target_rows, num_of_sim_words, \
+                     block_size=DEFAULT_BLOCK_SIZE, measure=DEFAULT_SIMILARITY):
+
+    similarity_measure = similarityMeasure(measure)
+    words = cv_matrix.words
+
+    for block_start in xrange(0, len(target_rows), block_size):
+        block = target_rows[block_start:block_start + block_size]
+        block_results = []
+
+        for target_row, shared_min in zip(block, \
+                                          blockSharedMin(cv_matrix, block, \
+                                                         measure)):
+            heap = []
+            if num_of_sim_words > 0:
+                row_ids = shared_min.keys()
+                scores = similarity_measure.scores(cv_matrix, target_row, \
+                                                   row_ids, \
+                                                   shared_min.values())
+                for row_id, score in zip(row_ids, scores):
+                    _pushBounded(heap, (score, words[row_id]), \
+                                 num_of_sim_words)
+
+                _rankNonCandidates(cv_matrix, target_row, shared_min, heap, \
+                                   num_of_sim_words, measure)
+
+            metrics.count("query.queries")
+            metrics.count("query.candidates", len(shared_min))
+            metrics.count("query.scored", len(shared_min))
+
+            block_results.append((target_row, \
+                                  [(word, score) for score, word in \
+                                   sorted(heap, reverse=True)]))
+        yield block_results
+
+###############################################################################
+# Function      : _rankNonCandidates(cv_matrix, target_row, candidates, heap,
+#                                    size, measure)
+# Description   : Adds the words sharing no feature with the target word to
+#                 the heap of best scores, when the candidates did not fill
+#                 it with scores above 0. Shared part of sum of min of these
+#                 words is 0.
+###############################################################################
+def _rankNonCandidates(cv_matrix, target_row, candidates, heap, size, \
+                       measure=DEFAULT_SIMILARITY):
+
+    if len(heap) == size and heap[0][0] > 0:
+        return
+
+    metrics.count("query.full_scans")
+
+    words = cv_matrix.words
+    row_ids = [row_id for row_id in xrange(cv_matrix.numRows()) \
+               if row_id not in candidates]
+    scores = similarityMeasure(measure).scores(cv_matrix, target_row, \
+                                               row_ids, \
+                                               [0.0] * len(row_ids))
+
+    for row_id, score in zip(row_ids, scores):
+        _pushBounded(heap, (score, words[row_id]), size)
+
+###############################################################################
+# Function      : _pushBounded(heap, item, size)
+# Description   : Adds item to a min-heap holding at most size items, dropping
+#                 the lowest item when the heap is full.
+###############################################################################
+def _pushBounded(heap, item, size):
+
+    if len(heap) < size:
+        heapq.heappush(heap, item)
+    elif item > heap[0]:
+        heapq.heapreplace(heap, item)
+
+##############################################################################
+# End of similarity.py module
+#############################################################################
@@ -0,0 +1,93 @@
+##############################################################################
+# Algorithm     :   This module maps strings, like the words of the corpus
+#                   and the names of grammatical relations, to dense integer
+#                   ids.
+#
+#                   Each distinct string is stored only once, in the list of
+#                   strings of the vocabulary, and its id is its position in
+#                   that list. Counts and matrices of later stages are kept
+#                   with ids instead of strings, so the same word is not
+#                   stored and hashed again in every key it is part of. The
+#                   strings are looked up from the ids only for output.
+##############################################################################
+
+#!/usr/bin/python
+
+###############################################################################
+# Class         : Vocabulary
+# Description   : Two way mapping between strings and dense integer ids
+#                 0, 1, 2, ... given in the order strings are first seen.
+#
+#                 Attributes:
+#                 strings - list mapping id to string
+#                 ids     - dict mapping string to id
+###############################################################################
+class Vocabulary(object):
+
+    def __init__(self, strings=()):
+        self.strings = []
+        self.ids = {}
+        for string in strings:
+            self.idOf(string)
+
+    ###########################################################################
+    # Method        : idOf(string)
+    # Description   : Returns the id of string, adding string to the
+    #                 vocabulary if it was not seen before.
+    ###########################################################################
+    def idOf(self, string):
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.ids[string] = string_id
+            self.strings.append(string)
+        return string_id
+
+    ###########################################################################
+    # Method        : lookup(string)
+    # Description   : Returns the id of string or None if it is not in the
+    #                 vocabulary. Vocabulary is not changed.
+    ###########################################################################
+    def lookup(self, string):
+        return self.ids.get(string)
+
+    ###########################################################################
+    # Method        : remap(other)
+    # Description   : Returns a list mapping each id of other vocabulary to the
+    #                 id of the same string in this vocabulary. Strings of
+    #                 other missing in this vocabulary are added to it.
+    ###########################################################################
+    def remap(self, other):
+        return [self.idOf(string) for string in other.strings]
+
+    def __getitem__(self, string_id):
+        return self.strings[string_id]
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __contains__(self, string):
+        return string in self.ids
+
+    ###########################################################################
+    # Method        : __getstate__(), __setstate__(state)
+    # Description   : Only the list of strings is pickled. The dict of ids is
+    #                 built again when the vocabulary is loaded. State is a
+    #                 tuple, since pickle skips __setstate__ for an empty one.
+    ###########################################################################
+    def __getstate__(self):
+        return (self.strings,)
+
+    def __setstate__(self, state):
+        strings = state[0]
+        self.strings = strings
+        self.ids = dict((string, string_id) for string_id, string in \
+                        enumerate(strings))
+
+###############################################################################
+# End of Vocabulary class
+###############################################################################
+
+##############################################################################
+# End of vocabulary.py module
+#############################################################################
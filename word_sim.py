@@ -16,7 +16,9 @@
 #                       3) Next it reads all parse files and segregates all
 #                          grammatical relations from it. These relations
 #                          act as relational feature for out distributional
-#                          method
+#                          method. Instead of parse files, window features
+#                          like L1:word and R2:word can be taken straight
+#                          from the sentence file (--features window).
 #
 #                       4) Using these relations features, it calculates the
 #                          max likelihood prob for features and max likelihood
@@ -35,6 +37,33 @@
 #                       7) Then it displays top N words similar to each target 
 #                          word. Here the number N is also passed input to the
 #                          program.
+#
+#                       t-test and Jaccard's measure are the defaults; other
+#                       association measures (PMI, PPMI) can be chosen for
+#                       the build with --association and other similarity
+#                       measures (Dice, cosine) for the queries with
+#                       --similarity (see measures.py module).
+#
+#                       CVs can be pruned while they are built, dropping rare
+#                       words and features, features of some relations and
+#                       all but the strongest features of each word (see
+#                       pruning.py module). With --prune-report, the pruned
+#                       model is compared with the unpruned one.
+#
+#                       With --approximate, step 6 scores only the candidates
+#                       found in an LSH index of weighted MinHash signatures
+#                       of the CVs (see lsh_index.py module).
+#
+#                       With --neighbors-table, step 6 reads the similar
+#                       words from a table of the top similar words of all
+#                       words, precomputed in parallel blocks (see
+#                       neighbor_table.py module).
+#
+#                       Time of each step, counts like relations read, words
+#                       and features of the CV and candidates scored per
+#                       query, and peak memory are recorded by metrics.py
+#                       module and written into a JSON file with --metrics
+#                       option.
 ###############################################################################
 
 #!/usr/bin/python
@@ -46,6 +75,12 @@ program
 # sys module is used to access command line argument, exit function etc.
 import sys
 
+# argparse module is used to read the command line arguments
+import argparse
+
+# json module is used to write batch mode output in jsonl format
+import json
+
 # re module is used to access regular expression related facilities
 import re
 
@@ -64,6 +99,37 @@ import collections
 # time module for time related functionality
 import time
 
+# ingest module reads and counts relations of parse files
+from ingest import parseFilePaths, countRelationsParallel, \
+                   updateRelationCounts, countWords, internWordCounts, \
+                   countWindowFeatures, DEFAULT_WINDOW
+
+# cv_matrix module holds the co-occurrence vectors as a sparse matrix
+from cv_matrix import CoOccurrenceMatrix
+
+# similarity module finds the words most similar to target words
+from similarity import mostSimilar, batchMostSimilar, DEFAULT_BLOCK_SIZE
+
+# model_file module saves and memory maps built models
+from model_file import saveModel, loadModel
+
+# metrics module records time, counts and memory of the stages
+import metrics
+
+# lsh_index module is the approximate index of similar words
+from lsh_index import MinHashIndex, saveIndex, loadIndex, \
+                      DEFAULT_NUM_BANDS, DEFAULT_BAND_SIZE
+
+# neighbor_table module is the precomputed table of similar words
+from neighbor_table import NeighborTable, saveTable, loadTable
+
+# pruning module drops words and features while the model is built
+from pruning import Pruning, pruneReport
+
+# measures module has the association and similarity measures
+from measures import ASSOCIATION_MEASURES, SIMILARITY_MEASURES, \
+                     DEFAULT_ASSOCIATION, DEFAULT_SIMILARITY
+
 
 '''
 Set the value of debug flag. debug flag is used to decide whether to print
@@ -71,534 +137,812 @@ debug information in the output or not. This flag will be a global variable.
 '''
 debug = False
 
+'''
+Formats of the output file written in batch mode
+'''
+OUTPUT_FORMATS = ("tsv", "jsonl")
+
+'''
+Kinds of features the CV can be built from: grammatical relations of parse
+files or windows of words of the sentence file
+'''
+FEATURE_KINDS = ("parse", "window")
+
 ###############################################################################
-# Function      : main()
-# Description   : Entry point for the project.
-# Arguments     : None. Command Line Arguments in Python are retrieved from
-#                 sys.argv variable of sys module.
-# Returns       : None.
+# Function      : parseArguments(argv)
+# Description   : Reads the command line arguments of the program. Four
+#                 positional arguments are needed as before:
+#
+#                 parse_directory sent_file target_words_file num_of_sim_words
+#
+#                 When a model file saved earlier is loaded with --load-model,
+#                 only the last two of them are needed. When window features
+#                 are used (--features window), parse_directory is not
+#                 needed. Rest of the arguments are optional.
+# Arguments     : argv - command line arguments without the program name
+# Returns       : argparse namespace with the values of the arguments
 ###############################################################################
-def main():
-    
-    '''
-    Check if any command line argument is passed to program. If not 
-    throw error showing proper sample usage. 
-    '''
+def parseArguments(argv):
+
+    parser = argparse.ArgumentParser(description="Find words similar to " \
+                                     "target words using t-test association " \
+                                     "measure and Jaccard's similarity " \
+                                     "measure.", \
+                                     usage="%(prog)s [options] " \
+                                     "[[parse_directory] sent_file] " \
+                                     "target_words_file num_of_sim_words")
+    parser.add_argument("positional", nargs="+", metavar="argument", \
+                        help="parse_directory (directory where all parse " \
+                             "files are present), sent_file (file " \
+                             "containing all sentences of the corpus), " \
+                             "target_words_file (file containing list of " \
+                             "target words) and num_of_sim_words (maximum " \
+                             "number of similar words in output)")
+    parser.add_argument("--save-model", metavar="MODEL_FILE", \
+                        help="write the built model into this file")
+    parser.add_argument("--load-model", metavar="MODEL_FILE", \
+                        help="memory map a model file written earlier with " \
+                             "--save-model instead of building the model")
+    parser.add_argument("--workers", type=int, default=1, \
+                        help="number of processes used to read sentence " \
+                             "file and parse files while building the model")
+    parser.add_argument("--features", choices=FEATURE_KINDS, \
+                        default="parse", \
+                        help="build the CV from grammatical relations of " \
+                             "parse files, or from windows of words of " \
+                             "the sentence file (no parse_directory needed)")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, \
+                        help="number of words on each side of a word taken " \
+                             "as its context with --features window")
+    parser.add_argument("--counts-dir", \
+                        help="keep relation counts of parse files in this " \
+                             "directory and read only new or changed parse " \
+                             "files on the next build")
+    parser.add_argument("--output", \
+                        help="batch mode: write similar words of all target " \
+                             "words into this file as each block of target " \
+                             "words is scored ('-' for stdout)")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="tsv", \
+                        help="format of the batch mode output file")
+    parser.add_argument("--block-size", type=int, \
+                        default=DEFAULT_BLOCK_SIZE, \
+                        help="number of target words scored together in " \
+                             "batch mode")
+    parser.add_argument("--metrics", metavar="METRICS_FILE", \
+                        help="write time, counts and peak memory of each " \
+                             "stage into this JSON file ('-' for a JSON " \
+                             "line on stderr)")
+    parser.add_argument("--association", \
+                        choices=sorted(ASSOCIATION_MEASURES), \
+                        default=DEFAULT_ASSOCIATION, \
+                        help="association measure the model is built with")
+    parser.add_argument("--similarity", \
+                        choices=sorted(SIMILARITY_MEASURES), \
+                        default=DEFAULT_SIMILARITY, \
+                        help="similarity measure the words are compared " \
+                             "with")
+    parser.add_argument("--min-word-freq", type=int, default=0, \
+                        help="drop words occurring fewer times in the " \
+                             "sentence file, both as rows and in features")
+    parser.add_argument("--min-feature-freq", type=int, default=0, \
+                        help="drop features (relation, word) occurring " \
+                             "fewer times")
+    parser.add_argument("--max-features", type=int, \
+                        help="keep only this many features of each word, " \
+                             "the ones with the highest association")
+    parser.add_argument("--exclude-relation", action="append", default=[], \
+                        metavar="RELATION", \
+                        help="drop features of this relation, e.g. det or " \
+                             "aux (can be repeated)")
+    parser.add_argument("--prune-report", metavar="REPORT_FILE", \
+                        help="also build the unpruned model and write into " \
+                             "this JSON file how much the model shrank and " \
+                             "how much the similar words changed ('-' for " \
+                             "stderr)")
+    parser.add_argument("--approximate", action="store_true", \
+                        help="find similar words through an LSH index of " \
+                             "weighted MinHash signatures, scoring only " \
+                             "its candidates")
+    parser.add_argument("--lsh-index", metavar="INDEX_FILE", \
+                        help="with --approximate, memory map the LSH index " \
+                             "from this file, or build it and save it " \
+                             "there if the file does not exist. An existing " \
+                             "index must have the --lsh-bands and " \
+                             "--lsh-band-size given.")
+    parser.add_argument("--lsh-bands", type=int, default=DEFAULT_NUM_BANDS, \
+                        help="number of LSH bands; more bands give better " \
+                             "recall and slower queries")
+    parser.add_argument("--lsh-band-size", type=int, \
+                        default=DEFAULT_BAND_SIZE, \
+                        help="number of MinHash values in each band; " \
+                             "longer bands give fewer candidates and lower " \
+                             "recall")
+    parser.add_argument("--max-candidates", type=int, \
+                        help="with --approximate, score at most this many " \
+                             "candidates of each target word")
+    parser.add_argument("--neighbors-table", metavar="TABLE_FILE", \
+                        help="read similar words from this memory mapped " \
+                             "table of the top similar words of all words, " \
+                             "or build it with --workers processes and " \
+                             "save it there if the file does not exist")
+    args = parser.parse_args(argv)
+
+    if args.load_model is not None:
+        if args.save_model is not None:
+            parser.error("--save-model can not be used with --load-model")
+        if len(args.positional) != 2:
+            parser.error("target_words_file and num_of_sim_words are " \
+                         "needed with --load-model")
+        if args.prune_report is not None or pruningOf(args).isActive():
+            parser.error("pruning options can not be used with " \
+                         "--load-model")
+        if args.association != DEFAULT_ASSOCIATION:
+            parser.error("--association can not be used with --load-model, " \
+                         "the model was built with its own measure")
+        args.parse_directory = None
+        args.sent_file = None
+    elif args.features == "window":
+        if args.counts_dir is not None:
+            parser.error("--counts-dir can only be used with parse features")
+        if args.window < 1:
+            parser.error("--window must be at least 1")
+        if len(args.positional) != 3:
+            parser.error("sent_file, target_words_file and " \
+                         "num_of_sim_words are needed with --features " \
+                         "window")
+        args.parse_directory = None
+        args.sent_file = args.positional[0]
+    else:
+        if len(args.positional) != 4:
+            parser.error("parse_directory, sent_file, target_words_file " \
+                         "and num_of_sim_words are needed")
+        args.parse_directory = args.positional[0]
+        args.sent_file = args.positional[1]
 
-    if (len(sys.argv) > 1):
-        if debug:
-            print "At least one parameter passed to program !"
-        
-        '''
-        Get the values of command line arguments for :
-        1) Path of directory where all parse files are present  
-        
-        2) File containing all sentences present in the corpus
-        (which is referred as sentence file hereafter in this program)
+    if args.max_features is not None and args.max_features < 1:
+        parser.error("--max-features must be at least 1")
 
-        3) File containing list of target words for which we want to 
-        find similar words
-        
-        4) Maximum number of similar words that needs to be displayed 
-        in output
-        '''        
-        parse_directory =  sys.argv[1]
-        sent_file = sys.argv[2]
-        target_words_file = sys.argv[3]
-        num_of_sim_words = int(sys.argv[4])
+    if args.lsh_bands < 1 or args.lsh_band_size < 1:
+        parser.error("--lsh-bands and --lsh-band-size must be at least 1")
 
-        '''
-        Read the target list word file and store them into a list
-        '''
-        target_file_handle = open(target_words_file, 'r')
-        target_words_list =  target_file_handle.readlines()
-        target_file_handle.close()
+    if args.approximate and args.neighbors_table is not None:
+        parser.error("--neighbors-table can not be used with --approximate")
 
-        
-        '''
-        Get the names of all parse files present in the
-        parse directory. For this, built-in function, listdir is used.
-        It gives the directory listing for any directory on disk.
-        The usage of listdir function was learnt from the link:
-        http://docs.python.org/2/library/os.html
-
-        These parse files were created earlier by Standford parser
-        by running parse_corpus_sentences.py file.
-        '''
-        parse_files_list =  os.listdir(parse_directory)
+    args.target_words_file = args.positional[-2]
+    try:
+        args.num_of_sim_words = int(args.positional[-1])
+    except ValueError:
+        parser.error("num_of_sim_words must be a number")
 
-        
-        '''
-        Start getting max likelihood Probabilities for each word.
-        '''
+    return args
 
-        '''
-        Get the frequencies of all words present in the corpus. 
-        These frequencies  will be obtained from sentence file (passed as
-        command line argument).
-        The frequencies of all words will be stored in 
-        dict object "word_frq_dict",
-        which will have each word as the key and its freq as the value
-        for that key. 
-
-        E.g. if a word "Cleopatra" occurs 900 times in sentence file
-        and word "Ceaser" occurs 89 times in sentence file
-        dict object will look this:
-
-        [('Cleopatra':900), ('Ceaser'):89]
-        '''
-        # create word_frq_dict
-        word_frq_dict = {}
+###############################################################################
+# End of parseArguments function
+###############################################################################
 
-        '''
-        To retrieve the frequencies of all words from the sentence file, 
-        built-in counter object will be used. The example usage of counter
-        object to get word frequencies is borrowed from the link:
-        http://docs.python.org/2/library/collections.html
-        '''  
-        words = re.findall('\w+', open(sent_file).read().lower())
-    
-        word_freq_counter = collections.Counter(words)
-        
-        '''
-        Iterate over the word_freq_counter object and feed in those
-        values to word_frq_dict. Also calculate total number of tokens
-        in the sentence file.
-        '''
-        total_tokens = 0
+###############################################################################
+# Function      : pruningOf(args)
+# Description   : Pruning object of pruning.py module with the settings given
+#                 by the command line arguments
+###############################################################################
+def pruningOf(args):
+    return Pruning(args.min_word_freq, args.min_feature_freq, \
+                   args.max_features, args.exclude_relation)
 
-        for word_freq in word_freq_counter.most_common():
-             
-            word_frq_dict[word_freq[0]] = word_freq[1]
-            total_tokens = total_tokens + word_freq[1]
+###############################################################################
+# Function      : writeReport(report, destination)
+# Description   : Writes a report in JSON format into a file, or on stderr
+#                 when destination is "-".
+###############################################################################
+def writeReport(report, destination):
+    if destination == "-":
+        sys.stderr.write(json.dumps(report, sort_keys=True) + "\n")
+    else:
+        report_handle = open(destination, 'w')
+        json.dump(report, report_handle, indent=1, sort_keys=True)
+        report_handle.write("\n")
+        report_handle.close()
 
-        if debug:
-            print total_tokens
-            print word_frq_dict
-        
-        '''
-        Next, calculate Max likelihood Probabilities for each word in sentence
-        file. This probability will be equal to freq of word / total tokens in 
-        sentence file. Since the number of total token is too high,the prob.
-        will be calculated in log space.
+###############################################################################
+# Function      : writeBatchResults(cv_matrix, target_words_list,
+#                                   num_of_sim_words, output_handle,
+#                                   output_format, block_size)
+# Description   : Batch mode of the program. Finds similar words of all
+#                 target words in blocks, using batchMostSimilar function of
+#                 similarity.py module, and writes them out as soon as each
+#                 block is finished.
+#
+#                 In tsv format each similar word is a line:
+#                 <target word> TAB <rank> TAB <similar word> TAB <score>
+#
+#                 In jsonl format each target word is a line:
+#                 {"target": <target word>, "neighbors": [[<word>, <score>],
+#                                                         ...]}
+#
+#                 Target words without any CV are skipped with a note on
+#                 stderr.
+#
+#                 With an LSH index or a neighbor table, each target word
+#                 is looked up in it instead (see lsh_index.py and
+#                 neighbor_table.py modules).
+# Arguments     : cv_matrix         - CoOccurrenceMatrix with association
+#                                     computed
+#                 target_words_list - list of target words
+#                 num_of_sim_words  - number of similar words per target word
+#                 output_handle     - file object to write into
+#                 output_format     - "tsv" or "jsonl"
+#                 block_size        - number of target words scored together
+#                 lsh_index         - MinHashIndex of cv_matrix, or None
+#                 max_candidates    - most candidates scored per target word
+#                                     with lsh_index, or None
+#                 measure           - name of the similarity measure
+#                 neighbor_table    - NeighborTable of cv_matrix, or None
+# Returns       : None
+###############################################################################
+@metrics.timed("batch_query")
+def writeBatchResults(cv_matrix, target_words_list, num_of_sim_words, \
+                      output_handle, output_format, block_size, \
+                      lsh_index=None, max_candidates=None, \
+                      measure=DEFAULT_SIMILARITY, neighbor_table=None):
+
+    target_rows = []
+    for target_word in target_words_list:
+        target_row = cv_matrix.rowOf(target_word)
+        if target_row is None:
+            sys.stderr.write("Skipping target word without CV: " + \
+                             target_word + "\n")
+            metrics.count("query.unknown_targets")
+        else:
+            target_rows.append(target_row)
+
+    if lsh_index is not None:
+        results = ([(target_row, \
+                     lsh_index.mostSimilar(cv_matrix, target_row, \
+                                           num_of_sim_words, \
+                                           max_candidates, measure))] \
+                   for target_row in target_rows)
+    elif neighbor_table is not None:
+        results = ([(target_row, \
+                     neighbor_table.mostSimilar(cv_matrix, target_row, \
+                                                num_of_sim_words, measure))] \
+                   for target_row in target_rows)
+    else:
+        results = batchMostSimilar(cv_matrix, target_rows, \
+                                   num_of_sim_words, block_size, measure)
 
-        The max likelihood prob will be stored in a dict object called as p_w.
-        This dict object corresponds to P(w) given in section 20.7.2 of JM text
-        '''
-        # create p_w dict object
-        p_w = {}
+    for block_results in results:
+        for target_row, word_sim in block_results:
+            target_word = cv_matrix.words[target_row]
 
-        # iterate over the word_frq_dict to get max likelihood prob for words 
+            if output_format == "jsonl":
+                output_handle.write(json.dumps({"target": target_word, \
+                                                "neighbors": word_sim}) + \
+                                    "\n")
+            else:
+                for rank, (key, value) in enumerate(word_sim):
+                    output_handle.write("%s\t%d\t%s\t%r\n" % \
+                                        (target_word, rank + 1, key, value))
+        output_handle.flush()
+
+###############################################################################
+# End of writeBatchResults function
+###############################################################################
 
-        for word, freq in word_frq_dict.iteritems():
-            p_w[word] = math.log10(freq) - math.log10(total_tokens) 
-            
+###############################################################################
+# Function      : printSimilarWords(cv_matrix, target_words_list,
+#                                   num_of_sim_words, output_handle)
+# Description   : Finds the similar words of each target word and writes
+#                 them out as a table, with the freq of the target word.
+#                 Target words without any CV, e.g. dropped by pruning, are
+#                 skipped with a note on stderr, as in writeBatchResults.
+# Arguments     : cv_matrix         - CoOccurrenceMatrix with association
+#                                     computed
+#                 target_words_list - list of target words
+#                 num_of_sim_words  - number of similar words per target word
+#                 output_handle     - file object to write into
+#                 lsh_index         - MinHashIndex of cv_matrix to find
+#                                     similar words approximately, or None
+#                 max_candidates    - most candidates scored per target word
+#                                     with lsh_index, or None
+#                 measure           - name of the similarity measure
+#                 neighbor_table    - NeighborTable of cv_matrix to read
+#                                     similar words from, or None
+# Returns       : None
+###############################################################################
+@metrics.timed("query")
+def printSimilarWords(cv_matrix, target_words_list, num_of_sim_words, \
+                      output_handle=sys.stdout, lsh_index=None, \
+                      max_candidates=None, measure=DEFAULT_SIMILARITY, \
+                      neighbor_table=None):
+
+    # iterate over the target word list to fetch target words
+    for target_word in target_words_list:
+
+        # get features' row for target word from cv_matrix
+        target_row = cv_matrix.rowOf(target_word)
+        if target_row is None:
+            sys.stderr.write("Skipping target word without CV: " + \
+                             target_word + "\n")
+            metrics.count("query.unknown_targets")
+            continue
+
+        # get the most similar words and their scores
+        if lsh_index is not None:
+            word_sim = lsh_index.mostSimilar(cv_matrix, target_row, \
+                                             num_of_sim_words, \
+                                             max_candidates, measure)
+        elif neighbor_table is not None:
+            word_sim = neighbor_table.mostSimilar(cv_matrix, target_row, \
+                                                  num_of_sim_words, measure)
+        else:
+            word_sim = mostSimilar(cv_matrix, target_row, num_of_sim_words, \
+                                   measure)
+
+        print >> output_handle, "Target word: " + target_word  + "\n"
         
-        if debug:
-            print p_w
+        print >> output_handle, "Target word frequency in corpus: " + \
+            str(cv_matrix.word_freq[target_row]) + "\n"
+    
 
-        '''
-        Start building co-occurrence vector using all parse files.
+        print >> output_handle, "Similar words and their similarity " \
+                                "scores : " + "\n" 
 
-        These parse files were created earlier by Standford parser
-        by running parse_corpus_sentences.py program.
+        for key, value in word_sim:
+               
+            '''
+            For table like pretty printing of output, format specifier : 
+            is used as described on Python 2.7.3 documentation 
+            present at the link:
+        
+            http://docs.python.org/tutorial/inputoutput.html
+        
+            The sample code referred from above link was
+            print '{0:10} ==> {1:10d}'.format(name, phone)
+            '''
 
-        '''
+            print >> output_handle, '{0:30}      {1:30}     '.format(key, \
+                                                                str(value))
         
-        ''' 
-        Get the names of all parse files present in the
-        parse directory (passed as command line argument). 
-        For this, built-in function listdir is used.
-        It gives the directory listing for any directory on disk.
-        The usage of listdir function was learnt from the link:
-        http://docs.python.org/2/library/os.html
+        print >> output_handle, "\n\n"
 
-        '''
-        parse_files_list =  os.listdir(parse_directory)
+###############################################################################
+# End of printSimilarWords function
+###############################################################################
 
-        '''
-        Iterate over the parse files list created above and read 
-        each parse file. A list containing grammatical relations for
-        all words in parse files will be created from all parse files.
-        This list will be used further in program to create co-occurrence
-        vector.
+###############################################################################
+# Function      : buildModel(parse_directory, sent_file, num_workers,
+#                            counts_directory, window)
+# Description   : Builds the co-occurrence vectors of all words, with their
+#                 t-test association measures, out of the sentence file and
+#                 all parse files of the parse directory, or out of the
+#                 windows of words of the sentence file alone.
+# Arguments     : parse_directory  - path of directory where all parse
+#                                    files are present
+#                 sent_file        - file containing all sentences present
+#                                    in the corpus
+#                 num_workers      - number of processes reading sentence
+#                                    file and parse files
+#                 counts_directory - directory keeping relation counts
+#                                    between builds, or None
+#                 window           - number of words on each side of a word
+#                                    taken as its context, to use window
+#                                    features instead of parse files, or
+#                                    None
+#                 pruning          - Pruning object of pruning.py module, or
+#                                    None
+#                 association      - name of the association measure
+# Returns       : CoOccurrenceMatrix object with association computed
+###############################################################################
+def buildModel(parse_directory, sent_file, num_workers=1, \
+               counts_directory=None, window=None, pruning=None, \
+               association=DEFAULT_ASSOCIATION):
 
-        A typical grammatical relation in any parse file looks like this:
-        
-        <grammatical_relation>(<word_1_in_relation> - 
-                               <index_of_word_1_in_sentence>, 
-                               <word_2_in relation> - 
-                               <index_of_word_2_in_sentence>)
-        
-        E.g. if the original sentence in the corpus file is :
-        
-        "The Bush family did its best to shield the service and reception from
-        public view."
-        
-        Then the parse file showing grammatical relation will have following 
-        contents:
-
-        det(family-3, The-1)
-        nn(family-3, Bush-2)
-        nsubj(did-4, family-3)
-        root(ROOT-0, did-4)
-        poss(best-6, its-5)
-        dobj(did-4, best-6)
-        aux(shield-8, to-7)
-        xcomp(did-4, shield-8)
-        det(service-10, the-9)
-        dobj(shield-8, service-10)
-        dobj(shield-8, reception-12)
-        conj_and(service-10, reception-12)
-        amod(view-15, public-14)
-        prep_from(shield-8, view-15)
- 
-        
-        This program will segregate all grammatical relations from
-        all parse files and create a list "grammar_relations_list", 
-        which has tuples corresponding to each grammatical relation as the 
-        elements of the list. The first element in tuple will be grammatical
-        relation like det, nn. Second element will be word_1 in relation and
-        Third element will be word_2 in relation. All words will be converted
-        into lower case before adding them into "grammar_relations_list".
-
-        (Note: Python tuples are the specific data structures which is used to 
-        store sequence data types. Usage of tuples was learnt from this link:
-        http://docs.python.org/2/tutorial/datastructures.html)
-
-        E.g.  
-        
-        For above mentioned grammatical relations, our grammar_relations_list
-        will have following contents:
-
-        [
-            ('det', 'family', 'the'),
-            ('nn', 'family', 'bush'),
-            ('nsubj', 'did', 'family'),
-            ('nsubj', 'did', 'family'),
-            ('poss', 'best', 'its'),
-            ('dobj', 'did', 'best'),
-            ('aux', 'shield', 'to'),
-            ('xcomp', 'did', 'shield'),
-            ('det', 'service', 'the'),
-            ('dobj', 'shield', 'service'),
-            ('dobj', 'shield', 'reception'),
-            ('conj_and', 'service', 'reception'),
-            ('amod', 'view', 'public'),
-            ('prep_from', 'shield', 'view')
-        ]
-    
-        '''
+    if window is not None:
+        parse_file_paths = []
+    else:
+        parse_file_paths = parseFilePaths(parse_directory)
 
-        '''
-        Create and initialize grammar_relations_list
-        '''
-        grammar_relations_list = []
-        
-        '''
-        Iterate over the parse files list to build grammar_relations_list
-        '''
-        for parse_file_name in parse_files_list:
-            
-            if debug:
-                 print parse_file_name
-       
-            '''
-            Check if current file being processed is a parse file.
-            This check is required to make sure that we only process
-            parse files as other types of files can be there in parse
-            directory.
-            '''
+    word_frq_dict, rel_counts = countCorpus(parse_file_paths, sent_file, \
+                                            num_workers, counts_directory, \
+                                            window)
 
-            if ".parse" in parse_file_name:
-                
-                # open and read parse file
-                parse_file_handle = open(parse_directory  + "/" + \
-                                         parse_file_name, 'r')
+    return buildModelFromCounts(word_frq_dict, rel_counts, pruning, \
+                                association)
 
-                # get all lines from parse file into a list                
-                parse_file_lines = parse_file_handle.readlines()
-    
-                # close the parse file
-                parse_file_handle.close()
-
-                '''
-                Iterate over the parse_file_lines to get grammatical relations
-                '''
-                
-                for parse_file_line in parse_file_lines:
-
-                    if "(" in parse_file_line:
-                            
-                        if debug:
-                            print parse_file_line
-                        
-                        
-                        '''
-                        Split the parse_file_line to get grammatical relation
-                        , word_1 and word_2  
-                        '''
-                        
-                        relations_list =  parse_file_line.split('(')
-                        
-                        grammar_relation =  relations_list[0]
-                        words_list =  relations_list[1]
-                        
-                        if debug:
-                            print grammar_relation
-                            print words_list
-            
-                        words_list = words_list.split(',')
-                        word_1 = words_list[0].split('-')[0]
-                        word_2 = words_list[1].split('-')[0].strip() 
-                        
-                        if debug:
-                            print word_1, word_2
-                        
-                        '''
-                        Form the tuple storing relation, word_1 and word_2
-                        and add it into the grammar_relations_list. 
-                        Exclude all root relations which are not of any interest
-                        to us. Root relation shows the relation of root to
-                        head word in the parse tree for a sentence
-                        '''
-                        if grammar_relation == "root":
-                            continue
-
-                        relation_tuple =  (grammar_relation, \
-                                           word_1.lower(), word_2.lower())
-
-                        grammar_relations_list.append(relation_tuple)
-                        
-        if debug:
-            print len(grammar_relations_list)
+###############################################################################
+# End of buildModel function
+###############################################################################
 
-        '''
-        Get the freq of each relation present in grammar_relations_list.
-        The freq of relations will be stored into a dict object called 
-        rel_freq which has a tuple of (relation,word_1,word_2) as keys and
-        freq of this tuple into grammar_relations_list as the values.This
-        dict object will be used in building co-occurrence vector.
-        These freq will be calculated using Counter object.
-        '''
+###############################################################################
+# Function      : countCorpus(parse_file_paths, sent_file, num_workers,
+#                             counts_directory, window)
+# Description   : Counts the words of the sentence file and the relations of
+#                 the parse files, or the window features of the sentence
+#                 file. These counts are all that is needed to build the
+#                 model (see buildModelFromCounts).
+# Arguments     : parse_file_paths - list of paths of parse files
+#                 sent_file        - file containing all sentences present
+#                                    in the corpus
+#                 num_workers      - number of processes reading sentence
+#                                    file and parse files
+#                 counts_directory - directory keeping relation counts
+#                                    between builds, or None
+#                 window           - number of words on each side of a word
+#                                    taken as its context, to use window
+#                                    features instead of parse files, or
+#                                    None
+# Returns       : tuple (word_frq_dict, rel_counts) of dict of word freq and
+#                 RelationCounts object of ingest.py module
+###############################################################################
+def countCorpus(parse_file_paths, sent_file, num_workers=1, \
+                counts_directory=None, window=None):
 
-        # create rel_freq
+    '''
+    Start getting max likelihood Probabilities for each word.
+    '''
 
-        rel_freq = {}
+    '''
+    Get the frequencies of all words present in the corpus. 
+    These frequencies  will be obtained from sentence file (passed as
+    command line argument).
+    The frequencies of all words will be stored in 
+    dict object "word_frq_dict",
+    which will have each word as the key and its freq as the value
+    for that key. 
+
+    E.g. if a word "Cleopatra" occurs 900 times in sentence file
+    and word "Ceaser" occurs 89 times in sentence file
+    dict object will look this:
+
+    [('Cleopatra':900), ('Ceaser'):89]
+    '''
+    '''
+    To retrieve the frequencies of all words from the sentence file, 
+    countWords function of ingest.py module will be used. It reads the
+    sentence file in chunks and counts the words (runs of \w characters,
+    in lower case) of each chunk, so the whole file is never held in
+    memory. With more than one worker, the file is split into byte
+    ranges which are counted by separate processes and merged.
+    '''  
+    word_frq_dict = countWords(sent_file, num_workers)
+
+    # calculate total number of tokens in the sentence file
+    total_tokens = sum(word_frq_dict.itervalues())
+
+    metrics.gauge("corpus.tokens", total_tokens)
+    metrics.gauge("corpus.distinct_words", len(word_frq_dict))
+    
+    '''
+    Start building co-occurrence vector using all parse files.
+
+    These parse files were created earlier by Standford parser
+    by running parse_corpus_sentences.py program.
+
+    Get the freq of each grammatical relation present in the parse files.
+    The freq of relations will be stored into a RelationCounts object
+    called rel_counts. Words and relation names are interned into integer
+    ids as they are read (see vocabulary.py module), so rel_counts has a
+    tuple of ids (relation_id,word_1_id,word_2_id) as keys and freq of
+    this tuple in all parse files as the values, plus the vocabularies
+    to turn ids back into strings. This object will be used in building
+    co-occurrence vector.
+
+    The parse files are read line by line and rel_counts is updated as
+    each relation is read, by countRelationsParallel function of ingest.py
+    module. With more than one worker, parse files are counted by a pool
+    of num_workers processes and their partial counts are merged.
+
+    If a counts directory is given, rel_counts is kept in it between builds
+    by updateRelationCounts function of ingest.py module, and only the
+    parse files which are new or changed since the last build are read.
+    Probabilities and association measures are then calculated again
+    from the updated rel_counts. The
+    format of parse files and the way relations are read from them is
+    described in ingest.py module.
+
+    If a window is given, parse files are not used at all. Instead the
+    words of the sentence file which are at most window words apart are
+    counted as relations like (R2, word_1, word_2) by countWindowFeatures
+    function of ingest.py module, in the same streaming way as the words
+    are counted. word_1 then gets the feature (R2, word_2) and word_2 gets
+    the feature (L2, word_1), and the rest of the model is built the same
+    way as from parse files.
+    '''
+    if window is not None:
+        rel_counts = countWindowFeatures(sent_file, window, num_workers)
+    elif counts_directory is not None:
+        rel_counts = updateRelationCounts(parse_file_paths, \
+                                          counts_directory, num_workers)
+    else:
+        rel_counts = countRelationsParallel(parse_file_paths, num_workers)
 
-        rel_freq_counter =  collections.Counter(grammar_relations_list)
+    metrics.gauge("counts.relation_tuples", len(rel_counts))
+    metrics.gauge("vocabulary.words", len(rel_counts.words))
+    metrics.gauge("vocabulary.relations", len(rel_counts.relations))
 
-        if debug:
-            print grammar_relations_list
-            print rel_freq_counter
+    return word_frq_dict, rel_counts
 
-        # iterate over rel_freq_counter and feed in the freq in rel_freq
+###############################################################################
+# End of countCorpus function
+###############################################################################
 
-        for rel_freq_counts  in rel_freq_counter.most_common():
-            rel_freq[rel_freq_counts[0]] = rel_freq_counts[1]
+###############################################################################
+# Function      : buildModelFromCounts(word_frq_dict, rel_counts, pruning,
+#                                      association)
+# Description   : Builds the co-occurrence vectors of all words, with their
+#                 association measures (t-test by default), out of the
+#                 counts given by countCorpus function.
+# Arguments     : word_frq_dict - dict with words of the sentence file as
+#                                 keys and their freq as values
+#                 rel_counts    - RelationCounts object of ingest.py module
+#                 pruning       - Pruning object of pruning.py module, or
+#                                 None to keep all words and features
+#                 association   - name of the association measure
+# Returns       : CoOccurrenceMatrix object with association computed
+###############################################################################
+def buildModelFromCounts(word_frq_dict, rel_counts, pruning=None, \
+                         association=DEFAULT_ASSOCIATION):
 
-        if debug:
-            print rel_freq
-        
-        
-        '''
-        Build the co-occurrence vector (CV) out of grammar_relations_list. The
-        CV shows how many times a relation to a word is co-occurring with
-        another word.  Our CV will be a python dict object with name cv_dict. 
+    # total number of tokens in the sentence file
+    total_tokens = sum(word_frq_dict.itervalues())
 
-        Our grammar_relations_list has relations in the form :
-        (rel, word_1, word_2)
+    '''
+    Words of the sentence file are given ids in the same vocabulary as
+    the words of the relations, and their freq are kept in the array
+    word_freq indexed by word id.
+    '''
+    word_vocabulary = rel_counts.words
+    word_freq = internWordCounts(word_frq_dict, word_vocabulary)
 
-        This means  'word_1' has relation 'rel'  with 'word_2' and also, 
-        'word_2' has same relation 'rel' with 'word_1'
+    '''
+    Next, calculate Max likelihood Probabilities for each word in sentence
+    file. This probability will be equal to freq of word / total tokens in 
+    sentence file. Since the number of total token is too high,the prob.
+    will be calculated in log space.
+
+    The max likelihood prob will be stored in a list called as p_w, indexed
+    by word id. Words of relations which are not in the sentence file have
+    None as their prob. This list corresponds to P(w) given in section
+    20.7.2 of JM text
+    '''
+    # create p_w list
+    p_w = [None] * len(word_freq)
 
-        Thus for each entry in grammar_relations_list, we will have two entries 
-        in CV cv_dict. 
+    # iterate over the word_freq to get max likelihood prob for words 
 
-        One entry has word_1 as the key and a list 
-        of relation features as the values for that key. This relation feature 
-        list in turn will have a dict object as its element. 
-        These dict object will have a tuple of (rel,word_2) as the key and
-        freq of co-occurrence of word_1 with (rel,word_2)
+    for word_id, freq in enumerate(word_freq):
+        if freq > 0:
+            p_w[word_id] = math.log10(freq) - math.log10(total_tokens) 
 
-        Second entry will be word_2 as the key and 
-        list of dicts with key (rel,word_1) and co-occurrence freq of word_2 
-        with (rel,word_1) as the values.
+    '''
+    Build the co-occurrence vector (CV) out of rel_counts. The
+    CV shows how many times a relation to a word is co-occurring with
+    another word.  Our CV will be a sparse matrix cv_matrix, an object of
+    CoOccurrenceMatrix class from cv_matrix.py module.
 
-        For example, if grammar_relations_list has following elements into to 
-        it:
+    Our rel_counts has relations in the form :
+    (rel, word_1, word_2)
 
-        [(nn, George, Bush),(adj, Good, George)]
+    This means  'word_1' has relation 'rel'  with 'word_2' and also, 
+    'word_2' has same relation 'rel' with 'word_1'
 
-        Then cv_dict will be like this:
+    Thus for each entry in rel_counts, we will have two cells
+    in CV cv_matrix. 
 
-        -----------------------------------------------------------------
-        |   word (key)    |   list of dict of relation features (value) |
-        -----------------------------------------------------------------
-        |   George        | [ {(nn,Bush}:1}, {(adj,Good)}:1]            |
-        -----------------------------------------------------------------
-        |   Bush          | [ {(nn,George):1} ]                         |
-        -----------------------------------------------------------------
-        |  Good           | [ {(adj,George):1}                          |
-        -----------------------------------------------------------------
-        
-        Also maintain a dict object feature_freq_dict that will have 
-        mapping of each feature relation to its frequency in the 
-        grammar_relations_list.
-        
-        e.g. for above mentioned cv_dict , feature_freq_dict will have 
-        following contents
-        {(nn,Bush}:1 , (adj,Good):1 , (nn,George):1, (adj,George):1 }
+    Each word is a row of cv_matrix and each relation feature (rel,word)
+    is a column of cv_matrix. First cell is in row of word_1 and column
+    of (rel,word_2) and second cell is in row of word_2 and column of
+    (rel,word_1). Value of each cell is freq of co-occurrence of the
+    word with the relation feature.
 
-        '''
+    For example, if rel_counts has following relations into to it:
 
-        # create cv_dict and feature_freq_dict
-        cv_dict = {}
-        feature_freq_dict = {}
+    [(nn, George, Bush),(adj, Good, George)]
 
-        # iterate over rel_freq dict to build CV
+    Then cv_matrix will be like this:
 
-        for rel, freq in rel_freq.iteritems():
+    -----------------------------------------------------------------
+    |   word (row)    | (nn,Bush) | (adj,Good) | (nn,George) | (adj,George)
+    -----------------------------------------------------------------
+    |   George        |     1     |     1      |             |
+    -----------------------------------------------------------------
+    |   Bush          |           |            |      1      |
+    -----------------------------------------------------------------
+    |  Good           |           |            |             |     1
+    -----------------------------------------------------------------
 
-            relation = rel[0]
-            word_1 = rel[1]
-            word_2 = rel[2]
+    Only the non-empty cells are stored. Sum of each column of
+    cv_matrix gives the frequency of the feature relation in all
+    parse files.
+    
+    e.g. for above mentioned cv_matrix , feature freq will be
+    {(nn,Bush}:1 , (adj,Good):1 , (nn,George):1, (adj,George):1 }
 
-            if debug:
-                print rel , freq
-                print relation, word_1, word_2
-            
-            '''
-            Form tuples (rel, word_1) and (rel, word_2) to insert them 
-            into cv_dict rel features' list
-            '''
-            tuple_1 = (relation,word_2)
-            tuple_2 = (relation,word_1)
+    '''
+    with metrics.timer("build_matrix"):
+        cv_matrix = CoOccurrenceMatrix.fromRelationCounts(rel_counts)
 
-            '''
-            For the dict objects for elements in rel feature's list
-            '''
-            feature_dict_1 = {}
-            feature_dict_2 = {}
-            feature_dict_1[tuple_1] = freq
-            feature_dict_2[tuple_2] = freq
+    '''
+    If pruning is asked for, drop the cells of rare words and features and
+    of excluded relations now, so that the probabilities below are
+    calculated without them. All but the strongest features of each word
+    are dropped later, once the association measures are known. Details
+    are in pruning.py module.
+    '''
+    if pruning is not None:
+        with metrics.timer("prune"):
+            cv_matrix = pruning.pruneCounts(cv_matrix, word_frq_dict)
 
-            # feed in the values into cv_dict
+    '''
+    Get the max likelihood Probabilities for features i.e. P(f) of
+    section 20.7.2 of JM text and the MLE of joint probability of a 
+    feature f with word w i.e. P(f,w) of section 20.7.2 of JM text.
 
-            if word_1 not in cv_dict.keys():
-                new_list = [feature_dict_1]
-                cv_dict[word_1] = new_list
-            else:
-                existing_list = cv_dict[word_1]
-                existing_list.append(feature_dict_1)
-                cv_dict[word_1] = existing_list
-   
-            if word_2 not in cv_dict.keys():
-                new_list = [feature_dict_2]
-                cv_dict[word_2] = new_list
-            else:
-                existing_list = cv_dict[word_2]
-                existing_list.append(feature_dict_2)
-                cv_dict[word_2] = existing_list
- 
-            
-            # feed in the values into feature_freq_dict
-            if tuple_1 not in feature_freq_dict.keys():
-                feature_freq_dict[tuple_1] = freq
-            else:
-                prev_count_1 = feature_freq_dict[tuple_1]
-                feature_freq_dict[tuple_1] = prev_count_1 + freq
+    P(f) is freq of feature divided by total count of features.
+    P(f,w) is freq of a cell of cv_matrix divided by the sum of counts
+    of its row (i.e. sum of counts of related word w').
 
+    These Probabilities will be calculated in log space and kept in
+    cv_matrix.
+    '''
+    with metrics.timer("joint_probabilities"):
+        cv_matrix.computeJointProbabilities()
 
-            if tuple_2 not in feature_freq_dict.keys():
-                feature_freq_dict[tuple_2] = freq
-            else:
-                prev_count_2 = feature_freq_dict[tuple_2]
-                feature_freq_dict[tuple_2] = prev_count_2 + freq
+    '''
+    Next calculate the association measures for the CV. The association 
+    measure used in this program is t-test, unless PMI or PPMI is asked
+    for (see measures.py module). The association measure for
+    each feature and word is stored in cv_matrix as another float array
+    next to the freq and P(f,w) arrays.
+    '''
+    with metrics.timer("association"):
+        cv_matrix.computeAssociation(p_w, association)
 
-        if debug:
-            print cv_dict
-            print feature_freq_dict
+    if pruning is not None:
+        with metrics.timer("prune"):
+            cv_matrix = pruning.pruneFeatures(cv_matrix)
 
-        '''
-        Get the max likelihood Probabilities for features i.e. P(f) of
-        section 20.7.2 of JM text. These Probabilities will be stored
-        in a dict object p_f which will have features as the keys and
-        their Probabilities as the values.
+    '''
+    Keep the corpus freq of each word of the CV next to its row, as it is
+    shown in the output for each target word.
+    '''
+    cv_matrix.setWordFrequencies(word_freq)
 
-        These Probabilities will be calculated in log space.
-        '''
-        
-        # first get the total count of features 
-        total_features = 0
+    metrics.gauge("model.rows", cv_matrix.numRows())
+    metrics.gauge("model.features", cv_matrix.numFeatures())
+    metrics.gauge("model.cells", cv_matrix.numCells())
 
-        for feature, freq in feature_freq_dict.iteritems():
-            
-            total_features = total_features + freq
+    return cv_matrix
 
-        if debug:
-            print total_features
-            
-        # create pf_ dict
-        p_f ={}
+###############################################################################
+# End of buildModelFromCounts function
+###############################################################################
 
-        for feature, freq in feature_freq_dict.iteritems():
-            p_f[feature] =  math.log10(freq) - math.log10(total_features)
+###############################################################################
+# Function      : main()
+# Description   : Entry point for the project.
+# Arguments     : None. Command Line Arguments in Python are retrieved from
+#                 sys.argv variable of sys module.
+# Returns       : None.
+###############################################################################
+def main():
+    
+    '''
+    Check if any command line argument is passed to program. If not 
+    throw error showing proper sample usage. 
+    '''
 
+    if (len(sys.argv) > 1):
         if debug:
-            print p_f
-    
+            print "At least one parameter passed to program !"
+        
         '''
-        Calculate the MLE of joint probability of a feature f with word w from 
-        the cv_dict. These joint Probabilities will be stored in a cv_dict  
-        only and it corresponds to P(f,w) of section 20.7.2 of JM text.
-
-        Here cv_dict will be modified to hold P(f,w) instead of freq. This 
-        modification will avoid creation of another data structure for P(f,w).
-    
-        First iterate over cv_dict to get sum of counts of related word w', 
-        which is used to calculate P(f,w). 
+        Get the values of command line arguments for :
+        1) Path of directory where all parse files are present  
         
-        Divide value of each freq by this sum in log space to get P(f,w)
+        2) File containing all sentences present in the corpus
+        (which is referred as sentence file hereafter in this program)
+
+        3) File containing list of target words for which we want to 
+        find similar words
         
+        4) Maximum number of similar words that needs to be displayed 
+        in output
+
+        Only 3) and 4) are given when a model file is loaded, and 1) is
+        not given with window features. Optional arguments are described
+        in parseArguments function.
+        '''        
+        args = parseArguments(sys.argv[1:])
+
+        '''
+        Metrics of the stages, like their time, the number of relations
+        read and the number of candidates scored per query, are recorded
+        by metrics.py module all along. They are written out at the end
+        if --metrics is given.
         '''
-        for word, relation_feature_list in cv_dict.iteritems():
-                w_prime_sum = 0
-                for relation_feature in relation_feature_list:
-                    w_prime_sum = w_prime_sum + relation_feature.values()[0]
-                
-                for relation_feature in relation_feature_list:
-                    for key, value in relation_feature.iteritems():
-                        
-                        relation_feature[key] = math.log10(value) - \
-                        math.log10(w_prime_sum)
-                    
+        if args.metrics is not None:
+            metrics.addSink(metrics.sinkFor(args.metrics))
+
+        parse_directory =  args.parse_directory
+        sent_file = args.sent_file
+        target_words_file = args.target_words_file
+        num_of_sim_words = args.num_of_sim_words
 
         '''
-        Next calculate the association measures for the CV. The association 
-        measure used in this program is t-test. The association measure for
-        each feature and word is stored in the cv_dict only. cv_dict will 
-        be modified to hold association measures instead of probabilities here.
+        Read the target list word file and store them into a list
         '''
-        for word, relation_feature_list in cv_dict.iteritems():
-                
-            # get P(w) for word from p_w dict
-            try:
-                word_prob = p_w[word]
-            except KeyError:
-                word_prob = float(-7)
-
-            for relation_feature in relation_feature_list:
-                for key, value in relation_feature.iteritems():
-                    assoc_factor_1 = pow(10, value)
-
-                    # get P(f) from p_f dict
-                    feat_prob = p_f[key]
-                    assoc_factor_2 = pow(10, word_prob + feat_prob)
-                    
-                    assoc_measure =  float(assoc_factor_1 - assoc_factor_2) /\
-                                     float(math.sqrt(assoc_factor_2))
-                    relation_feature[key] = assoc_measure
+        target_file_handle = open(target_words_file, 'r')
+        target_words_list =  [target_word.replace("\n","") for \
+                              target_word in target_file_handle.readlines()]
+        target_file_handle.close()
+
+        
+        '''
+        Build the co-occurrence vectors (CV) of all words and their
+        association measures by calling buildModel function. If a model
+        file built earlier is given, it is memory mapped instead by
+        loadModel function of model_file.py module and nothing is rebuilt.
+        If a model file to save is given, the newly built model is written
+        into it by saveModel function of model_file.py module.
+        '''
+        if args.load_model is not None:
+            with metrics.timer("load_model"):
+                cv_matrix = loadModel(args.load_model)
+        else:
+            if args.features == "window":
+                window = args.window
+            else:
+                window = None
+
+            pruning = pruningOf(args)
+
+            '''
+            For the pruning report, the corpus is counted once and both
+            the unpruned and the pruned models are built from the counts.
+            The unpruned model is built first, so the model gauges of the
+            metrics are the ones of the pruned model.
+            '''
+            if args.prune_report is not None:
+                if window is not None:
+                    parse_file_paths = []
+                else:
+                    parse_file_paths = parseFilePaths(parse_directory)
+
+                with metrics.timer("build_model"):
+                    word_frq_dict, rel_counts = \
+                        countCorpus(parse_file_paths, sent_file, \
+                                    args.workers, args.counts_dir, window)
+
+                with metrics.timer("prune_report"):
+                    full_matrix = buildModelFromCounts(word_frq_dict, \
+                                                       rel_counts, None, \
+                                                       args.association)
+
+                with metrics.timer("build_model"):
+                    cv_matrix = buildModelFromCounts(word_frq_dict, \
+                                                     rel_counts, pruning, \
+                                                     args.association)
+                del word_frq_dict, rel_counts
+
+                with metrics.timer("prune_report"):
+                    report = pruneReport(full_matrix, cv_matrix, pruning, \
+                                         target_words_list, \
+                                         num_of_sim_words, \
+                                         measure=args.similarity)
+                del full_matrix
+
+                writeReport(report, args.prune_report)
+            else:
+                with metrics.timer("build_model"):
+                    cv_matrix = buildModel(parse_directory, sent_file, \
+                                           args.workers, args.counts_dir, \
+                                           window, pruning, \
+                                           args.association)
+
+            if args.save_model is not None:
+                with metrics.timer("save_model"):
+                    saveModel(cv_matrix, args.save_model)
 
 
         '''
@@ -607,132 +951,92 @@ def main():
         similarity, the CV present for each target word will be compared 
         with CVs of other words using Jaccard's measure formula.
         
-        For this, features' list for both target and other word in cv_dict 
-        will be fetched first. The unique features from features' list of
-        target and other word will be inserted into a composite list.
-        
-        Using this composite list, the association measures of target word
-        and other word will be compared for each word. Sum of minimum of
-        association measures for all features and sum of max of association
-        measures for all features will be calculated and division of these
-        two sums will give us Jaccard's similarity score for target and other
-        words. Similarity score of all other words will be put in word_sim dict 
-        and top 20 scores will be displayed as output. 
+        Sum of minimum of association measures for all features and sum of
+        max of association measures for all features will be calculated and
+        division of these two sums will give us Jaccard's similarity score
+        for target and other words. Details of this calculation are
+        present in similarity.py module.
+
+        Words sharing no feature with the target word can not have a
+        score above 0. So only the words found through the inverted index
+        of cv_matrix for the features of target word are scored by
+        mostSimilar function of similarity.py module. It keeps the top
+        num_of_sim_words scores in a bounded heap, skipping candidates whose
+        upper bound of score can not beat the lowest score in the heap.
+        These top num_of_sim_words words will be displayed as output. 
         '''
         
-        # iterate over the target word list to fetch target words
-        for target_word in target_words_list:
-
-            # create word_sim dict object
-            word_sim = {}
-
-            target_word = target_word.replace("\n","")
-            
-            # get features' list for target word from cv_dict
-            target_feature_list = cv_dict[target_word]
-            
-            # iterate over cv_dict to get other word's features' list
-
-            for key, data in cv_dict.iteritems():
-                
-                composite_feature_list = []
-
-                other_feature_list = data
-                
-                ''' 
-                form a composite list containing unique features from both
-                target features list and other word's feature list
-                '''
-                for feature in target_feature_list:
-                    composite_feature_list.append(feature.keys()[0])
-
-                for feature in other_feature_list:
-                    if feature.keys()[0] not in composite_feature_list:
-                        composite_feature_list.append(feature.keys()[0])
-
-                
-                '''
-                Iterate over composite list to get sum of min and sum of max 
-                of the two lists.
-                '''
-                sum_of_min = 0
-                sum_of_max = 0
-
-                for element in composite_feature_list:
-                    target_assoc_measure = 0 
-                    other_assoc_measure = 0 
-                   
-                    
-                    for feature in target_feature_list:
-                        if element == feature.keys()[0]:
-                            target_assoc_measure = feature.values()[0] 
-                            break
-
-                    for feature in other_feature_list:
-                        if element == feature.keys()[0]:
-                            other_assoc_measure = feature.values()[0]
-                            break
-    
-                    min_value = min(target_assoc_measure, other_assoc_measure)
-                    max_value = max(target_assoc_measure, other_assoc_measure)
-
-
-                    sum_of_min = sum_of_min + min_value
-                    sum_of_max = sum_of_max + max_value
-                
-                '''
-                Calculate Jaccard's similarity value by dividing sum_of_min
-                by sum_of_max
-                '''
+        '''
+        With --approximate, similar words are found through an LSH index of
+        weighted MinHash signatures of the CVs, built by lsh_index.py
+        module or memory mapped from the file given by --lsh-index. Only
+        the candidates found in the index are scored with Jaccard's
+        measure, so queries are much faster at the cost of missing some
+        similar words.
+        '''
+        lsh_index = None
+        if args.approximate:
+            if args.lsh_index is not None and os.path.exists(args.lsh_index):
                 try:
-                    similarity_value =  sum_of_min / sum_of_max
-                except ZeroDivisionError:
-                    similarity_value = 0
-
-
-                word_sim[key] = similarity_value
-                
-               
-            print "Target word: " + target_word  + "\n"
-            
-            print "Target word frequency in corpus: " + \
-                str(word_frq_dict[target_word]) + "\n"
-        
-    
-            print "Similar words and their similarity scores : " + "\n" 
+                    lsh_index = loadIndex(args.lsh_index)
+                    lsh_index.checkMatrix(cv_matrix)
+                    lsh_index.checkBands(args.lsh_bands, args.lsh_band_size)
+                except ValueError, error:
+                    sys.exit("Error: " + str(error))
+            else:
+                with metrics.timer("build_lsh_index"):
+                    lsh_index = MinHashIndex.build(cv_matrix, \
+                                                   args.lsh_bands, \
+                                                   args.lsh_band_size)
+                if args.lsh_index is not None:
+                    saveIndex(lsh_index, args.lsh_index)
 
-            word_counter = 0
-            
-            '''
-            Sort word similarity dict by values. For this, the code
-            given in this link was used to sort a dict by values:
-            http://www.saltycrane.com/blog/2007/09/
-            how-to-sort-python-dictionary-by-keys/
-            '''
+        '''
+        With --neighbors-table, similar words are read from a table of the
+        top similar words of all words, memory mapped from the given file.
+        If the file does not exist, the table is built for num_of_sim_words
+        words in blocks scored by --workers processes and saved there, by
+        neighbor_table.py module, so later runs and sim_server.py only look
+        the words up.
+        '''
+        neighbor_table = None
+        if args.neighbors_table is not None:
+            if os.path.exists(args.neighbors_table):
+                neighbor_table = loadTable(args.neighbors_table)
+                neighbor_table.checkMatrix(cv_matrix)
+            else:
+                with metrics.timer("build_neighbor_table"):
+                    neighbor_table = NeighborTable.build(cv_matrix, \
+                                                         num_of_sim_words, \
+                                                         args.similarity, \
+                                                         args.workers, \
+                                                         args.block_size)
+                saveTable(neighbor_table, args.neighbors_table)
 
-            for key, value in sorted(word_sim.iteritems(), \
-                                     key=lambda (k,v): (v,k)\
-                                , reverse=True):
-                if word_counter == num_of_sim_words:
-                    break    
-                   
-                '''
-                For table like pretty printing of output, format specifier : 
-                is used as described on Python 2.7.3 documentation 
-                present at the link:
-            
-                http://docs.python.org/tutorial/inputoutput.html
-            
-                The sample code referred from above link was
-                print '{0:10} ==> {1:10d}'.format(name, phone)
-                '''
- 
-                print '{0:30}      {1:30}     '.format(key, \
-                                                   str(value))
- 
-                word_counter = word_counter + 1
-            
-            print "\n\n"
+        '''
+        In batch mode, similar words of all target words are found block by
+        block and streamed into the output file instead of being printed.
+        '''
+        if args.output is not None:
+            if args.output == "-":
+                output_handle = sys.stdout
+            else:
+                output_handle = open(args.output, 'w')
+
+            writeBatchResults(cv_matrix, target_words_list, num_of_sim_words, \
+                              output_handle, args.format, args.block_size, \
+                              lsh_index, args.max_candidates, \
+                              args.similarity, neighbor_table)
+
+            if output_handle is not sys.stdout:
+                output_handle.close()
+        else:
+            printSimilarWords(cv_matrix, target_words_list, \
+                              num_of_sim_words, sys.stdout, lsh_index, \
+                              args.max_candidates, args.similarity, \
+                              neighbor_table)
+
+        metrics.emit()
 
     else:
         print "No parameter passed to the program !"